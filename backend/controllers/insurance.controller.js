@@ -58,7 +58,7 @@ class InsuranceController {
 
             console.log('newInsurance : ', newInsurance);
 
-            const payLoad = await getAIInsights.getDocScore(damageImage, cropImage, fieldImage);
+            const payLoad = await getAIInsights.getDocScore(damageImage, cropImage, fieldImage, newInsurance._id.toString());
 
             console.log('payLoad : ', payLoad);
 
@@ -29,50 +29,35 @@ class GetAIInsighits {
         }
     }
 
-    async getDocScore(damageImage, cropImage, fieldImage) {
+    async getDocScore(damageImage, cropImage, fieldImage, claimId) {
         try {
             console.log('FLASK_API : ', FLASK_API);
             console.log('damageImage : ', damageImage);
             console.log('cropImage : ', cropImage);
             console.log('fieldImage : ', fieldImage);
 
-            // Prepare the request payload for damage detection
-            const damageRequest = {
-                publicId: damageImage.publicId,
-                fileType: damageImage.fileType,
-                originalName: damageImage.originalName
-            };
-
-            const responseDamageDetection = await axios.post(`${FLASK_API}/api/damage_detection`, damageRequest);
-
-            console.log('responseDamageDetection : ', responseDamageDetection.data);
-
-            // Prepare the request payload for metadata extraction
-            const metadataRequest = {
-                publicId: fieldImage.publicId,
-                fileType: fieldImage.fileType,
-                originalName: fieldImage.originalName
-            };
-
-            const responseMetadata = await axios.post(`${FLASK_API}/api/exif_metadata`, metadataRequest);
-
-            console.log('responseMetadata : ', responseMetadata.data);
-
-            // Prepare the request payload for crop type detection
-            const cropRequest = {
-                publicId: cropImage.publicId,
-                fileType: cropImage.fileType,
-                originalName: cropImage.originalName
-            };
+            const toImageRequest = (image) => ({
+                publicId: image.publicId,
+                fileType: image.fileType,
+                originalName: image.originalName
+            });
 
-            const responseCropType = await axios.post(`${FLASK_API}/api/crop_type`, cropRequest);
+            // One call downloads all three images once and runs the checks in parallel
+            const response = await axios.post(`${FLASK_API}/api/verify_claim`, {
+                damageImage: toImageRequest(damageImage),
+                cropImage: toImageRequest(cropImage),
+                fieldImage: toImageRequest(fieldImage),
+                // Lets the verifier flag images already submitted with another claim
+                claimId
+            });
 
-            console.log('responseCropType : ', responseCropType.data);
+            console.log('responseVerifyClaim : ', response.data);
 
             return {
-                metadata: responseMetadata.data,
-                damageDetection: responseDamageDetection.data,
-                cropType: responseCropType.data
+                metadata: response.data.metadata,
+                damageDetection: response.data.damageDetection,
+                cropType: response.data.cropType,
+                duplicateCheck: response.data.duplicateCheck
             }
         } catch (err) {
             console.error('Error in AI prediction:', err.response?.data || err.message);
@@ -0,0 +1,142 @@
+"""Dynamic micro-batching for model inference.
+
+Callers submit one input at a time. A worker thread per model drains the
+queue into batches of up to ``max_batch_size`` items, waiting at most
+``max_wait_ms`` after the first item for more to arrive. It runs one forward
+pass per batch and resolves each caller's future with its own row.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class MicroBatcher:
+    def __init__(self, name, batch_fn, max_batch_size=8, max_wait_ms=10, max_queue=256):
+        """``batch_fn`` takes a list of inputs and returns a list of outputs in the same order."""
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "batches": 0,
+            "items": 0,
+            "errors": 0,
+            "max_queue_depth": 0,
+            "queue_wait_ms_total": 0.0,
+            "inference_ms_total": 0.0,
+        }
+        self._batch_sizes = {}
+        # A forked worker inherits neither the worker thread nor a usable lock state.
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    # --- Client side ---
+    def submit(self, item):
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            raise QueueFullError(f"{self.name} inference queue is full ({self._queue.maxsize} pending)")
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return future
+
+    def infer(self, item, timeout=None):
+        return self.submit(item).result(timeout=timeout)
+
+    # --- Worker side ---
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                outputs = list(self.batch_fn(items))
+                error = None
+                if len(outputs) != len(items):
+                    error = RuntimeError(
+                        f"{self.name} batch function returned {len(outputs)} outputs for {len(items)} inputs"
+                    )
+            except Exception as e:
+                outputs, error = None, e
+            finished = time.perf_counter()
+
+            # Every future in the batch is resolved, whatever batch_fn did, so
+            # callers never hang and the worker keeps running.
+            for i, (_, future, enqueued) in enumerate(batch):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(outputs[i])
+
+            with self._stats_lock:
+                stats = self._stats
+                stats["batches"] += 1
+                stats["items"] += len(batch)
+                stats["errors"] += error is not None
+                stats["queue_wait_ms_total"] += sum(started - enqueued for _, _, enqueued in batch) * 1000
+                stats["inference_ms_total"] += (finished - started) * 1000
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            sizes = dict(sorted(self._batch_sizes.items()))
+        batches, items = stats["batches"], stats["items"]
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": stats["max_queue_depth"],
+            "queue_capacity": self._queue.maxsize,
+            "submitted": stats["submitted"],
+            "rejected": stats["rejected"],
+            "batches": batches,
+            "items": items,
+            "errors": stats["errors"],
+            "avg_batch_size": round(items / batches, 2) if batches else None,
+            "avg_queue_wait_ms": round(stats["queue_wait_ms_total"] / items, 3) if items else None,
+            "avg_batch_inference_ms": round(stats["inference_ms_total"] / batches, 3) if batches else None,
+            "batch_size_histogram": sizes,
+        }
@@ -0,0 +1,87 @@
+"""Benchmark the NumPy forecasters against the Prophet path on the ICRISAT dataset.
+
+Every (district, crop) series with at least 6 positive yields is forecast the
+way the yield endpoint does it. For each backend the script reports:
+
+- wall-clock time for the whole dataset,
+- the MAE/MAPE each backend reports for its own fit (what the API returns),
+- a holdout score: the last observed year is hidden, forecast and compared
+  against the actual value, which is the fairer comparison between backends.
+
+    python bench_forecast.py                  # full dataset, Prophet on all cores
+    python bench_forecast.py --limit 300      # quicker sample
+    python bench_forecast.py --skip-prophet   # NumPy backends only
+"""
+import argparse
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from district_store import get_district_store
+from forecasting import NumpyForecaster, forecast_yield_with_accuracy, to_prophet_frame
+
+
+def _positive_series(limit=None):
+    series = []
+    for _, _, years, values in get_district_store().iter_series():
+        mask = values > 0
+        if mask.sum() >= 7:  # 6 for the fit plus one held out
+            series.append((years[mask], values[mask]))
+    return series[:limit] if limit else series
+
+
+def _prophet_one(args):
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    years, values = args
+    _, mae, mape = forecast_yield_with_accuracy(to_prophet_frame(years, values))
+    holdout_yhat, _, _ = forecast_yield_with_accuracy(to_prophet_frame(years[:-1], values[:-1]))
+    return mae, mape, holdout_yhat
+
+
+def run_prophet(series, workers):
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_prophet_one, series, chunksize=8))
+    elapsed = time.perf_counter() - start
+    mae, mape, holdout = (np.array([r[i] if r[i] is not None else np.nan for r in results], dtype=float) for i in range(3))
+    return elapsed, mae, mape, holdout
+
+
+def run_numpy(series, method):
+    forecaster = NumpyForecaster(method)
+    start = time.perf_counter()
+    entries = forecaster.forecast_series_batch(series)
+    holdout = forecaster.forecast_series_batch([(years[:-1], values[:-1]) for years, values in series])
+    elapsed = time.perf_counter() - start
+    mae = np.array([e["mae"] if e["mae"] is not None else np.nan for e in entries])
+    mape = np.array([e["mape"] if e["mape"] is not None else np.nan for e in entries])
+    return elapsed, mae, mape, np.array([e["yhat"] for e in holdout])
+
+
+def report(name, series, elapsed, mae, mape, holdout):
+    actual = np.array([values[-1] for _, values in series], dtype=float)
+    abs_err = np.abs(holdout - actual)
+    ape = abs_err / actual * 100
+    print(
+        f"{name:<22} {elapsed:>9.2f}s {elapsed / len(series) * 1000:>9.3f}ms"
+        f" {np.nanmean(mae):>10.1f} {np.nanmedian(mape):>10.2f}"
+        f" {np.nanmean(abs_err):>12.1f} {np.nanmedian(ape):>12.2f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=None, help="Only benchmark the first N series")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for the Prophet run")
+    parser.add_argument("--skip-prophet", action="store_true")
+    args = parser.parse_args()
+
+    series = _positive_series(args.limit)
+    print(f"{len(series)} series (wall-clock includes the holdout refit)\n")
+    print(f"{'backend':<22} {'total':>10} {'per series':>11} {'fit MAE':>10} {'fit MAPE%':>10} {'holdout MAE':>12} {'holdout APE%':>12}")
+    for method in NumpyForecaster.METHODS:
+        report(f"numpy:{method}", series, *run_numpy(series, method))
+    if not args.skip_prophet:
+        report("prophet", series, *run_prophet(series, args.workers))
@@ -0,0 +1,147 @@
+"""Memory benchmark: preload-then-fork (serve.py) vs independent uvicorn workers.
+
+    python bench_serve_memory.py --workers 1 2 4
+    python bench_serve_memory.py --workers 4 --modes preload
+
+For each mode and worker count the server is started, given time to load
+(until the process tree's memory stops growing), and measured from
+/proc/<pid>/smaps_rollup across the parent and all workers:
+
+  rss  - sum of resident sets (counts shared pages once per process)
+  pss  - proportional set size, shared pages split between sharers;
+         the honest "how much RAM does this deployment use" number
+  uss  - private pages only (what killing one process would free)
+
+Linux only. Run from python_backend with the same environment the server uses.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(c) for c in f.read().split()]
+    except OSError:
+        return []
+
+
+def process_tree(pid):
+    pids, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        pids.append(p)
+        stack.extend(children(p))
+    return pids
+
+
+def smaps_rollup(pid):
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    values[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        pass
+    return values
+
+
+def tree_memory(pid):
+    totals = {"rss": 0, "pss": 0, "uss": 0, "processes": 0}
+    for p in process_tree(pid):
+        v = smaps_rollup(p)
+        if not v:
+            continue
+        totals["processes"] += 1
+        totals["rss"] += v.get("Rss", 0)
+        totals["pss"] += v.get("Pss", 0)
+        totals["uss"] += v.get("Private_Clean", 0) + v.get("Private_Dirty", 0)
+    return {k: (round(v / 1024, 1) if k != "processes" else v) for k, v in totals.items()}
+
+
+def wait_until_ready(proc, port, expected_processes, timeout, settle_seconds=3):
+    """Wait for the HTTP port, the expected process count and stable memory."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=2).read()
+            break
+        except OSError:
+            time.sleep(0.5)
+    else:
+        raise TimeoutError("server did not start")
+
+    stable_since, last = None, None
+    while time.time() < deadline:
+        mem = tree_memory(proc.pid)
+        if mem["processes"] >= expected_processes and last is not None and abs(mem["rss"] - last) <= max(1.0, last * 0.005):
+            stable_since = stable_since or time.time()
+            if time.time() - stable_since >= settle_seconds:
+                return mem
+        else:
+            stable_since = None
+        last = mem["rss"]
+        time.sleep(1)
+    raise TimeoutError("memory did not settle")
+
+
+def command(mode, workers, port):
+    if mode == "preload":
+        return [sys.executable, os.path.join(BASE_DIR, "serve.py"), "--workers", str(workers),
+                "--port", str(port), "--log-level", "warning"]
+    return [sys.executable, "-m", "uvicorn", "main_fastAPI:app", "--workers", str(workers),
+            "--port", str(port), "--log-level", "warning"]
+
+
+def measure(mode, workers, port, timeout):
+    proc = subprocess.Popen(command(mode, workers, port), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+    start = time.time()
+    try:
+        # serve.py always has a supervising parent; uvicorn runs a single worker in-process.
+        expected = workers + 1 if mode == "preload" or workers > 1 else 1
+        mem = wait_until_ready(proc, port, expected, timeout)
+        mem["ready_seconds"] = round(time.time() - start, 1)
+        return mem
+    finally:
+        os.killpg(proc.pid, 15)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, 9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=("preload", "independent"), default=["preload", "independent"])
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'mode':<12} {'workers':>7} {'procs':>5} {'rss MB':>9} {'pss MB':>9} {'uss MB':>9} {'ready s':>8}")
+    for mode in args.modes:
+        for workers in args.workers:
+            mem = measure(mode, workers, args.port, args.timeout)
+            results.append({"mode": mode, "workers": workers, **mem})
+            print(f"{mode:<12} {workers:>7} {mem['processes']:>5} {mem['rss']:>9} {mem['pss']:>9} {mem['uss']:>9} {mem['ready_seconds']:>8}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
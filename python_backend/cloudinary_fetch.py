@@ -0,0 +1,186 @@
+"""Cloudinary downloads sized to what each verifier needs.
+
+The classifiers shrink every image to 384px or 224px and piexif reads only
+the Exif block at the start of a JPEG, so the full original is rarely needed:
+
+  * ``fetch_exif_header`` reads the JPEG header with HTTP range requests and
+    returns the Exif payload alone (EXIF-only checks);
+  * ``fetch_derivative`` asks Cloudinary for a resized JPEG through a signed
+    transformation URL (classifier input);
+  * ``fetch_original`` downloads the original bytes (ELA, which has to see the
+    original compression artifacts).
+
+Each helper falls back to the original when the cheaper path is unavailable
+(non-JPEG file, server ignoring ``Range``, transformation rejected). Uploads
+with ``file_type="raw"`` are read from Cloudinary's ``raw`` delivery path;
+they have no derivatives, so ``fetch_derivative`` returns the original.
+``CLOUDINARY_DELIVERY_HOST`` (e.g. ``127.0.0.1:5056``) points delivery URLs at
+cloudinary_stub.py for local testing.
+
+Bodies are streamed in chunks into a SpooledTemporaryFile that stays in memory
+up to ``UPLOAD_SPOOL_BYTES`` and then rolls over to an anonymous temporary
+file in ``UPLOAD_STAGING_DIR``, so concurrent claims never share a path and
+staged data is deleted when the file is closed (or the process dies). A body
+larger than ``UPLOAD_MAX_BYTES`` is rejected with ``DownloadTooLarge`` as soon
+as the limit is crossed, and at most ``DOWNLOAD_MAX_CONCURRENT`` bodies are
+read at once; further downloads wait for a slot.
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+import cloudinary.utils
+import httpx
+
+from image_input import find_exif_segment
+
+DELIVERY_HOST = os.getenv("CLOUDINARY_DELIVERY_HOST")
+URL_TTL_SECONDS = 300
+EXIF_RANGE_BYTES = int(os.getenv("EXIF_RANGE_BYTES", "16384"))
+# APP1 segments are at most 64 KB; give up on headers that run past this.
+EXIF_MAX_HEADER_BYTES = int(os.getenv("EXIF_MAX_HEADER_BYTES", "262144"))
+DERIVATIVE_SIDE = int(os.getenv("CLASSIFIER_DERIVATIVE_SIDE", "512"))
+DERIVATIVE_QUALITY = int(os.getenv("CLASSIFIER_DERIVATIVE_QUALITY", "90"))
+MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(4 * 1024 * 1024)))
+STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR") or None
+MAX_CONCURRENT = int(os.getenv("DOWNLOAD_MAX_CONCURRENT", "8"))
+CHUNK_BYTES = 64 * 1024
+
+download_stats = {
+    kind: {"requests": 0, "bytes": 0, "failures": 0, "fallbacks": 0, "too_large": 0}
+    for kind in ("original", "exif_header", "derivative")
+}
+staging_stats = {"in_flight": 0, "waiting": 0, "peak_in_flight": 0}
+_slots = asyncio.Semaphore(MAX_CONCURRENT)
+
+
+class DownloadTooLarge(Exception):
+    def __init__(self, public_id, limit):
+        super().__init__(f"{public_id} is larger than the {limit} byte upload limit")
+        self.public_id = public_id
+        self.limit = limit
+
+
+def resource_type(file_type):
+    return "raw" if file_type == "raw" else "image"
+
+
+def signed_url(public_id, resource_type="image", transformation=None, expires_in=URL_TTL_SECONDS):
+    options = {
+        "resource_type": resource_type,
+        "type": "authenticated",
+        "sign_url": True,
+        "expires_at": int(time.time()) + expires_in,
+    }
+    if transformation:
+        options.update(transformation=[transformation], format="jpg")
+    if DELIVERY_HOST:
+        options.update(cname=DELIVERY_HOST, secure=False, private_cdn=False)
+    url, _ = cloudinary.utils.cloudinary_url(public_id, **options)
+    return url
+
+
+async def _download(client, kind, url, public_id, headers=None):
+    """Stream a response body into a staged file.
+
+    Returns ``(status_code, file)`` with the file rewound, or None when the
+    request fails. The caller owns (and must close) the file.
+    """
+    staging_stats["waiting"] += 1
+    async with _slots:
+        staging_stats["waiting"] -= 1
+        staging_stats["in_flight"] += 1
+        staging_stats["peak_in_flight"] = max(staging_stats["peak_in_flight"], staging_stats["in_flight"])
+        staged = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES, dir=STAGING_DIR, prefix="claim-")
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                download_stats[kind]["requests"] += 1
+                if response.status_code not in (200, 206):
+                    download_stats[kind]["failures"] += 1
+                    staged.close()
+                    return None
+                if int(response.headers.get("content-length") or 0) > MAX_BYTES:
+                    raise DownloadTooLarge(public_id, MAX_BYTES)
+                size = 0
+                async for chunk in response.aiter_bytes(CHUNK_BYTES):
+                    size += len(chunk)
+                    if size > MAX_BYTES:
+                        raise DownloadTooLarge(public_id, MAX_BYTES)
+                    staged.write(chunk)
+            download_stats[kind]["bytes"] += size
+            staged.seek(0)
+            return response.status_code, staged
+        except httpx.HTTPError:
+            download_stats[kind]["failures"] += 1
+            staged.close()
+            return None
+        except DownloadTooLarge:
+            download_stats[kind]["too_large"] += 1
+            staged.close()
+            raise
+        except BaseException:
+            staged.close()
+            raise
+        finally:
+            staging_stats["in_flight"] -= 1
+
+
+async def fetch_original(client, public_id, file_type="image/jpeg"):
+    """Staged original file, or None."""
+    url = signed_url(public_id, resource_type(file_type))
+    result = await _download(client, "original", url, public_id, {'Content-Type': file_type})
+    return result[1] if result is not None else None
+
+
+# --- EXIF header ---
+async def fetch_exif_header(client, public_id, file_type="image/jpeg"):
+    """Return ``(exif_payload, original)``: one of them is set, or both None on failure.
+
+    ``exif_payload`` starts with ``Exif\\0\\0`` (``b""`` if the JPEG has no Exif
+    block). ``original`` is the whole file, staged, returned when the header
+    could not be read with range requests.
+    """
+    url = signed_url(public_id, resource_type(file_type))
+    head = b""
+    want = EXIF_RANGE_BYTES
+    while want <= EXIF_MAX_HEADER_BYTES:
+        result = await _download(client, "exif_header", url, public_id, {"Range": f"bytes={len(head)}-{want - 1}"})
+        if result is None:
+            break
+        status_code, staged = result
+        if status_code == 200:
+            # Range ignored: we already have the whole file.
+            download_stats["exif_header"]["fallbacks"] += 1
+            return None, staged
+        with staged:
+            head += staged.read()
+        status, start, end = find_exif_segment(head)
+        if status == "exif" and end <= len(head):
+            return head[start:end], None
+        if status == "none":
+            return b"", None
+        if status == "unsupported" or len(head) < want:
+            # Not a JPEG, or the file ended before the Exif block did.
+            break
+        want = max(end, len(head) + EXIF_RANGE_BYTES)
+    download_stats["exif_header"]["fallbacks"] += 1
+    return None, await fetch_original(client, public_id, file_type)
+
+
+# --- Classifier derivative ---
+async def fetch_derivative(client, public_id, file_type="image/jpeg", side=DERIVATIVE_SIDE):
+    """Staged resized JPEG (longest side at most ``side``), or the original if the derivative fails."""
+    if resource_type(file_type) != "image":
+        return await fetch_original(client, public_id, file_type)
+    transformation = {"width": side, "height": side, "crop": "limit", "quality": DERIVATIVE_QUALITY}
+    result = await _download(client, "derivative", signed_url(public_id, transformation=transformation), public_id)
+    if result is not None:
+        return result[1]
+    download_stats["derivative"]["fallbacks"] += 1
+    return await fetch_original(client, public_id, file_type)
+
+
+def stats():
+    return {**download_stats, "staging": {**staging_stats, "max_concurrent": MAX_CONCURRENT, "max_bytes": MAX_BYTES}}
@@ -0,0 +1,130 @@
+"""Local stand-in for Cloudinary image delivery.
+
+Serves files from ``CLOUDINARY_STUB_DIR`` (default ``data/cloudinary_stub``) on
+Cloudinary-style delivery URLs, so the claim download paths can be exercised
+without network access. A file is looked up by public id, with or without its
+extension (``claims/abc`` finds ``claims/abc.jpg``). Supported features:
+
+  * ``Range: bytes=start-end`` on originals (206 with ``Content-Range``);
+  * ``c_limit``/``c_fit``/``c_scale`` with ``w_``/``h_`` and ``q_`` transformations, re-encoded
+    as JPEG like a Cloudinary derivative;
+  * a ``s--signature--`` path segment is required (not verified);
+  * ``raw`` assets are served like images but reject transformations (400).
+
+Point the backend at it with ``CLOUDINARY_DELIVERY_HOST=127.0.0.1:5056``.
+``GET /stats`` reports requests and bytes served per kind, and requests per
+resource type. tests/test_cloudinary_fetch.py runs the download paths against it.
+"""
+import glob
+import io
+import os
+import re
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from PIL import Image
+
+STUB_DIR = os.getenv("CLOUDINARY_STUB_DIR", os.path.join("data", "cloudinary_stub"))
+
+app = FastAPI()
+stats = {kind: {"requests": 0, "bytes": 0} for kind in ("original", "range", "derivative")}
+stats["resource_types"] = {}
+
+_SIGNATURE = re.compile(r"^s--[\w-]{8}--$")
+_VERSION = re.compile(r"^v\d+$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_path(path):
+    """Split ``s--sig--/<transformation>/v1/<public_id>`` into (signed, transformation, public_id)."""
+    parts = path.split("/")
+    signed = bool(parts) and bool(_SIGNATURE.match(parts[0]))
+    if signed:
+        parts = parts[1:]
+    transformation = {}
+    if parts and "_" in parts[0] and not _VERSION.match(parts[0]) and re.match(r"^([a-z]{1,2}_[^,/]+,?)+$", parts[0]):
+        transformation = dict(item.split("_", 1) for item in parts[0].split(","))
+        parts = parts[1:]
+    if parts and _VERSION.match(parts[0]):
+        parts = parts[1:]
+    return signed, transformation, "/".join(parts)
+
+
+def find_file(public_id):
+    path = os.path.join(STUB_DIR, public_id)
+    if os.path.isfile(path):
+        return path
+    stem = os.path.splitext(path)[0]
+    for candidate in sorted(glob.glob(glob.escape(stem) + ".*")):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def derivative(path, transformation):
+    image = Image.open(path).convert("RGB")
+    width, height = int(transformation.get("w", 0)), int(transformation.get("h", 0))
+    if width or height:
+        limit = (width or image.width, height or image.height)
+        # c_limit only ever shrinks; c_fit and c_scale may also enlarge.
+        if transformation.get("c", "limit") != "limit" or image.width > limit[0] or image.height > limit[1]:
+            ratio = min(limit[0] / image.width, limit[1] / image.height)
+            image = image.resize((max(1, round(image.width * ratio)), max(1, round(image.height * ratio))), Image.LANCZOS)
+    buffer = io.BytesIO()
+    quality = transformation.get("q", "90")
+    image.save(buffer, "JPEG", quality=int(quality) if quality.isdigit() else 90)
+    return buffer.getvalue()
+
+
+def _served(kind, body):
+    stats[kind]["requests"] += 1
+    stats[kind]["bytes"] += len(body)
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+
+@app.get("/{cloud_name}/{resource_type}/{delivery_type}/{path:path}")
+def deliver(cloud_name: str, resource_type: str, delivery_type: str, path: str, request: Request):
+    signed, transformation, public_id = parse_path(path)
+    stats["resource_types"][resource_type] = stats["resource_types"].get(resource_type, 0) + 1
+    if delivery_type == "authenticated" and not signed:
+        raise HTTPException(status_code=401, detail="Authenticated assets need a signed URL")
+    file_path = find_file(public_id)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail=f"Resource not found: {public_id}")
+
+    if transformation:
+        if resource_type == "raw":
+            raise HTTPException(status_code=400, detail="Transformations are not supported for raw assets")
+        body = derivative(file_path, transformation)
+        _served("derivative", body)
+        return Response(body, media_type="image/jpeg")
+
+    with open(file_path, "rb") as f:
+        data = f.read()
+    range_match = _RANGE.match(request.headers.get("range", ""))
+    if range_match and (range_match.group(1) or range_match.group(2)):
+        start, end = range_match.groups()
+        if start:
+            start, end = int(start), min(int(end) if end else len(data) - 1, len(data) - 1)
+        else:
+            start, end = max(0, len(data) - int(end)), len(data) - 1
+        if start >= len(data):
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{len(data)}"})
+        body = data[start:end + 1]
+        _served("range", body)
+        return Response(body, status_code=206, media_type="application/octet-stream", headers={
+            "Content-Range": f"bytes {start}-{end}/{len(data)}",
+            "Accept-Ranges": "bytes",
+        })
+    _served("original", data)
+    return Response(data, media_type="application/octet-stream", headers={"Accept-Ranges": "bytes"})
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.getenv("CLOUDINARY_STUB_PORT", "5056"))
+    print(f"Cloudinary stub serving {STUB_DIR} on http://127.0.0.1:{port}")
+    uvicorn.run(app, host="127.0.0.1", port=port)
@@ -0,0 +1,329 @@
+"""Normalized district-name index shared by the yield, soil and geocoding paths.
+
+The ICRISAT yield data, the soil-health CSV, the offline geocoder and
+Nominatim all spell districts differently ("S.P.S. Nellore" /
+"S.P.S.Nellore", "Rae-Bareily" / "Rae - Bareily", "Bijapur / Vijayapura",
+"Barddhaman" for "Burdwan"). A DistrictNameIndex is built once per dataset and
+resolves a name in this order:
+
+  1. exact match on the normalized key (case, punctuation, "District" and
+     "- II"-style suffixes ignored, word order ignored);
+  2. the alias table, one hop: ``ALIASES`` maps geocoder, administrative and
+     soil-CSV spellings to the ICRISAT yield spelling, and ``SOIL_ALIASES``
+     maps names to the soil-CSV spelling where that differs (see
+     ``soil_aliases``). Every target is a real dataset name and no alias
+     points back at another;
+  3. alternate spellings inside a dataset name or the query ("Kodagu / Coorg",
+     "Phulbani ( Kandhamal )", "Bangalore(Rural)" -> "Bangalore");
+  4. fuzzy match through a trigram index, confirmed by an edit-distance ratio
+     of at least ``DISTRICT_FUZZY_MIN_SCORE``, against dataset names first and
+     then alias names. Only names from the caller's state are candidates, and
+     without a state there is no fuzzy step: "Ramgarh" (Jharkhand) must not
+     become "Rajgarh" (Madhya Pradesh).
+
+Steps 1-3 are dict lookups; step 4 only scores names that share trigrams with
+the query. Results are memoized per index. Extra aliases can be supplied as a
+JSON object ``{"alias": "yield dataset name"}`` in ``DISTRICT_ALIASES_PATH``.
+"""
+import difflib
+import json
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+ALIASES_PATH = os.getenv("DISTRICT_ALIASES_PATH")
+FUZZY_MIN_SCORE = float(os.getenv("DISTRICT_FUZZY_MIN_SCORE", "0.85"))
+FUZZY_CANDIDATES = 8
+MEMO_SIZE = int(os.getenv("DISTRICT_NAME_MEMO_SIZE", "4096"))
+
+# Geocoder, administrative and soil-CSV spellings -> the ICRISAT yield spelling.
+ALIASES = {
+    "Purba Bardhaman": "Burdwan",
+    "Paschim Bardhaman": "Burdwan",
+    "Bardhaman": "Burdwan",
+    "Kalna": "Burdwan",
+    "Kalyani": "Nadia",
+    "Raiganj": "West Dinajpur",
+    "Uttar Dinajpur": "West Dinajpur",
+    "Dakshin Dinajpur": "West Dinajpur",
+    "Kolkata": "24 Parganas",
+    "North 24 Parganas": "24 Parganas",
+    "South 24 Parganas": "24 Parganas",
+    "24 - Paraganas North": "24 Parganas",
+    "24 - Paraganas South": "24 Parganas",
+    "Purba Medinipur": "Midnapur",
+    "Paschim Medinipur": "Midnapur",
+    "East Midnapore": "Midnapur",
+    "West Midnapore": "Midnapur",
+    "East Midnapore Purba Midnapore": "Midnapur",
+    "Bengaluru": "Bangalore",
+    "Bengaluru Urban": "Bangalore",
+    "Bengaluru Rural": "Bangalore",
+    "Mysuru": "Mysore",
+    "Belagavi": "Belgaum",
+    "Sri Potti Sriramulu Nellore": "S.P.S. Nellore",
+    "Nellore": "S.P.S. Nellore",
+    "Prayagraj": "Allahabad",
+    "Gurugram": "Gurgaon",
+    "Nashik": "Nasik",
+    "Mumbai": "Bombay",
+    "Mumbai Suburban": "Bombay",
+    "Mumbai sub": "Bombay",
+    "Rupnagar": "Roopnagar / Ropar",
+    "Kalaburagi": "Gulbarga / Kalaburagi",
+    "Coorg": "Kodagu / Coorg",
+    "Bhojpur": "Shahabad (now part of Bhojpur district)",
+    "Kanpur Nagar": "Kanpur",
+    "Kanpur Dehat": "Kanpur",
+    "Singhbhum East": "Singhbhum",
+    "Singhbhum West": "Singhbhum",
+}
+
+# Names -> soil-CSV spelling, where it differs from the yield spelling ALIASES gives.
+SOIL_ALIASES = {
+    "West Dinajpur": "Uttar Dinajpur",
+    "24 Parganas": "24 - Paraganas North",
+    "South 24 Parganas": "24 - Paraganas South",
+    "Midnapur": "West Midnapore",
+    "Purba Medinipur": "East Midnapore Purba Midnapore",
+    "East Midnapore": "East Midnapore Purba Midnapore",
+    "Bangalore": "Bangalore(Urban)",
+    "Bengaluru Rural": "Bangalore(Rural)",
+    "Bombay": "Mumbai sub",
+    "Roopnagar / Ropar": "Roopnagar",
+    "Gulbarga / Kalaburagi": "Gulbarga",
+    "Kodagu / Coorg": "Kodagu",
+    "Shahabad (now part of Bhojpur district)": "Bhojpur",
+    "Shahabad": "Bhojpur",
+    "Kanpur": "Kanpur Nagar",
+    "Singhbhum": "Singhbhum East",
+}
+
+# Geocoder spellings of state names -> the ICRISAT spelling.
+STATE_ALIASES = {
+    "Odisha": "Orissa",
+    "Uttaranchal": "Uttarakhand",
+    "Chattisgarh": "Chhattisgarh",
+}
+
+_SUFFIX = re.compile(r"\s*[-–]\s*(i{1,3}|iv|v|vi{1,3}|ix|x|\d+)$")
+_PARENS = re.compile(r"\(([^()]*)\)?")
+# Parenthesized words that qualify a district rather than rename it.
+_QUALIFIERS = {"rural", "urban", "metro", "north", "south", "east", "west", "sub"}
+_STOPWORDS = {"district"}
+
+
+def normalize_name(name):
+    """Order-insensitive lookup key: ASCII, lower-case, punctuation and "district" dropped."""
+    if not isinstance(name, str):
+        return None
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower().strip()
+    text = _SUFFIX.sub("", text).replace("&", " and ")
+    tokens = [t for t in re.split(r"[^a-z0-9]+", text) if t and t not in _STOPWORDS]
+    return " ".join(sorted(tokens))
+
+
+def normalize_state(state):
+    """Lookup key for a state name, with geocoder spellings mapped to the dataset's."""
+    key = normalize_name(state)
+    if not key:
+        return None
+    return _STATE_KEYS.get(key, key)
+
+
+_STATE_KEYS = {normalize_name(alias): normalize_name(state) for alias, state in STATE_ALIASES.items()}
+
+
+def name_variants(name):
+    """Keys of the alternate spellings embedded in a name ("A / B", "A (B)")."""
+    text = name.lower()
+    variants = []
+    base = _PARENS.sub(" ", text)
+    for inner in _PARENS.findall(text):
+        inner = inner.strip()
+        if inner and not inner.startswith("now ") and normalize_name(inner) not in _QUALIFIERS:
+            variants.append(inner)
+    if base != text:
+        variants.append(base)
+    for part in (base.split("/") if "/" in base else []):
+        variants.append(part)
+    return [key for key in dict.fromkeys(normalize_name(v) for v in variants) if key]
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class NameMatch:
+    name: str
+    method: str  # "exact", "alias", "variant" or "fuzzy"
+    score: float = 1.0
+
+
+class _TrigramIndex:
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.postings = {}
+        for i, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                self.postings.setdefault(gram, []).append(i)
+
+    def best(self, key, min_score, accept=None):
+        """Return (key, score) of the closest indexed key, or None below ``min_score``.
+
+        ``accept(indexed_key)`` filters candidates before scoring.
+        """
+        shared = {}
+        for gram in trigrams(key):
+            for i in self.postings.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        candidates = [i for i in sorted(shared, key=shared.get, reverse=True) if accept is None or accept(self.keys[i])]
+        if not candidates:
+            return None
+        candidates = candidates[:FUZZY_CANDIDATES]
+        scored = sorted(
+            ((difflib.SequenceMatcher(None, key, self.keys[i]).ratio(), self.keys[i]) for i in candidates),
+            reverse=True,
+        )
+        score, best = scored[0]
+        return (best, score) if score >= min_score else None
+
+
+class DistrictNameIndex:
+    """Name index of one dataset; ``states`` (parallel to ``names``, "" when unknown) enables fuzzy matching."""
+
+    def __init__(self, names, aliases=None, min_score=FUZZY_MIN_SCORE, states=None):
+        self.min_score = min_score
+        self._names = {}
+        self._variants = {}
+        # Dataset spelling -> normalized states it belongs to.
+        self._states = {}
+        for name, state in zip(names, states if states is not None else [None] * len(names)):
+            name = str(name)
+            key = normalize_name(name)
+            if key:
+                # Keep the first spelling per key, like the dataset lookups.
+                name = self._names.setdefault(key, name)
+                state = normalize_state(state)
+                if state:
+                    self._states.setdefault(name, set()).add(state)
+        for key, name in list(self._names.items()):
+            for variant in name_variants(name):
+                if variant not in self._names:
+                    self._variants.setdefault(variant, name)
+
+        self._aliases = {}
+        for alias, target in (ALIASES if aliases is None else aliases).items():
+            alias_key, target_key = normalize_name(alias), normalize_name(target)
+            if alias_key and target_key and alias_key != target_key:
+                self._aliases[alias_key] = target_key
+
+        self._fuzzy_names = _TrigramIndex(list(self._names) + list(self._variants))
+        self._fuzzy_aliases = _TrigramIndex(self._aliases)
+        self._memo = {}
+        self._lock = threading.Lock()
+        self.counts = {"exact": 0, "alias": 0, "variant": 0, "fuzzy": 0, "miss": 0, "memo_hits": 0}
+
+    def __len__(self):
+        return len(self._names)
+
+    def in_state(self, name, state):
+        return state in self._states.get(name, ())
+
+    def _lookup(self, key, variants=(), state=None):
+        chain = [key]
+        if key in self._aliases:
+            chain.append(self._aliases[key])
+        for i, k in enumerate(chain):
+            if k in self._names:
+                return NameMatch(self._names[k], "exact" if i == 0 else "alias")
+        for k in chain:
+            if k in self._variants:
+                return NameMatch(self._variants[k], "variant")
+        # Alternate spellings inside the query itself ("Gulbarga / Kalaburagi").
+        for variant in variants:
+            match = self._lookup(variant)
+            if match is not None:
+                return NameMatch(match.name, "variant")
+        if state is None:
+            return None
+
+        def same_state(k):
+            return self.in_state(self._names.get(k) or self._variants[k], state)
+
+        for k in chain:
+            hit = self._fuzzy_names.best(k, self.min_score, same_state)
+            if hit is not None:
+                return NameMatch(self._names.get(hit[0]) or self._variants[hit[0]], "fuzzy", round(hit[1], 3))
+
+        def alias_in_state(k):
+            match = self._lookup(k)
+            return match is not None and self.in_state(match.name, state)
+
+        hit = self._fuzzy_aliases.best(key, self.min_score, alias_in_state)
+        if hit is not None:
+            match = self._lookup(hit[0])
+            return NameMatch(match.name, "fuzzy", round(hit[1] * match.score, 3))
+        return None
+
+    def resolve(self, name, state=None):
+        """NameMatch for ``name`` in this dataset, or None.
+
+        Fuzzy matches are only tried when ``state`` is given, and only against
+        names of that state.
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        state = normalize_state(state)
+        memo_key = (key, state)
+        if memo_key in self._memo:
+            self.counts["memo_hits"] += 1
+            return self._memo[memo_key]
+        match = self._lookup(key, name_variants(name), state)
+        with self._lock:
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            self._memo[memo_key] = match
+            self.counts[match.method if match else "miss"] += 1
+        return match
+
+    def stats(self):
+        return {
+            "names": len(self._names),
+            "variants": len(self._variants),
+            "aliases": len(self._aliases),
+            "memoized": len(self._memo),
+            **self.counts,
+        }
+
+
+def soil_aliases(aliases):
+    """Alias table for the soil CSV: each yield target replaced by its soil spelling.
+
+    Aliases that are soil spellings themselves are left out, so no entry points at another.
+    """
+    soil_names = {normalize_name(name) for name in SOIL_ALIASES.values()}
+    table = {
+        alias: SOIL_ALIASES.get(target, target)
+        for alias, target in aliases.items()
+        if normalize_name(alias) not in soil_names
+    }
+    table.update(SOIL_ALIASES)
+    return table
+
+
+def load_aliases(path=ALIASES_PATH):
+    """Built-in aliases extended (or overridden) by the JSON file at ``path``."""
+    aliases = dict(ALIASES)
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                aliases.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"[district_names] Ignoring alias file {path}: {e}")
+    return aliases
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from district_names import DistrictNameIndex, NameMatch, load_aliases, soil_aliases
+
+# --- Paths ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+YIELD_CSV = os.path.join(DATA_DIR, "ICRISAT-District_Level_Data_30_Years.csv")
+SOIL_CSV = os.path.join(DATA_DIR, "SoilHealthScores_by_District_2.csv")
+CACHE_DIR = os.getenv("DISTRICT_CACHE_DIR", os.path.join(DATA_DIR, ".cache"))
+CACHE_FILE = os.path.join(CACHE_DIR, "district_store.npz")
+
+# Bump when the cached array layout changes so stale caches are rebuilt.
+CACHE_FORMAT_VERSION = 2
+YIELD_SUFFIX = " YIELD (Kg per ha)"
+
+
+def normalize_district_key(name):
+    """Key used for every district lookup: lower-cased, whitespace collapsed."""
+    if not isinstance(name, str):
+        return None
+    return " ".join(name.split()).lower()
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def series_hash(years, values):
+    """Stable fingerprint of one yield series, used to detect changed inputs."""
+    digest = hashlib.sha1(np.ascontiguousarray(years, dtype=np.int16).tobytes())
+    digest.update(np.ascontiguousarray(values, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def get_soil_category(score):
+    if score == 0:
+        return "No Soil Health Data"
+    elif score >= 4.5:
+        return "Very Excellent Soil Health"
+    elif score >= 4:
+        return "Excellent Soil Health"
+    elif score >= 3:
+        return "Good Soil Health"
+    elif score >= 2:
+        return "Poor Soil Health"
+    else:
+        return "Very Poor Soil Health"
+
+
+def _group_offsets(keys):
+    """Return (unique_keys, offsets) for an array that is already sorted by key."""
+    if len(keys) == 0:
+        return np.array([], dtype=str), np.zeros(1, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    offsets = np.r_[starts, len(keys)].astype(np.int64)
+    return keys[starts], offsets
+
+
+class DistrictStore:
+    """Read-only, in-memory view of the district yield and soil datasets.
+
+    Yields are kept as one float32 matrix (rows x crops) sorted by district key
+    and year, so a district lookup is a dict hit followed by a slice. Names
+    that miss the exact key go through a DistrictNameIndex per dataset
+    (aliases, alternate spellings, fuzzy match), built on first use.
+    """
+
+    def __init__(self, arrays, checksums):
+        self.checksums = checksums
+        self.crop_names = [str(c) for c in arrays["crop_names"]]
+        self.crop_columns = {c: f"{c}{YIELD_SUFFIX}" for c in self.crop_names}
+        self._crop_pos = {c: i for i, c in enumerate(self.crop_names)}
+
+        self.years = arrays["years"]
+        self.yields = arrays["yields"]
+        self.dist_names = arrays["dist_names"]
+        self.state_names = arrays["state_names"]
+        offsets = arrays["yield_offsets"]
+        self._yield_index = {
+            str(k): (int(offsets[i]), int(offsets[i + 1]))
+            for i, k in enumerate(arrays["yield_keys"])
+        }
+        self._yield_display = {key: str(self.dist_names[start]) for key, (start, _) in self._yield_index.items()}
+        self._yield_states = {
+            key: sorted(set(map(str, self.state_names[start:end]))) for key, (start, end) in self._yield_index.items()
+        }
+
+        self.soil_names = arrays["soil_names"]
+        self.soil_scores = arrays["soil_scores"]
+        self.soil_lat = arrays["soil_lat"]
+        self.soil_lon = arrays["soil_lon"]
+        # State from the ICRISAT row with the same Dist Code ("" when unknown).
+        self.soil_states = arrays["soil_states"]
+        self.soil_categories = [get_soil_category(s) for s in self.soil_scores]
+        self._soil_index = {}
+        for i, name in enumerate(self.soil_names):
+            # Keep the first row per district, as the old DataFrame filter did.
+            self._soil_index.setdefault(normalize_district_key(str(name)), i)
+        self._name_indexes = None
+        self._name_lock = threading.Lock()
+
+    # --- Name resolution ---
+    def name_indexes(self):
+        """(yield, soil) DistrictNameIndex pair, built once."""
+        if self._name_indexes is None:
+            with self._name_lock:
+                if self._name_indexes is None:
+                    aliases = load_aliases()
+                    yield_names, yield_states = [], []
+                    for key, display in self._yield_display.items():
+                        for state in self._yield_states[key]:
+                            yield_names.append(display)
+                            yield_states.append(state)
+                    self._name_indexes = (
+                        DistrictNameIndex(yield_names, aliases, states=yield_states),
+                        DistrictNameIndex(self.soil_names, soil_aliases(aliases), states=self.soil_states),
+                    )
+        return self._name_indexes
+
+    def _resolve_key(self, name, index, dataset, state=None):
+        key = normalize_district_key(name)
+        if key is None or key in index:
+            return key
+        if state is None and key in self._yield_index and len(self._yield_states[key]) == 1:
+            # A yield-dataset name carries its state into the soil lookup.
+            state = self._yield_states[key][0]
+        match = self.name_indexes()[dataset].resolve(name, state)
+        return normalize_district_key(match.name) if match else key
+
+    def match_district(self, name, state=None):
+        """NameMatch of ``name`` against the yield dataset spellings, or None.
+
+        Fuzzy matches need ``state`` (as geocoded or requested) and stay within it.
+        """
+        key = normalize_district_key(name)
+        if key in self._yield_index:
+            return NameMatch(self._yield_display[key], "exact")
+        return self.name_indexes()[0].resolve(name, state)
+
+    def name_stats(self):
+        if self._name_indexes is None:
+            return {"built": False}
+        yield_names, soil_names = self._name_indexes
+        return {"built": True, "yield": yield_names.stats(), "soil": soil_names.stats()}
+
+    # --- Lookups ---
+    def has_district(self, name, state=None):
+        return (self._resolve_key(name, self._yield_index, 0, state) in self._yield_index
+                and self._resolve_key(name, self._soil_index, 1, state) in self._soil_index)
+
+    def district_rows(self, name, state=None):
+        """Return (years, yields) for a district, or (None, None) if unknown."""
+        span = self._yield_index.get(self._resolve_key(name, self._yield_index, 0, state))
+        if span is None:
+            return None, None
+        start, end = span
+        return self.years[start:end], self.yields[start:end]
+
+    def crop_series(self, name, crop):
+        """Return (years, values) for one crop of one district with NaNs dropped."""
+        years, rows = self.district_rows(name)
+        if years is None or crop not in self._crop_pos:
+            return None, None
+        values = rows[:, self._crop_pos[crop]]
+        mask = ~np.isnan(values)
+        return years[mask], values[mask]
+
+    def iter_series(self):
+        """Yield (district_key, crop, years, values) for every non-empty series."""
+        for key, (start, end) in self._yield_index.items():
+            years = self.years[start:end]
+            for j, crop in enumerate(self.crop_names):
+                values = self.yields[start:end, j]
+                mask = ~np.isnan(values)
+                if mask.any():
+                    yield key, crop, years[mask], values[mask]
+
+    def yield_frame(self, name, state=None):
+        """DataFrame shaped like the ICRISAT rows of a district (Year + yield columns)."""
+        years, rows = self.district_rows(name, state)
+        if years is None:
+            return None
+        frame = pd.DataFrame(rows.astype(np.float64), columns=[self.crop_columns[c] for c in self.crop_names])
+        frame.insert(0, "Year", years.astype(np.int64))
+        return frame
+
+    def soil(self, name, state=None):
+        """Return (score, category) for a district, or None if unknown."""
+        i = self._soil_index.get(self._resolve_key(name, self._soil_index, 1, state))
+        if i is None:
+            return None
+        return float(self.soil_scores[i]), self.soil_categories[i]
+
+    # --- Construction ---
+    @staticmethod
+    def arrays_from_csv(yield_csv=YIELD_CSV, soil_csv=SOIL_CSV):
+        yield_df = pd.read_csv(yield_csv)
+        soil_df = pd.read_csv(soil_csv)
+
+        yield_columns = [col for col in yield_df.columns if YIELD_SUFFIX.strip() in col]
+        yield_df["_key"] = yield_df["Dist Name"].map(normalize_district_key)
+        yield_df = yield_df.sort_values(["_key", "Year"], kind="stable").reset_index(drop=True)
+        yield_keys, yield_offsets = _group_offsets(yield_df["_key"].to_numpy(dtype=str))
+
+        states = yield_df.drop_duplicates("Dist Code").set_index("Dist Code")["State Name"]
+        soil_states = soil_df["Dist Code"].map(states).fillna("")
+
+        return {
+            "crop_names": np.array([col.split(" YIELD")[0] for col in yield_columns], dtype=str),
+            "years": yield_df["Year"].to_numpy(dtype=np.int16),
+            "yields": np.ascontiguousarray(yield_df[yield_columns].to_numpy(dtype=np.float32)),
+            "dist_names": yield_df["Dist Name"].to_numpy(dtype=str),
+            "state_names": yield_df["State Name"].to_numpy(dtype=str),
+            "yield_keys": yield_keys,
+            "yield_offsets": yield_offsets,
+            "soil_names": soil_df["Dist Name"].to_numpy(dtype=str),
+            "soil_scores": soil_df["SoilHealthScore"].to_numpy(dtype=np.float64),
+            "soil_lat": soil_df["Latitude"].to_numpy(dtype=np.float64),
+            "soil_lon": soil_df["Longitude"].to_numpy(dtype=np.float64),
+            "soil_states": soil_states.to_numpy(dtype=str),
+        }
+
+    @classmethod
+    def load(cls, yield_csv=YIELD_CSV, soil_csv=SOIL_CSV, cache_file=CACHE_FILE):
+        """Load from the binary cache when its checksums match the CSVs, else rebuild it."""
+        checksums = {
+            "format": CACHE_FORMAT_VERSION,
+            "yield_csv": file_checksum(yield_csv),
+            "soil_csv": file_checksum(soil_csv),
+        }
+
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with np.load(cache_file, allow_pickle=False) as cached:
+                    if json.loads(str(cached["meta"])) == checksums:
+                        return cls({k: cached[k] for k in cached.files if k != "meta"}, checksums)
+            except Exception as e:
+                print(f"[district_store] Ignoring unreadable cache {cache_file}: {e}")
+
+        arrays = cls.arrays_from_csv(yield_csv, soil_csv)
+        if cache_file:
+            try:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                tmp_path = f"{cache_file}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.savez(f, meta=np.array(json.dumps(checksums)), **arrays)
+                os.replace(tmp_path, cache_file)
+            except OSError as e:
+                print(f"[district_store] Could not write cache {cache_file}: {e}")
+        return cls(arrays, checksums)
+
+
+# --- Process-wide singleton ---
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_district_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DistrictStore.load()
+    return _store
+
+
+def name_stats():
+    """District-name index counters, without loading the store."""
+    return _store.name_stats() if _store is not None else {"built": False}
@@ -1,32 +1,79 @@
-from flask import Flask, request, jsonify
+import functools
+import io
+import multiprocessing
 import os
+import time
 from PIL import Image
 import piexif
-import cv2
 import numpy as np
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-import torch
-import timm
-from torchvision import transforms
-import torch.nn.functional as F
 import pandas as pd
-import re
-from prophet import Prophet
-from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
-import requests
 import json
+import http_client
+from district_store import get_district_store, get_soil_category
+from forecasting import ForecastSession, get_forecaster
+from forecast_table import get_forecast_table
+import geocoder
+import geocache
+from batching import MicroBatcher
+from image_input import ClaimImage, ImageNotFoundError
+from model_registry import registry
+import workpools
+from result_cache import get_result_cache
+
+# --- Error Level Analysis ---
+# Longest side the ELA step works at; 0 keeps the full resolution.
+ELA_MAX_SIDE = int(os.getenv("ELA_MAX_SIDE", "1024"))
+ELA_QUALITY = 90
+ELA_SCALE = 10
+
+def error_level_analysis(image, max_side=ELA_MAX_SIDE, quality=ELA_QUALITY):
+    """Re-encode in memory and return (std_dev of the amplified error, working size)."""
+    working = image
+    if max_side and max(image.size) > max_side:
+        ratio = max_side / max(image.size)
+        working = image.resize((max(1, round(image.width * ratio)), max(1, round(image.height * ratio))), Image.BILINEAR, reducing_gap=2.0)
+    buffer = io.BytesIO()
+    working.save(buffer, 'JPEG', quality=quality)
+    buffer.seek(0)
+    original = np.asarray(working, dtype=np.int16)
+    resaved = np.asarray(Image.open(buffer).convert('RGB'), dtype=np.int16)
+    # Equivalent to Image.blend(original, resaved, alpha=ELA_SCALE) without the extra images.
+    ela = np.clip(original + ELA_SCALE * (resaved - original), 0, 255)
+    return float(ela.std()), working.size
+
+# --- Result caching ---
+# Stage results are cached by image content hash; bump a version to invalidate.
+EXIF_CACHE_VERSION = f"exif-v1/ela-{ELA_MAX_SIDE}-q{ELA_QUALITY}"
+
+def _cached_stage(stage, claim_image, version, compute, cacheable):
+    result, hit = get_result_cache().cached(stage, claim_image.sha256, version, compute, cacheable)
+    if hit:
+        result = dict(result, cached=True)
+    return result
 
 # --- EXIF Metadata Extraction ---
-def get_exif_data(image_path):
-    if not os.path.exists(image_path):
-        return {"error": f"File not found at path {image_path}"}
+def get_exif_data(image_source, ela=True):
+    """EXIF/ELA authenticity check; accepts a path, bytes, PIL image or ClaimImage.
 
+    With ``ela=False`` only the metadata is checked, so a ClaimImage holding
+    just the Exif header is enough.
+    """
+    try:
+        claim_image = ClaimImage.from_source(image_source)
+    except ImageNotFoundError:
+        return {"error": f"File not found at path {image_source}"}
+    return _cached_stage(
+        "exif", claim_image, EXIF_CACHE_VERSION if ela else "exif-v1/no-ela",
+        lambda: _analyze_exif(claim_image, ela),
+        cacheable=lambda result: "error" not in result and result.get("address") != "Geocoder error",
+    )
+
+def _analyze_exif(claim_image, ela=True):
     suspicious_reasons = []
     authenticity_score = 100
 
     try:
-        exif_dict = piexif.load(image_path)
+        exif_dict = claim_image.exif()
         gps_info = exif_dict.get('GPS', {})
 
         def _convert_to_degrees(value):
@@ -50,9 +97,7 @@ def get_exif_data(image_path):
         address = None
         if lat and lon:
             try:
-                geolocator = Nominatim(user_agent="agrisure_exif_reader")
-                location = geolocator.reverse((lat, lon), timeout=10)
-                address = location.address if location else None
+                address = geocache.reverse(lat, lon)["address"]
             except:
                 address = "Geocoder error"
 
@@ -70,21 +115,21 @@ def get_exif_data(image_path):
             suspicious_reasons.append(f"Image was edited using software: {software}")
             authenticity_score -= 25
 
-        try:
-            ela_path = image_path.replace(".jpg", "_ela.jpg")
-            original = Image.open(image_path).convert('RGB')
-            original.save(ela_path, 'JPEG', quality=90)
-            ela_image = Image.open(ela_path)
-            ela = Image.blend(original, ela_image, alpha=10)
-            ela_cv = np.array(ela)
-            std_dev = np.std(ela_cv)
-            if std_dev > 25:
-                suspicious_reasons.append("High ELA deviation — possible image tampering.")
-                authenticity_score -= 15
-            os.remove(ela_path)
-        except:
-            suspicious_reasons.append("ELA check failed.")
-            authenticity_score -= 5
+        ela_report = {"std_dev": None, "working_resolution": None, "elapsed_ms": None}
+        if not ela:
+            ela_report["skipped"] = True
+        else:
+            ela_start = time.perf_counter()
+            try:
+                std_dev, working_size = error_level_analysis(claim_image.rgb())
+                ela_report.update(std_dev=round(std_dev, 3), working_resolution=list(working_size))
+                if std_dev > 25:
+                    suspicious_reasons.append("High ELA deviation — possible image tampering.")
+                    authenticity_score -= 15
+            except:
+                suspicious_reasons.append("ELA check failed.")
+                authenticity_score -= 5
+            ela_report["elapsed_ms"] = round((time.perf_counter() - ela_start) * 1000, 2)
 
         return {
             "verifier": "exif_metadata_reader",
@@ -94,80 +139,105 @@ def get_exif_data(image_path):
             "gps_longitude": lon,
             "address": address,
             "authenticity_score": max(0, authenticity_score),
-            "suspicious_reasons": suspicious_reasons or ["None"]
+            "suspicious_reasons": suspicious_reasons or ["None"],
+            "ela": ela_report
         }
     except Exception as e:
         return {"error": f"Failed to analyze image: {str(e)}"}
 
+# --- Model registry ---
+# Classifiers (and torch with them) load on first use or at warm-up, so
+# workers that never serve the vision endpoints never import torch.
+def _vision_loader(name):
+    def load():
+        from model_backends import load_vision_model
+        return load_vision_model(name)
+    return load
+
+registry.register("damage_model", _vision_loader("damage"), group="vision")
+registry.register("crop_type_model", _vision_loader("crop_type"), group="vision")
+
 # --- Crop Damage Detection ---
-device = "cuda" if torch.cuda.is_available() else "cpu"
-val_transform = transforms.Compose([
-    transforms.Resize((384, 384)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-])
-model_damage = timm.create_model('efficientnetv2_rw_m', pretrained=False, num_classes=2)
-model_damage.load_state_dict(torch.load("models/efficientnetv2_rw_m_crop_damage.pt", map_location=device))
-model_damage.to(device)
-model_damage.eval()
-class_names = ['damaged', 'non_damaged']
-
-def predict_damage(image_path):
-    if not os.path.exists(image_path):
-        return {"status": "error", "message": f"File not found: {image_path}"}
+def _damage_forward(tensors):
+    return registry.get("damage_model").probabilities(tensors)
+
+damage_batcher = MicroBatcher(
+    "damage", _damage_forward,
+    max_batch_size=int(os.getenv("DAMAGE_BATCH_SIZE", "8")),
+    max_wait_ms=float(os.getenv("INFERENCE_MAX_WAIT_MS", "10")),
+    max_queue=int(os.getenv("INFERENCE_QUEUE_SIZE", "256")),
+)
+
+def predict_damage(image_source):
+    try:
+        claim_image = ClaimImage.from_source(image_source)
+    except ImageNotFoundError:
+        return {"status": "error", "message": f"File not found: {image_source}"}
 
     try:
-        image = Image.open(image_path).convert('RGB')
-        input_tensor = val_transform(image).unsqueeze(0).to(device)
-        with torch.no_grad():
-            output = model_damage(input_tensor)
-            probs = torch.softmax(output, dim=1)
-            predicted_class = torch.argmax(probs, dim=1).item()
-            confidence = float(probs[0][predicted_class].item())
-        predicted_label = class_names[predicted_class]
+        model = registry.get("damage_model")
+        return _cached_stage(
+            "damage", claim_image, model.fingerprint,
+            lambda: _classify_damage(model, claim_image),
+            cacheable=lambda result: result["status"] == "success",
+        )
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def _classify_damage(model, claim_image):
+    try:
+        image = claim_image.rgb()
+        probs = damage_batcher.infer(model.transform(image))
+        predicted_class = int(probs.argmax())
+        confidence = float(probs[predicted_class])
+        predicted_label = model.labels[predicted_class]
         return {
             "verifier": "crop_damage_classifier",
             "model": "efficientnetv2_rw_m",
+            "backend": model.backend,
+            "precision": model.precision,
             "prediction": predicted_label,
             "confidence": round(confidence * 100, 2),
-            "class_names": class_names,
+            "class_names": model.labels,
             "status": "success"
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 # --- Crop Type Detection ---
-val_transforms_crop = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-])
-idx_to_class = {
-    0: 'Coffee-plant', 1: 'Cucumber', 2: 'Fox_nut(Makhana)', 3: 'Lemon', 4: 'Olive-tree',
-    5: 'Pearl_millet(bajra)', 6: 'Tobacco-plant', 7: 'almond', 8: 'banana', 9: 'cardamom',
-    10: 'cherry', 11: 'chilli', 12: 'clove', 13: 'coconut', 14: 'cotton', 15: 'gram',
-    16: 'jowar', 17: 'jute', 18: 'maize', 19: 'mustard-oil', 20: 'papaya', 21: 'pineapple',
-    22: 'rice', 23: 'soyabean', 24: 'sugarcane', 25: 'sunflower', 26: 'tea', 27: 'tomato',
-    28: 'vigna-radiati(Mung)', 29: 'wheat'
-}
-model_crop = timm.create_model('convnext_tiny', pretrained=False, num_classes=30)
-model_crop.load_state_dict(torch.load('models/crop_type_detection_model.pth', map_location=device))
-model_crop.to(device)
-model_crop.eval()
-
-def predict_crop(image_path):
-    if not os.path.exists(image_path):
-        return {"status": "error", "message": f"File not found: {image_path}"}
+def _crop_forward(tensors):
+    return registry.get("crop_type_model").probabilities(tensors)
+
+crop_batcher = MicroBatcher(
+    "crop_type", _crop_forward,
+    max_batch_size=int(os.getenv("CROP_BATCH_SIZE", "16")),
+    max_wait_ms=float(os.getenv("INFERENCE_MAX_WAIT_MS", "10")),
+    max_queue=int(os.getenv("INFERENCE_QUEUE_SIZE", "256")),
+)
+
+def predict_crop(image_source):
+    try:
+        claim_image = ClaimImage.from_source(image_source)
+    except ImageNotFoundError:
+        return {"status": "error", "message": f"File not found: {image_source}"}
+
+    try:
+        model = registry.get("crop_type_model")
+        return _cached_stage(
+            "crop_type", claim_image, model.fingerprint,
+            lambda: _classify_crop(model, claim_image),
+            cacheable=lambda result: result["status"] == "success",
+        )
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
+def _classify_crop(model, claim_image):
     try:
-        image = Image.open(image_path).convert('RGB')
-        image_tensor = val_transforms_crop(image).unsqueeze(0).to(device)
-        with torch.no_grad():
-            outputs = model_crop(image_tensor)
-            probs = F.softmax(outputs, dim=1)
-            conf, pred = torch.max(probs, 1)
-            predicted_label = idx_to_class[pred.item()]
-            confidence = round(float(conf.item()) * 100, 2)
+        image = claim_image.rgb()
+        probs = crop_batcher.infer(model.transform(image))
+        conf, pred = probs.max(0)
+        predicted_label = model.labels[int(pred)]
+        confidence = round(float(conf) * 100, 2)
         return {
             "status": "success",
             "predicted_class": predicted_label,
@@ -176,102 +246,134 @@ def predict_crop(image_path):
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+# --- Duplicate image detection ---
+def check_image_reuse(image_source, claim_id, max_matches=5):
+    """Record an image under ``claim_id`` and report near-duplicates seen on other claims."""
+    claim_image = ClaimImage.from_source(image_source)
+    cache = get_result_cache()
+    # A byte-identical image was hashed before, so it need not be decoded again.
+    phash = cache.known_phash(claim_image.sha256)
+    if phash is None:
+        phash = claim_image.phash()
+    matches = cache.check_duplicates(claim_image.sha256, phash, claim_id)
+    return {
+        "sha256": claim_image.sha256,
+        "phash": f"{phash:016x}",
+        "duplicate": bool(matches),
+        "matches": matches[:max_matches]
+    }
+
+def inference_metrics():
+    backends = {}
+    for name, component in (("damage", "damage_model"), ("crop_type", "crop_type_model")):
+        if registry.is_loaded(component):
+            model = registry.get(component)
+            backends[name] = f"{model.backend}/{model.precision}"
+        else:
+            backends[name] = "not loaded"
+    return {
+        "backends": backends,
+        "damage": damage_batcher.metrics(),
+        "crop_type": crop_batcher.metrics()
+    }
+
 # --- Crop Yield Prediction Utilities ---
 def get_district_from_coordinates(lat, lon):
-    geolocator = Nominatim(user_agent="agrisure-ai")
+    """Return (district, state, place_name, error); state is None when the geocoder does not know it."""
+    # Offline centroid/polygon lookup first; Nominatim only when it is unsure.
+    match = geocoder.lookup_district(lat, lon)
+    if match is not None and match.confident:
+        return match.district, match.state, match.district, None
+
+    from geopy.exc import GeocoderTimedOut
     try:
-        location = geolocator.reverse((lat, lon), language="en", timeout=10)
+        location = geocache.reverse(lat, lon)
     except GeocoderTimedOut:
-        return None, None, "Reverse geocoding service timed out."
-    if not location or 'address' not in location.raw:
-        return None, None, "Could not get district from coordinates."
-    address = location.raw['address']
-    district = (
-        address.get('district') or
-        address.get('state_district') or
-        address.get('county')
-    )
-    if not district:
-        return None, None, "District not found in address data."
+        return None, None, None, "Reverse geocoding service timed out."
+    if not location["address"] or not location["components"]:
+        return None, None, None, "Could not get district from coordinates."
+    address = location["components"]
+    state = address.get('state')
+    # Prefer the first address field that names a known district.
+    names = [address.get(field) for field in ('district', 'state_district', 'county') if address.get(field)]
+    if not names:
+        return None, None, None, "District not found in address data."
+    store = get_district_store()
+    district = next((name for name in names if store.match_district(name, state)), names[0])
     if 'district' in district.lower():
         district = district.replace("District", "").strip()
     place_name = district  # Set place_name to district name
-    return district, place_name, None
+    return district, state, place_name, None
 
-def clean_district_name(district):
+def clean_district_name(district, state=None):
+    """Yield-dataset spelling of a geocoded district (see district_names); unknown names keep their spelling.
+
+    Fuzzy matches are only accepted within ``state``, so pass it whenever it is known.
+    """
     if not isinstance(district, str):
         return district
-    district = re.sub(r"\s*[-\u2013]\s*(I{1,3}|IV|V|VI|VII|VIII|IX|X|\d+)$", "", district, flags=re.IGNORECASE)
-    district = district.replace("District", "").strip()
-    aliases = {
-        "Purba Bardhaman": "Burdwan",
-        "Paschim Bardhaman": "Burdwan",
-        "Bardhaman": "Burdwan",
-        "Kalna": "Burdwan",
-        "Kalyani": "Nadia",
-        "Raiganj": "Uttar Dinajpur",
-        "Kolkata": "North 24 Parganas"
-    }
-    return aliases.get(district, district)
-
-def get_soil_category(score):
-    if score == 0:
-        return "No Soil Health Data"
-    elif score >= 4.5:
-        return "Very Excellent Soil Health"
-    elif score >= 4:
-        return "Excellent Soil Health"
-    elif score >= 3:
-        return "Good Soil Health"
-    elif score >= 2:
-        return "Poor Soil Health"
-    else:
-        return "Very Poor Soil Health"
+    try:
+        match = get_district_store().match_district(district, state)
+    except Exception as e:
+        print(f"[engine] District name lookup failed: {e}")
+        match = None
+    return match.name if match else district.replace("District", "").strip()
 
 def calculate_dynamic_climate_score(predicted_yield, soil_score, max_yield=8000, max_soil=5.0):
     norm_yield = (predicted_yield / max_yield) ** 0.8
     norm_soil = (soil_score / max_soil) ** 1.2
     return round((0.6 * norm_yield + 0.4 * norm_soil) * 100, 2)
 
-def forecast_yield(ts_data):
-    model = Prophet(yearly_seasonality=True, growth='flat')
-    model.fit(ts_data)
-    forecast = model.predict(model.make_future_dataframe(periods=1, freq='YS'))
-    return max(forecast.iloc[-1]['yhat'], 0)
-
-def forecast_yield_with_accuracy(ts_data):
-    model = Prophet(yearly_seasonality=True, growth='flat')
-    model.fit(ts_data)
-    future = model.make_future_dataframe(periods=1, freq='YS')
-    forecast = model.predict(future)
-    predicted_yield = max(forecast.iloc[-1]['yhat'], 0)
-
-    try:
-        past = forecast[forecast['ds'] < ts_data['ds'].max()]
-        merged = ts_data.merge(past[['ds', 'yhat']], on='ds')
-        mae = mean_absolute_error(merged['y'], merged['yhat'])
-        mape = mean_absolute_percentage_error(merged['y'], merged['yhat']) * 100
-    except:
-        mae, mape = None, None
-
-    return predicted_yield, mae, mape
-
-def get_crop_priority_list(district_yield, base_crop_names):
+# --- Yield forecasting backend ---
+# FORECAST_BACKEND selects the forecaster: "prophet" (default), "numpy",
+# "numpy:ses" or "numpy:robust_linear".
+def _load_forecaster():
+    forecaster = get_forecaster()
+    forecaster.warm_up()
+    return forecaster
+
+registry.register("forecaster", _load_forecaster, group="yield")
+registry.register("district_store", get_district_store, group="yield")
+registry.register("forecast_table", get_forecast_table, group="yield")
+registry.register("reverse_geocoder", geocoder.get_reverse_geocoder, group="yield")
+
+@functools.lru_cache(maxsize=None)
+def configured_forecaster_spec():
+    # Building a forecaster is cheap; warm_up is what imports the backend.
+    return get_forecaster().spec
+
+def get_matching_forecast_table():
+    table = get_forecast_table()
+    return table if table.backend == configured_forecaster_spec() else None
+
+def get_crop_priority_list(district_yield, base_crop_names, district=None, session=None):
+    table = get_matching_forecast_table() if district else None
+    session = session or ForecastSession(functools.partial(registry.get, "forecaster"), district)
     priority_list = []
+    pending_crops, pending_data = [], []
     for crop, column in base_crop_names.items():
         crop_data = district_yield[['Year', column]].dropna()
+        if table is not None:
+            entry = table.lookup(district, crop, crop_data['Year'].values, crop_data[column].values)
+            if entry is not None:
+                if entry["priority_yhat"] is not None:
+                    priority_list.append((crop, entry["priority_yhat"]))
+                continue
         crop_data.columns = ['ds', 'y']
         crop_data['ds'] = pd.to_datetime(crop_data['ds'], format='%Y')
         if len(crop_data) >= 5:
-            yield_pred = forecast_yield(crop_data)
-            priority_list.append((crop, yield_pred))
+            pending_crops.append(crop)
+            pending_data.append(crop_data)
+    # The session reuses fits already made for this request and fits the rest
+    # in one pass (batched backends) or in parallel (process pool).
+    priority_list.extend(zip(pending_crops, session.forecast_yields(pending_crops, pending_data)))
     return sorted(priority_list, key=lambda x: x[1], reverse=True)
 
 def get_weather_data(lat, lon):
     import config
     url = f"https://api.weatherapi.com/v1/current.json?key={config.OPENWEATHER_API}&q={lat},{lon}"
     try:
-        response = requests.get(url)
+        response = http_client.get(url)
         data = response.json()
         return {
             "temp_c": data['current']['temp_c'],
@@ -282,109 +384,125 @@ def get_weather_data(lat, lon):
     except Exception as e:
         return {"error": "Weather fetch failed", "details": str(e)}
 
-def predict_crop_yield_from_location(crop_input,lat, lon):
-    district, place_name, error = get_district_from_coordinates(lat, lon)
-    if error:
-        return {"error": error}
-    district_input = clean_district_name(district)
+# Per-request fits of the remaining crops run on the shared yield process pool
+# (FORECAST_PARALLEL_FITS=0, or a single-process pool, keeps them in the
+# request thread). Inside those worker processes, fits stay sequential.
+FORECAST_PARALLEL_FITS = os.getenv("FORECAST_PARALLEL_FITS", "1") != "0"
 
-    try:
-        yield_df = pd.read_csv(r"data\ICRISAT-District_Level_Data_30_Years.csv")
-        soil_df = pd.read_csv(r"data\SoilHealthScores_by_District_2.csv")
-    except Exception as e:
-        return {"error": f"Failed to read data files: {str(e)}"}
-
-    soil_df['Soil_Category'] = soil_df['SoilHealthScore'].apply(get_soil_category)
-    yield_columns = [col for col in yield_df.columns if 'YIELD (Kg per ha)' in col]
-    base_crop_names = {col.split(' YIELD')[0]: col for col in yield_columns}
+def forecast_executor():
+    pool = workpools.yield_process_pool
+    if not FORECAST_PARALLEL_FITS or pool.max_workers < 2 or multiprocessing.parent_process() is not None:
+        return None
+    return pool.executor
 
-    if crop_input not in base_crop_names:
-        return {"error": f"'{crop_input}' not found in crop list."}
-
-    yield_col = base_crop_names[crop_input]
-    district_yield = yield_df[yield_df['Dist Name'].str.lower() == district_input.lower()]
-    district_soil = soil_df[soil_df['Dist Name'].str.lower() == district_input.lower()]
-
-    if district_yield.empty or district_soil.empty:
-        return {"error": f"Data for district '{district_input}' not found."}
+def yield_category(predicted_yield):
+    if predicted_yield > 1000:
+        return "Highly Recommended Crop"
+    if predicted_yield > 500:
+        return "Good Crop"
+    if predicted_yield > 200:
+        return "Poor Crop"
+    return "Very Poor Crop"
+
+def yield_figures(predicted_yield):
+    return {
+        "kg_per_ha": round(predicted_yield, 2),
+        "kg_per_acre": round(predicted_yield / 2.47105, 2)
+    }
 
+def forecast_input_crop(district_input, district_yield, crop_input, yield_col, table, session):
+    """(predicted_yield, mae, mape) for the requested crop; mae/mape are None on short series."""
     ts_data = district_yield[['Year', yield_col]].dropna()
     ts_data.columns = ['ds', 'y']
     ts_data['ds'] = pd.to_datetime(ts_data['ds'], format='%Y')
     ts_data['year'] = ts_data['ds'].dt.year
 
     valid_data = ts_data[ts_data['y'] > 0]
+    table_entry = table.lookup(district_input, crop_input, ts_data['year'].values, ts_data['y'].values) if table else None
+    if table_entry is not None:
+        return table_entry["yhat"], table_entry["mae"], table_entry["mape"]
     if len(valid_data) < 6:
-        predicted_yield = ts_data['y'].mean()
-        mae, mape = None, None
-    else:
-        predicted_yield, mae, mape = forecast_yield_with_accuracy(valid_data)
-
-    if predicted_yield > 1000:
-        yield_cat = "Highly Recommended Crop"
-    elif predicted_yield > 500:
-        yield_cat = "Good Crop"
-    elif predicted_yield > 200:
-        yield_cat = "Poor Crop"
-    else:
-        yield_cat = "Very Poor Crop"
-
-    soil_score = district_soil['SoilHealthScore'].values[0]
-    soil_cat = district_soil['Soil_Category'].values[0]
-    climate_score = calculate_dynamic_climate_score(predicted_yield, soil_score)
-
-    sorted_crops = get_crop_priority_list(district_yield, base_crop_names)
+        return ts_data['y'].mean(), None, None
+    return session.forecast_yield_with_accuracy(crop_input, valid_data)
+
+def district_yield_report(district_input, crops, executor=None):
+    """Yield analysis of one district for any number of requested crops.
+
+    The district's rows, soil score and crop priority list are read and fitted
+    once however many crops are asked for, through one ForecastSession (fits
+    run on ``executor`` when given). Returns ``{"crops": {crop: analysis or
+    {"error"}}, "soil_health", "sorted_crops", "forecast_session"}``, with a
+    top-level "error" when the district (or the data files) cannot be found.
+    """
+    try:
+        store = get_district_store()
+    except Exception as e:
+        return {"error": f"Failed to read data files: {str(e)}"}
+    base_crop_names = store.crop_columns
+
+    report = {"district": district_input, "crops": {}}
+    for crop in crops:
+        if crop not in base_crop_names:
+            report["crops"][crop] = {"error": f"'{crop}' not found in crop list."}
+
+    district_yield = store.yield_frame(district_input)
+    district_soil = store.soil(district_input)
+    if district_yield is None or district_soil is None:
+        report["error"] = f"Data for district '{district_input}' not found."
+        return report
+
+    soil_score, soil_cat = district_soil
+    report["soil_health"] = {"score": soil_score, "category": soil_cat}
+    table = get_matching_forecast_table()
+    session = ForecastSession(functools.partial(registry.get, "forecaster"), district_input, executor)
+    for crop in dict.fromkeys(crops):
+        if crop in report["crops"]:
+            continue
+        try:
+            predicted_yield, mae, mape = forecast_input_crop(district_input, district_yield, crop, base_crop_names[crop], table, session)
+        except Exception as e:
+            report["crops"][crop] = {"error": str(e)}
+            continue
+        report["crops"][crop] = {
+            "crop": crop,
+            "predicted_yield": yield_figures(predicted_yield),
+            "yield_category": yield_category(predicted_yield),
+            "prediction_accuracy": {
+                "mae": round(mae, 2) if mae is not None else "Not enough data",
+                "mape_percent": round(mape, 2) if mape is not None else "Not enough data",
+                "accuracy_score": round(100 - mape, 2) if mape is not None else "Not enough data"
+            },
+            "climate_score": calculate_dynamic_climate_score(predicted_yield, soil_score)
+        }
+    report["sorted_crops"] = get_crop_priority_list(district_yield, base_crop_names, district_input, session)
+    report["forecast_session"] = session.stats()
+    return report
+
+def yield_response(lat, lon, place_name, district, report, crop_input, weather_data):
+    """Assemble the /predictForCrop response from a district report."""
+    crop_analysis = dict(report["crops"][crop_input])
+    climate_score = crop_analysis.pop("climate_score")
+    soil_score = report["soil_health"]["score"]
+    sorted_crops = report["sorted_crops"]
     best_crop = sorted_crops[0][0] if sorted_crops else None
     best_yield = sorted_crops[0][1] if sorted_crops else None
 
-    weather_data = get_weather_data(lat, lon)
-
-    crop_priority_list = []
-    for c, y in sorted_crops:
-        if y > 1000:
-            yc = "Highly Recommended Crop"
-        elif y > 500:
-            yc = "Good Crop"
-        elif y > 200:
-            yc = "Poor Crop"
-        else:
-            yc = "Very Poor Crop"
-
-        score = calculate_dynamic_climate_score(y, soil_score)
-
-        crop_priority_list.append({
-            "crop": c,
-            "predicted_yield": {
-                "kg_per_ha": round(y, 2),
-                "kg_per_acre": round(y / 2.47105, 2)
-            },
-            "yield_category": yc,
-            "climate_score": score
-        })
+    crop_priority_list = [{
+        "crop": c,
+        "predicted_yield": yield_figures(y),
+        "yield_category": yield_category(y),
+        "climate_score": calculate_dynamic_climate_score(y, soil_score)
+    } for c, y in sorted_crops]
 
     return {
         "location": {
             "input_coordinates": {"lat": lat, "lon": lon},
             "place_name": place_name,
             "detected_district": district,
+            "dataset_district": report["district"],
         },
-        "input_crop_analysis": {
-            "crop": crop_input,
-            "predicted_yield": {
-                "kg_per_ha": round(predicted_yield, 2),
-                "kg_per_acre": round(predicted_yield / 2.47105, 2)
-            },
-            "yield_category": yield_cat,
-            "prediction_accuracy": {
-                "mae": round(mae, 2) if mae is not None else "Not enough data",
-                "mape_percent": round(mape, 2) if mape is not None else "Not enough data",
-                "accuracy_score": round(100 - mape, 2) if mape is not None else "Not enough data"
-            }
-        },
-        "soil_health": {
-            "score": soil_score,
-            "category": soil_cat
-        },
+        "input_crop_analysis": crop_analysis,
+        "soil_health": report["soil_health"],
         "climate_score": climate_score,
         "weather_now": weather_data,
         "best_crop": {
@@ -394,5 +512,34 @@ def predict_crop_yield_from_location(crop_input,lat, lon):
                 "kg_per_acre": round(best_yield / 2.47105, 2) if best_crop else None,
             }
         },
-        "crop_priority_list": crop_priority_list
+        "crop_priority_list": crop_priority_list,
+        "forecast_timings": report["forecast_session"]
     }
+
+def report_error(report, crop_input):
+    return report.get("crops", {}).get(crop_input, {}).get("error") or report.get("error")
+
+def predict_crop_yield_from_location(crop_input,lat, lon):
+    district, state, place_name, error = get_district_from_coordinates(lat, lon)
+    if error:
+        return {"error": error}
+    district_input = clean_district_name(district, state)
+
+    report = district_yield_report(district_input, [crop_input], executor=forecast_executor())
+    error = report_error(report, crop_input)
+    if error:
+        return {"error": error}
+    return yield_response(lat, lon, place_name, district, report, crop_input, get_weather_data(lat, lon))
+
+# --- Batch yield prediction ---
+def resolve_districts(coordinates):
+    """Resolve (lat, lon) pairs to (district, place_name, district_input, error), geocoding each distinct point once."""
+    resolved = {}
+    for lat, lon in coordinates:
+        if (lat, lon) not in resolved:
+            try:
+                district, state, place_name, error = get_district_from_coordinates(lat, lon)
+            except Exception as e:
+                district, state, place_name, error = None, None, None, f"Reverse geocoding failed: {e}"
+            resolved[(lat, lon)] = (district, place_name, None if error else clean_district_name(district, state), error)
+    return [resolved[point] for point in coordinates]
@@ -0,0 +1,158 @@
+"""Export the image classifiers to TorchScript and ONNX, and check parity.
+
+    python export_models.py                      # export both models, both formats
+    python export_models.py --models damage --formats onnx
+    python export_models.py --check              # compare exported backends with eager
+    python export_models.py --check --precision int8 --tolerance 0.1 --min-agreement 0.95
+
+The parity check runs every backend on the sample images (Test_Image plus any
+``--images`` directory, padded with synthetic images up to ``--samples``) and
+fails if predicted labels agree with eager on fewer than ``--min-agreement`` of
+them (all, by default) or a probability moves by more than ``--tolerance``.
+tests/test_model_parity.py runs the same check on the exported artifacts.
+"""
+import argparse
+import glob
+import inspect
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from model_backends import (
+    BACKENDS, MODEL_SPECS, PRECISIONS, RUNNERS, build_transform, export_path, load_eager, load_runner
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMAGE_DIR = os.path.join(BASE_DIR, "..", "Test_Image")
+EXPORT_FORMATS = ("torchscript", "onnx")
+
+
+def export_torchscript(name, model):
+    size = MODEL_SPECS[name]["input_size"]
+    example = torch.randn(1, 3, size, size)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        traced = torch.jit.freeze(traced)
+    path = export_path(name, "torchscript")
+    traced.save(path)
+    return path
+
+
+def export_onnx(name, model, opset):
+    size = MODEL_SPECS[name]["input_size"]
+    example = torch.randn(1, 3, size, size)
+    path = export_path(name, "onnx")
+    kwargs = dict(
+        input_names=["input"], output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset,
+    )
+    # Newer torch releases default to the dynamo exporter; keep the TorchScript-based one.
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(model, example, path, **kwargs)
+    return path
+
+
+def export(names, formats, opset):
+    for name in names:
+        model = load_eager(name)
+        os.makedirs(os.path.dirname(export_path(name, formats[0])), exist_ok=True)
+        for fmt in formats:
+            start = time.perf_counter()
+            path = export_torchscript(name, model) if fmt == "torchscript" else export_onnx(name, model, opset)
+            print(f"{name}: wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+
+def sample_images(image_dir, extra_dir, count):
+    paths = []
+    for directory in filter(None, (image_dir, extra_dir)):
+        for ext in ("jpg", "jpeg", "png"):
+            paths.extend(sorted(glob.glob(os.path.join(directory, f"*.{ext}"))))
+    images = [Image.open(p).convert("RGB") for p in paths]
+    rng = np.random.default_rng(0)
+    while len(images) < count:
+        h, w = rng.integers(200, 800, size=2)
+        base = rng.uniform(0, 255, size=3)
+        gradient = np.linspace(0, 1, w)[None, :, None] * rng.uniform(-120, 120, size=3)
+        noise = rng.normal(0, rng.uniform(5, 60), size=(h, w, 3))
+        pixels = np.clip(base + gradient + noise, 0, 255).astype(np.uint8)
+        images.append(Image.fromarray(pixels))
+    return images
+
+
+def check_parity(names, backends, images, tolerance, batch_size, precision="fp32", min_agreement=1.0):
+    """Compare exported backends at ``precision`` with eager FP32; return the number of failures.
+
+    INT8 models only exist as ONNX, so other backends are skipped for them.
+    """
+    failures = 0
+    for name in names:
+        transform = build_transform(name)
+        batch = torch.stack([transform(img) for img in images])
+        results = {}
+        for backend in ("eager",) + tuple(b for b in backends if b != "eager"):
+            if backend != "eager" and precision != "fp32" and backend != "onnx":
+                continue
+            if backend != "eager" and not os.path.exists(export_path(name, backend, precision)):
+                print(f"{name}/{backend}/{precision}: no exported model, skipped")
+                continue
+            runner = RUNNERS["eager"](name) if backend == "eager" else load_runner(name, backend, precision=precision)
+            runner(batch[:1])  # warm-up
+            start = time.perf_counter()
+            probs = torch.cat([torch.softmax(runner(batch[i:i + batch_size]), dim=1) for i in range(0, len(batch), batch_size)])
+            elapsed = (time.perf_counter() - start) * 1000 / len(batch)
+            results[backend] = probs
+            print(f"{name}/{backend}: {elapsed:.1f} ms/image")
+
+        reference = results["eager"]
+        ref_conf, ref_label = reference.max(dim=1)
+        for backend, probs in results.items():
+            if backend == "eager":
+                continue
+            conf = probs.gather(1, ref_label[:, None]).squeeze(1)
+            label_mismatch = int((probs.argmax(dim=1) != ref_label).sum())
+            max_prob_diff = float((probs - reference).abs().max())
+            max_conf_diff = float((conf - ref_conf).abs().max())
+            ok = label_mismatch <= (1 - min_agreement) * len(images) and max_prob_diff <= tolerance
+            failures += not ok
+            print(
+                f"{name}/{backend}/{precision}: {'OK' if ok else 'FAIL'} "
+                f"labels differ on {label_mismatch}/{len(images)}, "
+                f"max |Δconfidence| {max_conf_diff:.2e}, max |Δprob| {max_prob_diff:.2e}"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_SPECS), default=list(MODEL_SPECS))
+    parser.add_argument("--formats", nargs="+", choices=EXPORT_FORMATS, default=list(EXPORT_FORMATS))
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--check", action="store_true", help="compare exported backends with eager instead of exporting")
+    parser.add_argument("--images", help="extra directory of sample images for --check")
+    parser.add_argument("--samples", type=int, default=32, help="minimum number of sample images for --check")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="max allowed probability difference")
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32", help="precision of the exported models to --check")
+    parser.add_argument("--min-agreement", type=float, default=1.0, help="min share of labels that must match eager")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    if args.check:
+        images = sample_images(DEFAULT_IMAGE_DIR, args.images, args.samples)
+        backends = [b for b in BACKENDS if b == "eager" or b in args.formats]
+        failures = check_parity(
+            args.models, backends, images, args.tolerance, args.batch_size, args.precision, args.min_agreement
+        )
+        sys.exit(1 if failures else 0)
+    export(args.models, args.formats, args.opset)
+
+
+if __name__ == "__main__":
+    main()
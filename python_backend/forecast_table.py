@@ -0,0 +1,189 @@
+"""Offline yield-forecast table for every (district, crop) series in the ICRISAT file.
+
+Run as a batch job after the CSV changes:
+
+    python forecast_table.py --workers 8
+
+Each run writes a new ``forecast_table.v<N>.json`` under ``data/forecasts``.
+Series whose input rows are unchanged since the previous version are copied
+over; only new or changed series are refitted. The serving path reads the
+latest version and falls back to a live fit for any series it does not cover.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from district_store import DATA_DIR, get_district_store, normalize_district_key, series_hash
+
+FORECAST_DIR = os.getenv("FORECAST_TABLE_DIR", os.path.join(DATA_DIR, "forecasts"))
+TABLE_PATTERN = re.compile(r"forecast_table\.v(\d+)\.json$")
+SCHEMA_VERSION = 1
+KEEP_VERSIONS = 3
+
+
+def series_id(district_key, crop):
+    return f"{district_key}|{crop}"
+
+
+# --- Table I/O ---
+def list_versions(directory=FORECAST_DIR):
+    versions = []
+    for path in glob.glob(os.path.join(directory, "forecast_table.v*.json")):
+        match = TABLE_PATTERN.search(os.path.basename(path))
+        if match:
+            versions.append((int(match.group(1)), path))
+    return sorted(versions)
+
+
+def load_latest(directory=FORECAST_DIR):
+    versions = list_versions(directory)
+    if not versions:
+        return None
+    with open(versions[-1][1], "r", encoding="utf-8") as f:
+        table = json.load(f)
+    if table.get("schema") != SCHEMA_VERSION:
+        return None
+    return table
+
+
+def write_table(table, directory=FORECAST_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"forecast_table.v{table['version']:04d}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(table, f)
+    os.replace(tmp_path, path)
+
+    for _, old_path in list_versions(directory)[:-KEEP_VERSIONS]:
+        os.remove(old_path)
+    return path
+
+
+# --- Batch job ---
+def _init_worker():
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    logging.getLogger("prophet").setLevel(logging.WARNING)
+
+
+def _fit_one(backend, sid, years, values):
+    from forecasting import get_forecaster
+    start = time.perf_counter()
+    entry = get_forecaster(backend).forecast_series(years, values)
+    entry["fit_seconds"] = round(time.perf_counter() - start, 4)
+    return sid, entry
+
+
+def build_table(workers=None, full=False, directory=FORECAST_DIR, backend="prophet"):
+    from forecasting import get_forecaster
+    backend = get_forecaster(backend).spec
+    store = get_district_store()
+    latest = load_latest(directory)
+    previous = latest if latest and not full and latest.get("backend") == backend else None
+    old_series = previous["series"] if previous else {}
+
+    series, todo = {}, []
+    for district_key, crop, years, values in store.iter_series():
+        sid = series_id(district_key, crop)
+        digest = series_hash(years, values)
+        cached = old_series.get(sid)
+        if cached and cached.get("hash") == digest:
+            series[sid] = cached
+        else:
+            todo.append((sid, digest, years, values))
+
+    removed = set(old_series) - {sid for sid, *_ in todo} - set(series)
+    print(f"[forecast_table] {len(series)} series unchanged, {len(todo)} to fit, {len(removed)} removed")
+    if previous and not todo and not removed:
+        print(f"[forecast_table] Version {previous['version']} is up to date")
+        return previous
+
+    start = time.perf_counter()
+    hashes = {sid: digest for sid, digest, _, _ in todo}
+    if backend.startswith("numpy"):
+        # The vectorized backend fits every pending series in a single pass.
+        entries = get_forecaster(backend).forecast_series_batch([(years, values) for _, _, years, values in todo])
+        for (sid, digest, _, _), entry in zip(todo, entries):
+            entry["hash"] = digest
+            series[sid] = entry
+        todo = []
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(_fit_one, backend, sid, years, values) for sid, _, years, values in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    sid, entry = future.result()
+                except Exception as e:
+                    print(f"[forecast_table] Fit failed: {e}")
+                    continue
+                entry["hash"] = hashes[sid]
+                series[sid] = entry
+                if done % 250 == 0:
+                    print(f"[forecast_table] {done}/{len(todo)} fitted")
+
+    table = {
+        "schema": SCHEMA_VERSION,
+        "version": (latest["version"] + 1) if latest else 1,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "source_checksum": store.checksums["yield_csv"],
+        "backend": backend,
+        "series": series,
+    }
+    path = write_table(table, directory)
+    print(f"[forecast_table] Wrote {path} ({len(series)} series, {time.perf_counter() - start:.1f}s fitting)")
+    return table
+
+
+# --- Serving ---
+class ForecastTable:
+    def __init__(self, table):
+        self.version = table["version"] if table else None
+        self.backend = table.get("backend", "prophet") if table else None
+        self._series = table["series"] if table else {}
+
+    def lookup(self, district, crop, years, values):
+        """Return the stored entry if it was fitted on exactly these input rows."""
+        entry = self._series.get(series_id(normalize_district_key(district), crop))
+        if entry is None or entry.get("hash") != series_hash(years, values):
+            return None
+        return entry
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_forecast_table():
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                try:
+                    _table = ForecastTable(load_latest())
+                except Exception as e:
+                    print(f"[forecast_table] Could not load forecast table: {e}")
+                    _table = ForecastTable(None)
+    return _table
+
+
+def reload_forecast_table():
+    global _table
+    with _table_lock:
+        _table = None
+    return get_forecast_table()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute yield forecasts for every district and crop.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--full", action="store_true", help="Refit every series instead of only changed ones")
+    parser.add_argument("--dir", default=FORECAST_DIR, help="Directory holding the versioned tables")
+    parser.add_argument("--backend", default="prophet", help="Forecaster: prophet, numpy, numpy:ses, numpy:robust_linear")
+    args = parser.parse_args()
+    build_table(workers=args.workers, full=args.full, directory=args.dir, backend=args.backend)
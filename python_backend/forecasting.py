@@ -0,0 +1,420 @@
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from district_store import series_hash
+
+# Yield forecasting lives outside engine.py so batch jobs and worker processes
+# can fit series without loading the image classifiers. Prophet is imported on
+# first fit, so the NumPy backends never pay for it.
+
+def to_prophet_frame(years, values):
+    return pd.DataFrame({
+        "ds": pd.to_datetime(np.asarray(years).astype(str), format='%Y'),
+        "y": np.asarray(values, dtype=np.float64),
+    })
+
+def forecast_yield(ts_data):
+    from prophet import Prophet
+    model = Prophet(yearly_seasonality=True, growth='flat')
+    model.fit(ts_data)
+    forecast = model.predict(model.make_future_dataframe(periods=1, freq='YS'))
+    return max(forecast.iloc[-1]['yhat'], 0)
+
+def forecast_yield_with_accuracy(ts_data):
+    from prophet import Prophet
+    from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
+    model = Prophet(yearly_seasonality=True, growth='flat')
+    model.fit(ts_data)
+    future = model.make_future_dataframe(periods=1, freq='YS')
+    forecast = model.predict(future)
+    predicted_yield = max(forecast.iloc[-1]['yhat'], 0)
+
+    try:
+        past = forecast[forecast['ds'] < ts_data['ds'].max()]
+        merged = ts_data.merge(past[['ds', 'yhat']], on='ds')
+        mae = mean_absolute_error(merged['y'], merged['yhat'])
+        mape = mean_absolute_percentage_error(merged['y'], merged['yhat']) * 100
+    except:
+        mae, mape = None, None
+
+    return predicted_yield, mae, mape
+
+# --- Pluggable forecasters ---
+class Forecaster:
+    """Common interface for the yield forecasting backends.
+
+    Backends must implement forecast_yield and forecast_yield_with_accuracy on a
+    Prophet-style ``ds``/``y`` frame; batch methods default to looping over them.
+    """
+    name = None
+    # True when forecast_yields fits a whole list in one vectorized pass.
+    batched = False
+
+    @property
+    def spec(self):
+        """Backend identifier recorded alongside precomputed forecasts."""
+        return self.name
+
+    def warm_up(self):
+        """Import whatever the backend needs so the first request does not pay for it."""
+
+    def forecast_yield(self, ts_data):
+        raise NotImplementedError
+
+    def forecast_yield_with_accuracy(self, ts_data):
+        raise NotImplementedError
+
+    def forecast_yields(self, ts_list):
+        return [self.forecast_yield(ts_data) for ts_data in ts_list]
+
+    def forecast_series(self, years, values):
+        """Forecast one (district, crop) series the way the live yield endpoint does.
+
+        Returns the input-crop forecast (fitted on positive yields only, falling
+        back to the plain mean below 6 points) and the priority-list forecast
+        (fitted on every recorded value, None below 5 points).
+        """
+        ts_data = to_prophet_frame(years, values)
+        valid_data = ts_data[ts_data['y'] > 0]
+        if len(valid_data) < 6:
+            yhat, mae, mape = float(ts_data['y'].mean()), None, None
+        else:
+            yhat, mae, mape = self.forecast_yield_with_accuracy(valid_data)
+
+        if len(ts_data) < 5:
+            priority_yhat = None
+        elif len(valid_data) == len(ts_data) and len(valid_data) >= 6:
+            # Same data, same model: the accuracy fit already is the priority fit.
+            priority_yhat = yhat
+        else:
+            priority_yhat = self.forecast_yield(ts_data)
+
+        return _series_entry(yhat, mae, mape, priority_yhat, len(ts_data))
+
+    def forecast_series_batch(self, series):
+        return [self.forecast_series(years, values) for years, values in series]
+
+
+def _series_entry(yhat, mae, mape, priority_yhat, n_points):
+    return {
+        "yhat": float(yhat),
+        "mae": None if mae is None else float(mae),
+        "mape": None if mape is None else float(mape),
+        "priority_yhat": None if priority_yhat is None else float(priority_yhat),
+        "n_points": int(n_points),
+    }
+
+
+class ProphetForecaster(Forecaster):
+    name = "prophet"
+
+    def warm_up(self):
+        import prophet  # noqa: F401
+        import sklearn.metrics  # noqa: F401
+
+    def forecast_yield(self, ts_data):
+        return forecast_yield(ts_data)
+
+    def forecast_yield_with_accuracy(self, ts_data):
+        return forecast_yield_with_accuracy(ts_data)
+
+
+def _to_grid(series):
+    """Stack (years, values) pairs onto one shared year axis, NaN where missing."""
+    all_years = np.concatenate([np.asarray(years, dtype=np.int64) for years, _ in series])
+    grid = np.arange(all_years.min(), all_years.max() + 1)
+    matrix = np.full((len(series), len(grid)), np.nan)
+    for i, (years, values) in enumerate(series):
+        matrix[i, np.asarray(years, dtype=np.int64) - grid[0]] = values
+    return grid, matrix
+
+
+def _accuracy(matrix, fitted):
+    """MAE and MAPE (%) per row, skipping each series' last point like the Prophet path."""
+    observed = ~np.isnan(matrix)
+    scored = observed & ~np.isnan(fitted)
+    has_obs = observed.any(axis=1)
+    last = matrix.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1)
+    scored[np.flatnonzero(has_obs), last[has_obs]] = False
+
+    count = scored.sum(axis=1)
+    err = np.where(scored, np.abs(matrix - fitted), 0.0)
+    pct = np.where(scored, err / np.maximum(np.abs(np.nan_to_num(matrix)), np.finfo(np.float64).eps), 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mae = np.where(count > 0, err.sum(axis=1) / count, np.nan)
+        mape = np.where(count > 0, pct.sum(axis=1) / count * 100, np.nan)
+    return mae, mape
+
+
+class NumpyForecaster(Forecaster):
+    """Vectorized forecaster for short annual series.
+
+    Every method fits a whole (series x years) matrix at once, so all crop
+    columns of a district, or every series in the file, cost one pass.
+
+    - ``damped``: Holt's damped-trend smoothing, parameters grid-searched per series.
+    - ``ses``: simple exponential smoothing (the damped model without trend).
+    - ``robust_linear``: Huber-weighted linear trend fitted by IRLS.
+
+    Smoothing methods report one-step-ahead errors for MAE/MAPE; the linear fit
+    reports in-sample residuals.
+    """
+    name = "numpy"
+    batched = True
+    METHODS = ("damped", "ses", "robust_linear")
+
+    def __init__(self, method="damped"):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown numpy forecasting method '{method}'. Use one of {self.METHODS}.")
+        self.method = method
+        alphas = np.linspace(0.1, 0.9, 9)
+        if method == "ses":
+            self._params = np.array([(a, 0.0, 1.0) for a in alphas])
+        else:
+            self._params = np.array([
+                (a, b, phi) for a in alphas for b in (0.05, 0.1, 0.2, 0.3) for phi in (0.8, 0.9, 0.98)
+            ])
+
+    @property
+    def spec(self):
+        return f"{self.name}:{self.method}"
+
+    # --- Core matrix fits ---
+    @staticmethod
+    def _smooth(matrix, alpha, beta, phi, keep_fitted=False):
+        """Run damped-trend smoothing for parameter arrays broadcast against the rows."""
+        shape = np.broadcast(alpha, matrix[:, 0]).shape
+        level = np.full(shape, np.nan)
+        trend = np.zeros(shape)
+        sse = np.zeros(shape)
+        next_pred = np.full(shape, np.nan)
+        fitted = np.full(shape + (matrix.shape[1],), np.nan) if keep_fitted else None
+
+        for t in range(matrix.shape[1]):
+            y = matrix[:, t]
+            observed = ~np.isnan(y)
+            started = ~np.isnan(level)
+            pred = level + phi * trend
+            update = started & observed
+            err = np.where(update, y - pred, 0.0)
+            sse += err ** 2
+            if keep_fitted:
+                fitted[..., t] = np.where(update, pred, np.nan)
+
+            # Observed: error-correction update. Gap: carry the forecast forward.
+            # First observation: initialize the level, no trend yet.
+            level = np.where(started, np.where(observed, pred + alpha * err, pred), np.where(observed, y, np.nan))
+            trend = np.where(started, phi * trend + np.where(observed, alpha * beta * err, 0.0), 0.0)
+            next_pred = np.where(observed, level + phi * trend, next_pred)
+
+        return next_pred, fitted, sse
+
+    def _fit_smoothing(self, matrix):
+        alpha, beta, phi = (self._params[:, i][:, None] for i in range(3))
+        _, _, sse = self._smooth(matrix, alpha, beta, phi)
+        best = self._params[np.argmin(sse, axis=0)]
+        yhat, fitted, _ = self._smooth(matrix, best[:, 0], best[:, 1], best[:, 2], keep_fitted=True)
+        return yhat, fitted
+
+    @staticmethod
+    def _fit_robust_linear(grid, matrix, iterations=10, k=1.345):
+        observed = ~np.isnan(matrix)
+        x = (grid - grid.mean()).astype(np.float64)[None, :]
+        y = np.nan_to_num(matrix)
+        weights = observed.astype(np.float64)
+
+        for _ in range(iterations):
+            sw = np.maximum(weights.sum(axis=1, keepdims=True), 1e-12)
+            xm = (weights * x).sum(axis=1, keepdims=True) / sw
+            ym = (weights * y).sum(axis=1, keepdims=True) / sw
+            sxx = (weights * (x - xm) ** 2).sum(axis=1, keepdims=True)
+            sxy = (weights * (x - xm) * (y - ym)).sum(axis=1, keepdims=True)
+            slope = np.where(sxx > 0, sxy / np.where(sxx > 0, sxx, 1.0), 0.0)
+            intercept = ym - slope * xm
+
+            resid = np.where(observed, y - (intercept + slope * x), np.nan)
+            with np.errstate(all='ignore'), warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                scale = 1.4826 * np.nanmedian(np.abs(resid), axis=1, keepdims=True)
+                huber = np.minimum(1.0, k * scale / np.abs(resid))
+            weights = np.where(observed, np.nan_to_num(huber, nan=1.0, posinf=1.0), 0.0)
+
+        last_year = np.where(observed.any(axis=1), x.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1), 0)
+        target = x[0, last_year] + 1.0
+        yhat = intercept[:, 0] + slope[:, 0] * target
+        fitted = np.where(observed, intercept + slope * x, np.nan)
+        return yhat, fitted
+
+    def fit_matrix(self, grid, matrix):
+        """Return (next-year forecast, in-sample fitted values) for every row."""
+        if self.method == "robust_linear":
+            return self._fit_robust_linear(grid, matrix)
+        return self._fit_smoothing(matrix)
+
+    # --- Forecaster interface ---
+    def _frames_to_series(self, ts_list):
+        return [(ts_data['ds'].dt.year.values, ts_data['y'].values) for ts_data in ts_list]
+
+    def forecast_yields(self, ts_list):
+        if not ts_list:
+            return []
+        grid, matrix = _to_grid(self._frames_to_series(ts_list))
+        yhat, _ = self.fit_matrix(grid, matrix)
+        return [max(float(v), 0) for v in yhat]
+
+    def forecast_yield(self, ts_data):
+        return self.forecast_yields([ts_data])[0]
+
+    def forecast_yield_with_accuracy(self, ts_data):
+        grid, matrix = _to_grid(self._frames_to_series([ts_data]))
+        yhat, fitted = self.fit_matrix(grid, matrix)
+        mae, mape = _accuracy(matrix, fitted)
+        mae = None if np.isnan(mae[0]) else float(mae[0])
+        mape = None if np.isnan(mape[0]) else float(mape[0])
+        return max(float(yhat[0]), 0), mae, mape
+
+    def forecast_series_batch(self, series):
+        if not series:
+            return []
+        grid, matrix = _to_grid(series)
+        positive = np.where(matrix > 0, matrix, np.nan)
+        n_all = (~np.isnan(matrix)).sum(axis=1)
+        n_pos = (~np.isnan(positive)).sum(axis=1)
+
+        yhat_pos, fitted_pos = self.fit_matrix(grid, positive)
+        mae, mape = _accuracy(positive, fitted_pos)
+        yhat_all, _ = self.fit_matrix(grid, matrix)
+        with np.errstate(invalid='ignore'):
+            mean_all = np.nanmean(matrix, axis=1)
+
+        entries = []
+        for i in range(len(series)):
+            if n_pos[i] < 6:
+                yhat, err, pct = mean_all[i], None, None
+            else:
+                yhat = max(yhat_pos[i], 0)
+                err = None if np.isnan(mae[i]) else mae[i]
+                pct = None if np.isnan(mape[i]) else mape[i]
+            priority = max(yhat_all[i], 0) if n_all[i] >= 5 else None
+            entries.append(_series_entry(yhat, err, pct, priority, n_all[i]))
+        return entries
+
+    def forecast_series(self, years, values):
+        return self.forecast_series_batch([(years, values)])[0]
+
+
+FORECASTERS = {
+    "prophet": ProphetForecaster,
+    "numpy": NumpyForecaster,
+}
+
+def get_forecaster(name=None, **options):
+    """Build a forecaster by name, e.g. ``prophet``, ``numpy`` or ``numpy:robust_linear``."""
+    name = name or os.getenv("FORECAST_BACKEND", "prophet")
+    backend, _, method = name.partition(":")
+    if backend not in FORECASTERS:
+        raise ValueError(f"Unknown forecast backend '{backend}'. Use one of {sorted(FORECASTERS)}.")
+    if method:
+        options["method"] = method
+    return FORECASTERS[backend](**options)
+
+
+# --- Per-request forecasting session ---
+_worker_forecasters = {}
+
+
+def _fit_in_worker(spec, years, values):
+    """Process pool task: fit one series with a per-process cached forecaster."""
+    forecaster = _worker_forecasters.get(spec)
+    if forecaster is None:
+        forecaster = _worker_forecasters[spec] = get_forecaster(spec)
+    start = time.perf_counter()
+    yhat = forecaster.forecast_yield(to_prophet_frame(years, values))
+    return float(yhat), (time.perf_counter() - start) * 1000
+
+
+class ForecastSession:
+    """Memoized yield fits for one request (or one district of a batch).
+
+    Fits are keyed by (district, crop, data hash), so the requested crop's
+    accuracy fit is reused by the priority list whenever both see the same
+    rows. Series still missing are fitted together: in one pass on batched
+    (NumPy) backends, otherwise in parallel on ``executor`` (a process pool)
+    when one is given. ``stats`` reports per-crop fit timings.
+
+    ``forecaster`` is a zero-argument callable, so a session that is fully
+    served by the precomputed table never loads the forecasting backend.
+    """
+
+    def __init__(self, forecaster, district=None, executor=None):
+        self._get_forecaster = forecaster
+        self.district = district
+        self.executor = executor
+        self._fits = {}
+        self.memo_hits = 0
+        self.parallel_fits = 0
+        self.crop_fit_ms = {}
+
+    @property
+    def forecaster(self):
+        return self._get_forecaster()
+
+    def _key(self, crop, ts_data):
+        return self.district, crop, series_hash(ts_data['ds'].dt.year.values, ts_data['y'].values)
+
+    def _record(self, crop, elapsed_ms):
+        self.crop_fit_ms[crop] = round(self.crop_fit_ms.get(crop, 0.0) + elapsed_ms, 1)
+
+    def forecast_yield_with_accuracy(self, crop, ts_data):
+        key = self._key(crop, ts_data)
+        fit = self._fits.get(key)
+        if fit is not None and fit["mae"] is not None:
+            self.memo_hits += 1
+            return fit["yhat"], fit["mae"], fit["mape"]
+        start = time.perf_counter()
+        yhat, mae, mape = self.forecaster.forecast_yield_with_accuracy(ts_data)
+        self._record(crop, (time.perf_counter() - start) * 1000)
+        self._fits[key] = {"yhat": yhat, "mae": mae, "mape": mape}
+        return yhat, mae, mape
+
+    def forecast_yields(self, crops, ts_list):
+        """Forecasts for several crops of the district, fitting only what is not memoized."""
+        keys = [self._key(crop, ts_data) for crop, ts_data in zip(crops, ts_list)]
+        missing = [i for i, key in enumerate(keys) if key not in self._fits]
+        self.memo_hits += len(keys) - len(missing)
+        if missing:
+            forecaster = self.forecaster
+            series = [ts_list[i] for i in missing]
+            if forecaster.batched:
+                start = time.perf_counter()
+                yhats = forecaster.forecast_yields(series)
+                elapsed = [(time.perf_counter() - start) * 1000 / len(series)] * len(series)
+            elif self.executor is not None and len(series) > 1:
+                futures = [
+                    self.executor.submit(_fit_in_worker, forecaster.spec, ts['ds'].dt.year.values, ts['y'].values)
+                    for ts in series
+                ]
+                yhats, elapsed = zip(*(future.result() for future in futures))
+                self.parallel_fits += len(series)
+            else:
+                yhats, elapsed = [], []
+                for ts in series:
+                    start = time.perf_counter()
+                    yhats.append(forecaster.forecast_yield(ts))
+                    elapsed.append((time.perf_counter() - start) * 1000)
+            for i, yhat, ms in zip(missing, yhats, elapsed):
+                self._fits[keys[i]] = {"yhat": yhat, "mae": None, "mape": None}
+                self._record(crops[i], ms)
+        return [self._fits[key]["yhat"] for key in keys]
+
+    def stats(self):
+        return {
+            "fits": len(self._fits),
+            "memo_hits": self.memo_hits,
+            "parallel_fits": self.parallel_fits,
+            "crop_fit_ms": self.crop_fit_ms,
+        }
@@ -1,14 +1,17 @@
-
+import os
+import warnings
 import requests
-import json
 import numpy as np
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import config
+import http_client
+from ttl_cache import SingleFlight, TTLCache
+from weather_cache import ForecastCache
+from model_registry import registry
 
 # --- CONFIG ---
 TOMORROW_API_KEY = config.TOMORROW_API_KEY  # Replace this
 GEMINI_API_KEY = config.GEMINI_API_KEY       # Replace this
-genai.configure(api_key=GEMINI_API_KEY)
 
 # --- Ideal Ranges ---
 ideal_ranges = {
@@ -19,12 +22,22 @@ ideal_ranges = {
 }
 
 # --- Weather Risk Weights ---
+# Weights only: per-request risk values are computed locally, never stored here.
 weather_factors = {
-    "rain_risk": {"weight": 0.4, "value": 0},
-    "heat_risk": {"weight": 0.3, "value": 0},
-    "humidity_risk": {"weight": 0.2, "value": 0},
-    "wind_risk": {"weight": 0.1, "value": 0}
+    "rain_risk": {"weight": 0.4},
+    "heat_risk": {"weight": 0.3},
+    "humidity_risk": {"weight": 0.2},
+    "wind_risk": {"weight": 0.1}
+}
+# Which aggregate and ideal range each factor is scored against, and the flag it raises.
+RISK_INPUTS = {
+    "rain_risk": ("total_rain", "rain", "Unusual rainfall"),
+    "heat_risk": ("avg_temp", "temperature", "Heat stress"),
+    "humidity_risk": ("avg_humidity", "humidity", "High humidity"),
+    "wind_risk": ("avg_wind", "wind", "High wind"),
 }
+FLAG_THRESHOLD = 0.3
+CLAIM_THRESHOLD = 0.5
 
 # --- Normalize Risk ---
 def normalized_risk(actual, ideal_min, ideal_max):
@@ -32,6 +45,14 @@ def normalized_risk(actual, ideal_min, ideal_max):
         return 0
     return min(1.0, abs(actual - (ideal_min if actual < ideal_min else ideal_max)) / (ideal_min if actual < ideal_min else ideal_max))
 
+def normalized_risk_array(actual, ideal_min, ideal_max):
+    """Vectorized normalized_risk over an array of values."""
+    actual = np.asarray(actual, dtype=float)
+    ref = np.where(actual < ideal_min, ideal_min, ideal_max).astype(float)
+    deviation = np.abs(actual - ref)
+    risk = np.minimum(1.0, np.divide(deviation, ref, out=np.ones_like(deviation), where=ref != 0))
+    return np.where((actual >= ideal_min) & (actual <= ideal_max), 0.0, risk)
+
 # --- Localize Flags ---
 def localize_flags(flags, lang):
     translations = {
@@ -59,90 +80,312 @@ def localize_flags(flags, lang):
     return [translations.get(f, {}).get(lang, f) for f in flags]
 
 # --- API Fetches ---
+MIN_FORECAST_DAYS = 7
+# "hedged" queries both providers at once; "serial" tries tomorrow.io first.
+WEATHER_FETCH_MODE = os.getenv("WEATHER_FETCH_MODE", "hedged")
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.getenv("WEATHER_HEDGE_WORKERS", "8")), thread_name_prefix="weather-hedge")
+
 def fetch_tomorrow(lat, lon):
     url = f"https://api.tomorrow.io/v4/weather/forecast?location={lat},{lon}&timesteps=1d&apikey={TOMORROW_API_KEY}"
-    r = requests.get(url)
+    try:
+        r = http_client.get(url)
+    except requests.RequestException:
+        return None
     return r.json() if r.status_code == 200 else None
 
-def fetch_open_meteo(lat, lon):
-    url = (
-        f"https://api.open-meteo.com/v1/forecast?"
-        f"latitude={lat}&longitude={lon}"
-        f"&daily=temperature_2m_max,temperature_2m_mean,precipitation_sum,relative_humidity_2m_mean,wind_speed_10m_mean"
+OPEN_METEO_BASE_URL = os.getenv("OPEN_METEO_BASE_URL", "https://api.open-meteo.com").rstrip("/")
+# Open-Meteo takes comma-separated coordinate lists; keep URLs and payloads modest.
+OPEN_METEO_CHUNK_SIZE = int(os.getenv("OPEN_METEO_CHUNK_SIZE", "50"))
+OPEN_METEO_DAILY = "temperature_2m_max,temperature_2m_mean,precipitation_sum,relative_humidity_2m_mean,wind_speed_10m_mean"
+
+def open_meteo_url(latitudes, longitudes):
+    return (
+        f"{OPEN_METEO_BASE_URL}/v1/forecast?"
+        f"latitude={latitudes}&longitude={longitudes}"
+        f"&daily={OPEN_METEO_DAILY}"
         f"&forecast_days=16&timezone=auto"
     )
-    return requests.get(url).json()
+
+def fetch_open_meteo(lat, lon):
+    return http_client.get(open_meteo_url(lat, lon)).json()
+
+def fetch_open_meteo_multi(coords):
+    """One request for several (lat, lon) pairs; returns one payload per pair, in order."""
+    url = open_meteo_url(",".join(str(lat) for lat, _ in coords), ",".join(str(lon) for _, lon in coords))
+    r = http_client.get(url)
+    r.raise_for_status()
+    data = r.json()
+    payloads = data if isinstance(data, list) else [data]
+    if len(payloads) != len(coords):
+        raise ValueError(f"Open-Meteo returned {len(payloads)} forecasts for {len(coords)} locations")
+    return payloads
+
+def forecast_days(data, source):
+    """Number of daily rows in a provider payload; 0 if it is unusable."""
+    try:
+        if source == "tomorrow":
+            return len(data["timelines"]["daily"])
+        return len(data["daily"]["time"])
+    except (KeyError, TypeError):
+        return 0
+
+# --- Cached provider fetches ---
+forecast_cache = ForecastCache()
+
+def _has_days(source):
+    return lambda data: forecast_days(data, source) > 0
+
+def fetch_tomorrow_cached(lat, lon):
+    return forecast_cache.fetch("tomorrow", lat, lon, fetch_tomorrow, validate=_has_days("tomorrow"))
+
+def fetch_open_meteo_cached(lat, lon):
+    return forecast_cache.fetch("open-meteo", lat, lon, fetch_open_meteo, validate=_has_days("open-meteo"))
+
+CACHED_FETCHERS = {"tomorrow": fetch_tomorrow_cached, "open-meteo": fetch_open_meteo_cached}
+
+def _cached_usable(lat, lon):
+    for source in CACHED_FETCHERS:
+        hit = forecast_cache.get_fresh(source, lat, lon)
+        if hit and forecast_days(hit[0], source) >= MIN_FORECAST_DAYS:
+            return hit[0], source, hit[1]
+    return None
+
+def fetch_weather_serial(lat, lon):
+    try:
+        tom, freshness = fetch_tomorrow_cached(lat, lon)
+    except Exception:
+        tom = None
+    if not tom or forecast_days(tom, "tomorrow") < MIN_FORECAST_DAYS:
+        data, freshness = fetch_open_meteo_cached(lat, lon)
+        return data, "open-meteo", freshness
+    return tom, "tomorrow", freshness
+
+def fetch_weather_hedged(lat, lon):
+    """Query both providers in parallel and return the first usable forecast.
+
+    A response is usable when it has at least MIN_FORECAST_DAYS days. A fresh
+    response wins over a stale one served from cache after an upstream error.
+    If nothing is usable, the Open-Meteo payload is returned as the serial
+    path would.
+    """
+    futures = {_hedge_pool.submit(fetch, lat, lon): source for source, fetch in CACHED_FETCHERS.items()}
+    stale, fallback, last_error = None, None, None
+    for future in as_completed(futures):
+        source = futures[future]
+        try:
+            data, freshness = future.result()
+        except Exception as e:
+            last_error = e
+            continue
+        if forecast_days(data, source) >= MIN_FORECAST_DAYS:
+            if freshness["status"] == "fresh":
+                return data, source, freshness
+            stale = stale or (data, source, freshness)
+        elif source == "open-meteo":
+            fallback = (data, source, freshness)
+    if stale or fallback:
+        return stale or fallback
+    raise last_error or RuntimeError("No weather provider returned a forecast")
+
+def fetch_weather(lat, lon):
+    """Return (data, source, freshness) for a location, using the forecast cache."""
+    cached = _cached_usable(lat, lon)
+    if cached:
+        return cached
+    if WEATHER_FETCH_MODE == "serial":
+        return fetch_weather_serial(lat, lon)
+    return fetch_weather_hedged(lat, lon)
+
+# --- Bulk fetch for portfolios ---
+bulk_stats = {"requests": 0, "locations": 0, "cells_fetched": 0}
+
+def fetch_weather_bulk(locations):
+    """Open-Meteo forecasts for many (lat, lon) pairs.
+
+    Locations are deduplicated by grid cell. Cells with a fresh cached forecast
+    are served from the cache; the rest are fetched at their cell centres in
+    chunked multi-location requests. Returns one (data, source, freshness)
+    tuple per location, or the exception for locations whose cell could not be
+    fetched and has no stale fallback.
+    """
+    cells = {}
+    for lat, lon in locations:
+        cells.setdefault(forecast_cache.cell(lat, lon), None)
+
+    missing = []
+    for cell in cells:
+        hit = forecast_cache.get_fresh("open-meteo", *cell)
+        if hit and forecast_days(hit[0], "open-meteo") >= MIN_FORECAST_DAYS:
+            cells[cell] = (hit[0], "open-meteo", hit[1])
+        else:
+            missing.append(cell)
+
+    chunks = [missing[i:i + OPEN_METEO_CHUNK_SIZE] for i in range(0, len(missing), OPEN_METEO_CHUNK_SIZE)]
+    futures = {_hedge_pool.submit(fetch_open_meteo_multi, chunk): chunk for chunk in chunks}
+    for future in as_completed(futures):
+        chunk = futures[future]
+        try:
+            payloads = future.result()
+        except Exception as e:
+            payloads = [e] * len(chunk)
+        for cell, data in zip(chunk, payloads):
+            if not isinstance(data, Exception) and forecast_days(data, "open-meteo") >= MIN_FORECAST_DAYS:
+                cells[cell] = (data, "open-meteo", forecast_cache.put("open-meteo", *cell, data))
+                continue
+            error = data if isinstance(data, Exception) else ValueError(
+                f"Open-Meteo returned fewer than {MIN_FORECAST_DAYS} forecast days")
+            stale = forecast_cache.get_stale("open-meteo", *cell, error)
+            usable = stale and forecast_days(stale[0], "open-meteo") >= MIN_FORECAST_DAYS
+            cells[cell] = (stale[0], "open-meteo", stale[1]) if usable else error
+
+    bulk_stats["requests"] += len(chunks)
+    bulk_stats["locations"] += len(locations)
+    bulk_stats["cells_fetched"] += len(missing)
+    return [cells[forecast_cache.cell(lat, lon)] for lat, lon in locations]
 
 # --- Weather Trend Analysis ---
-def extract_and_calc(data, source):
+def forecast_series(data, source):
+    """Daily series from a provider payload as float arrays (missing values are NaN)."""
     if source == "tomorrow":
         arr = data["timelines"]["daily"]
-        days = len(arr)
-        rain = [v["values"].get("precipitationSum", 0) for v in arr]
-        temp_avg = [v["values"].get("temperatureAvg", 0) for v in arr]
-        temp_max = [v["values"].get("temperatureMax", 0) for v in arr]
-        humidity = [v["values"].get("humidityAvg", 0) for v in arr]
-        wind = [v["values"].get("windSpeedAvg", 0) for v in arr]
+        series = {
+            "rain": [v["values"].get("precipitationSum", 0) for v in arr],
+            "temp_avg": [v["values"].get("temperatureAvg", 0) for v in arr],
+            "temp_max": [v["values"].get("temperatureMax", 0) for v in arr],
+            "humidity": [v["values"].get("humidityAvg", 0) for v in arr],
+            "wind": [v["values"].get("windSpeedAvg", 0) for v in arr],
+        }
     else:  # open-meteo
         d = data["daily"]
-        days = len(d["time"])
-        rain = d["precipitation_sum"]
-        temp_avg = d["temperature_2m_mean"]
-        temp_max = d["temperature_2m_max"]
-        humidity = d["relative_humidity_2m_mean"]
-        wind = d["wind_speed_10m_mean"]
-
-    total_rain = float(np.sum(rain))
-    avg_temp = float(np.mean(temp_avg))
-    max_temp = float(np.max(temp_max))
-    avg_humidity = float(np.mean(humidity))
-    avg_wind = float(np.mean(wind))
-    dry_days = int(sum(1 for r in rain if r < 1))
-
-    weather_factors["rain_risk"]["value"] = normalized_risk(total_rain, **ideal_ranges["rain"])
-    weather_factors["heat_risk"]["value"] = normalized_risk(avg_temp, **ideal_ranges["temperature"])
-    weather_factors["humidity_risk"]["value"] = normalized_risk(avg_humidity, **ideal_ranges["humidity"])
-    weather_factors["wind_risk"]["value"] = normalized_risk(avg_wind, **ideal_ranges["wind"])
-
-    risk_score = float(sum(f["value"] * f["weight"] for f in weather_factors.values()))
-    should_claim = bool(risk_score >= 0.5)
-
-    flags = []
-    if weather_factors["rain_risk"]["value"] > 0.3:
-        flags.append("Unusual rainfall")
-    if weather_factors["heat_risk"]["value"] > 0.3:
-        flags.append("Heat stress")
-    if weather_factors["humidity_risk"]["value"] > 0.3:
-        flags.append("High humidity")
-    if weather_factors["wind_risk"]["value"] > 0.3:
-        flags.append("High wind")
-
-    summary = {
-        "avg_temp_c": round(avg_temp, 2),
-        "max_temp_c": round(max_temp, 2),
-        "total_rainfall_mm": round(total_rain, 2),
-        "dry_days": dry_days,
-        "avg_humidity_percent": round(avg_humidity, 2),
-        "avg_wind_speed_kmph": round(avg_wind, 2),
-        "forecast_days_used": days,
-        "source": source
+        series = {
+            "rain": d["precipitation_sum"],
+            "temp_avg": d["temperature_2m_mean"],
+            "temp_max": d["temperature_2m_max"],
+            "humidity": d["relative_humidity_2m_mean"],
+            "wind": d["wind_speed_10m_mean"],
+        }
+    return {k: np.array([np.nan if x is None else x for x in v], dtype=float) for k, v in series.items()}
+
+def stack_series(all_series):
+    """Pad per-location daily series into (locations, max_days) NaN matrices."""
+    width = max((len(s["rain"]) for s in all_series), default=0)
+    matrices = {}
+    for key in ("rain", "temp_avg", "temp_max", "humidity", "wind"):
+        matrix = np.full((len(all_series), width), np.nan)
+        for i, s in enumerate(all_series):
+            matrix[i, :len(s[key])] = s[key]
+        matrices[key] = matrix
+    return matrices
+
+def score_aggregates(aggregates):
+    """Score many locations at once.
+
+    ``aggregates`` maps total_rain, avg_temp, avg_humidity and avg_wind to
+    arrays of shape (locations,). Returns per-factor risk arrays, the weighted
+    score, the should_claim mask and per-location flag lists.
+    """
+    risks = {
+        factor: normalized_risk_array(aggregates[field], **ideal_ranges[range_name])
+        for factor, (field, range_name, _) in RISK_INPUTS.items()
     }
+    score = sum(risks[f] * weather_factors[f]["weight"] for f in RISK_INPUTS)
+    should_claim = score >= CLAIM_THRESHOLD
+    flag_matrix = np.stack([risks[f] > FLAG_THRESHOLD for f in RISK_INPUTS], axis=1)
+    labels = [flag for _, _, flag in RISK_INPUTS.values()]
+    flags = [[labels[j] for j in np.flatnonzero(row)] for row in flag_matrix]
+    return risks, score, should_claim, flags
 
-    return summary, risk_score, should_claim, flags
+def score_forecasts(forecasts):
+    """Vectorized risk scoring for a list of (data, source) forecasts.
+
+    Returns one (summary, risk_score, should_claim, flags) tuple per forecast,
+    matching extract_and_calc.
+    """
+    if not forecasts:
+        return []
+    all_series = [forecast_series(data, source) for data, source in forecasts]
+    m = stack_series(all_series)
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        aggregates = {
+            "total_rain": np.nansum(m["rain"], axis=1),
+            "avg_temp": np.nanmean(m["temp_avg"], axis=1),
+            "max_temp": np.nanmax(m["temp_max"], axis=1),
+            "avg_humidity": np.nanmean(m["humidity"], axis=1),
+            "avg_wind": np.nanmean(m["wind"], axis=1),
+            "dry_days": np.sum(m["rain"] < 1, axis=1),
+        }
+    _, score, should_claim, flags = score_aggregates(aggregates)
+
+    results = []
+    for i, (_, source) in enumerate(forecasts):
+        summary = {
+            "avg_temp_c": round(float(aggregates["avg_temp"][i]), 2),
+            "max_temp_c": round(float(aggregates["max_temp"][i]), 2),
+            "total_rainfall_mm": round(float(aggregates["total_rain"][i]), 2),
+            "dry_days": int(aggregates["dry_days"][i]),
+            "avg_humidity_percent": round(float(aggregates["avg_humidity"][i]), 2),
+            "avg_wind_speed_kmph": round(float(aggregates["avg_wind"][i]), 2),
+            "forecast_days_used": len(all_series[i]["rain"]),
+            "source": source
+        }
+        results.append((summary, float(score[i]), bool(should_claim[i]), flags[i]))
+    return results
+
+def extract_and_calc(data, source):
+    return score_forecasts([(data, source)])[0]
 
 # --- Gemini AI Interpretation ---
-def invoke_gemini(summary, score, should_claim, flags, lang):
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# Summary values are bucketed before they reach the prompt, so nearby forecasts
+# produce the same prompt and share one cached interpretation.
+SUMMARY_BUCKETS = {
+    "total_rainfall_mm": 5.0,
+    "avg_temp_c": 0.5,
+    "max_temp_c": 0.5,
+    "avg_humidity_percent": 2.0,
+    "avg_wind_speed_kmph": 1.0,
+    "dry_days": 1,
+}
+interpretation_cache = TTLCache(
+    maxsize=int(os.getenv("GEMINI_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("GEMINI_CACHE_TTL", str(6 * 3600))),
+)
+_interpretation_flight = SingleFlight()
+def _load_gemini_model():
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+registry.register("gemini_model", _load_gemini_model, group="weather")
+
+def get_gemini_model():
+    return registry.get("gemini_model")
+
+def bucket_summary(summary):
+    bucketed = {}
+    for field, step in SUMMARY_BUCKETS.items():
+        value = round(summary[field] / step) * step
+        bucketed[field] = int(value) if float(step).is_integer() else round(value, 2)
+    return bucketed
+
+def interpretation_key(summary, should_claim, flags, lang):
+    bucketed = bucket_summary(summary)
+    return (tuple(bucketed[f] for f in SUMMARY_BUCKETS), bool(should_claim), tuple(sorted(flags)), lang)
+
+def build_prompt(summary, flags, lang):
+    bucketed = bucket_summary(summary)
     localized_flags = localize_flags(flags, lang)
-    prompt = f"""
+    return f"""
 You are a crop insurance assistant. Respond ONLY in {lang}.
 
 Weather Summary:
-- Total Rainfall: {summary['total_rainfall_mm']} mm
-- Avg Temperature: {summary['avg_temp_c']} °C
-- Max Temperature: {summary['max_temp_c']} °C
-- Avg Humidity: {summary['avg_humidity_percent']} %
-- Avg Wind Speed: {summary['avg_wind_speed_kmph']} km/h
-- Dry Days: {summary['dry_days']} days
+- Total Rainfall: {bucketed['total_rainfall_mm']} mm
+- Avg Temperature: {bucketed['avg_temp_c']} °C
+- Max Temperature: {bucketed['max_temp_c']} °C
+- Avg Humidity: {bucketed['avg_humidity_percent']} %
+- Avg Wind Speed: {bucketed['avg_wind_speed_kmph']} km/h
+- Dry Days: {bucketed['dry_days']} days
 
 Risks Observed:
 - {'; '.join(localized_flags) if localized_flags else 'No major weather risks observed.'}
@@ -151,6 +394,40 @@ Final Output:
 - Bullet points for why claim is or is not needed.
 - A brief interpretation about whether to claim crop insurance or not.
 """
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    return model.generate_content(prompt).text.strip()
 
+def invoke_gemini(summary, score, should_claim, flags, lang):
+    key = interpretation_key(summary, should_claim, flags, lang)
+    cached = interpretation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    def generate():
+        text = get_gemini_model().generate_content(build_prompt(summary, flags, lang)).text.strip()
+        interpretation_cache.set(key, text)
+        return text
+
+    text, _ = _interpretation_flight.do(key, generate)
+    return text
+
+def stream_gemini(summary, score, should_claim, flags, lang):
+    """Yield (text_chunk, cached). A cached interpretation arrives as one chunk.
+
+    The full text is cached once the stream completes, so a stream that fails
+    partway through is never cached.
+    """
+    key = interpretation_key(summary, should_claim, flags, lang)
+    cached = interpretation_cache.get(key)
+    if cached is not None:
+        yield cached, True
+        return
+
+    parts = []
+    for chunk in get_gemini_model().generate_content(build_prompt(summary, flags, lang), stream=True):
+        text = getattr(chunk, "text", "")
+        if text:
+            parts.append(text)
+            yield text, False
+    interpretation_cache.set(key, "".join(parts).strip())
+
+def interpretation_stats():
+    return {"cache": interpretation_cache.stats(), "single_flight": _interpretation_flight.stats()}
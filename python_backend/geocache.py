@@ -0,0 +1,166 @@
+"""Shared reverse-geocoding cache for EXIF addresses and district lookups.
+
+Keys are coordinates snapped to ``GEOCODE_CACHE_PRECISION`` decimal places
+(3 places is roughly 110 m), so repeat claims from the same farm share one
+Nominatim call. Entries live in an in-memory LRU with a TTL and are written
+through to a local SQLite file so the cache survives restarts.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from district_store import CACHE_DIR
+from ttl_cache import TTLCache, snap_coordinates
+
+CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(CACHE_DIR, "geocode.sqlite3"))
+PRECISION = int(os.getenv("GEOCODE_CACHE_PRECISION", "3"))
+TTL_SECONDS = float(os.getenv("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_SIZE", "10000"))
+MAX_DISK_ENTRIES = int(os.getenv("GEOCODE_CACHE_DISK_SIZE", "200000"))
+
+
+class GeocodeCache:
+    def __init__(self, path=CACHE_PATH, precision=PRECISION, ttl=TTL_SECONDS,
+                 maxsize=MAX_ENTRIES, max_disk_entries=MAX_DISK_ENTRIES):
+        self.precision = precision
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.max_disk_entries = max_disk_entries
+        self.disk_hits = 0
+        self.upstream_calls = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS geocode ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+                self._prune()
+            except sqlite3.Error as e:
+                print(f"[geocache] SQLite cache disabled: {e}")
+                self._conn = None
+
+    def key(self, lat, lon):
+        lat, lon = snap_coordinates(lat, lon, self.precision)
+        return f"{lat:.{self.precision}f},{lon:.{self.precision}f}"
+
+    # --- SQLite persistence ---
+    def _prune(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM geocode WHERE stored_at < ?", (time.time() - self.memory.ttl,))
+            self._conn.execute(
+                "DELETE FROM geocode WHERE key NOT IN"
+                " (SELECT key FROM geocode ORDER BY stored_at DESC LIMIT ?)",
+                (self.max_disk_entries,),
+            )
+            self._conn.commit()
+
+    def _disk_get(self, key):
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT value, stored_at FROM geocode WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.memory.ttl:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _disk_set(self, key, value, stored_at):
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO geocode (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), stored_at),
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"[geocache] Could not persist {key}: {e}")
+
+    # --- Lookups ---
+    def get(self, lat, lon):
+        key = self.key(lat, lon)
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        entry = self._disk_get(key)
+        if entry is not None:
+            self.disk_hits += 1
+            self.memory.set(key, entry[0], stored_at=entry[1])
+            return entry[0]
+        return None
+
+    def set(self, lat, lon, value):
+        key = self.key(lat, lon)
+        stored_at = time.time()
+        self.memory.set(key, value, stored_at=stored_at)
+        self._disk_set(key, value, stored_at)
+
+    def reverse(self, lat, lon, timeout=10):
+        """Cached Nominatim reverse lookup.
+
+        Returns ``{"address": str | None, "components": dict}``. Timeouts and
+        geocoder errors propagate and are not cached.
+        """
+        cached = self.get(lat, lon)
+        if cached is not None:
+            return cached
+
+        from geocoder import get_nominatim
+        self.upstream_calls += 1
+        # Query the snapped point so the cached answer is the same for every
+        # coordinate that maps to this key.
+        snapped = snap_coordinates(lat, lon, self.precision)
+        location = get_nominatim().reverse(snapped, language="en", timeout=timeout)
+        value = {
+            "address": location.address if location else None,
+            "components": (location.raw.get("address") or {}) if location else {},
+        }
+        self.set(lat, lon, value)
+        return value
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats.update({
+            "precision": self.precision,
+            "disk_hits": self.disk_hits,
+            "total_hits": stats["hits"] + self.disk_hits,
+            "upstream_calls": self.upstream_calls,
+            "persistent": self._conn is not None,
+        })
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # SQLite connections must not be shared across fork; each worker opens its own.
+    global _cache, _cache_lock
+    _cache = None
+    _cache_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_geocode_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GeocodeCache()
+    return _cache
+
+
+def reverse(lat, lon, timeout=10):
+    return get_geocode_cache().reverse(lat, lon, timeout=timeout)
+
+
+def stats():
+    return get_geocode_cache().stats()
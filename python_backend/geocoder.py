@@ -0,0 +1,248 @@
+"""Offline reverse geocoding from coordinates to dataset district names.
+
+District centroids from ``SoilHealthScores_by_District_2.csv`` are indexed in a
+KD-tree on the unit sphere. If a GeoJSON file of district polygons is supplied
+through ``DISTRICT_POLYGONS_GEOJSON``, point-in-polygon hits take precedence
+over the nearest centroid. Lookups that are far from any centroid, or almost
+equidistant between two districts, are flagged low-confidence so callers can
+fall back to Nominatim.
+
+Centroids at 0,0 and centroids outside the bounding box of their district's
+state are treated as missing. Such districts can never win a lookup, so a
+point that lies closer to one of them (by the approximate headquarters in
+``data/district_centroid_hints.csv``) than to the winner is also flagged
+low-confidence.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from district_store import DATA_DIR, get_district_store
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_DISTANCE_KM = float(os.getenv("GEOCODER_MAX_DISTANCE_KM", "60"))
+# Minimum relative gap between the nearest and the runner-up district centroid.
+MIN_MARGIN = float(os.getenv("GEOCODER_MIN_MARGIN", "0.15"))
+POLYGONS_PATH = os.getenv("DISTRICT_POLYGONS_GEOJSON")
+POLYGONS_NAME_FIELD = os.getenv("DISTRICT_POLYGONS_NAME_FIELD", "district")
+POLYGONS_STATE_FIELD = os.getenv("DISTRICT_POLYGONS_STATE_FIELD", "state")
+CENTROID_HINTS_PATH = os.getenv("DISTRICT_CENTROID_HINTS", os.path.join(DATA_DIR, "district_centroid_hints.csv"))
+NOMINATIM_USER_AGENT = "agrisure-ai"
+
+# (lat_min, lat_max, lon_min, lon_max) per ICRISAT state, padded by STATE_BOX_MARGIN degrees.
+STATE_BOXES = {
+    "Andhra Pradesh": (12.6, 19.95, 76.7, 84.8),
+    "Assam": (24.1, 28.0, 89.7, 96.1),
+    "Bihar": (24.3, 27.55, 83.3, 88.3),
+    "Chhattisgarh": (17.75, 24.1, 80.25, 84.4),
+    "Gujarat": (20.1, 24.75, 68.1, 74.5),
+    "Haryana": (27.65, 30.95, 74.45, 77.6),
+    "Himachal Pradesh": (30.35, 33.25, 75.55, 79.0),
+    "Jharkhand": (21.95, 25.35, 83.3, 87.95),
+    "Karnataka": (11.55, 18.5, 74.0, 78.6),
+    "Kerala": (8.15, 12.8, 74.85, 77.45),
+    "Madhya Pradesh": (21.05, 26.9, 74.0, 82.85),
+    "Maharashtra": (15.6, 22.05, 72.6, 80.9),
+    "Orissa": (17.8, 22.6, 81.35, 87.5),
+    "Punjab": (29.5, 32.55, 73.85, 76.95),
+    "Rajasthan": (23.05, 30.2, 69.45, 78.3),
+    "Tamil Nadu": (8.05, 13.6, 76.2, 80.35),
+    "Telangana": (15.8, 19.95, 77.2, 81.35),
+    "Uttar Pradesh": (23.85, 30.45, 77.05, 84.65),
+    "Uttarakhand": (28.7, 31.5, 77.55, 81.05),
+    "West Bengal": (21.5, 27.25, 85.8, 89.9),
+}
+STATE_BOX_MARGIN = 0.25
+
+
+@dataclass
+class DistrictMatch:
+    district: str
+    distance_km: float
+    margin: float
+    method: str
+    # Distance to the nearest district whose centroid is missing from the index.
+    missing_km: float = float("inf")
+    # State of the matched district, None when unknown.
+    state: str | None = None
+
+    @property
+    def confident(self):
+        if self.method == "polygon":
+            return True
+        return (self.distance_km <= MAX_DISTANCE_KM and self.margin >= MIN_MARGIN
+                and self.missing_km > self.distance_km)
+
+
+def valid_centroids(lat, lon, states):
+    """Mask of usable centroids: not NaN, not 0,0 and inside their state's box when the state is known."""
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    valid = ~(np.isnan(lat) | np.isnan(lon)) & ~((lat == 0) & (lon == 0))
+    for i in np.flatnonzero(valid):
+        box = STATE_BOXES.get(str(states[i]))
+        if box is not None:
+            lat_min, lat_max, lon_min, lon_max = box
+            valid[i] = (lat_min - STATE_BOX_MARGIN <= lat[i] <= lat_max + STATE_BOX_MARGIN
+                        and lon_min - STATE_BOX_MARGIN <= lon[i] <= lon_max + STATE_BOX_MARGIN)
+    return valid
+
+
+def load_centroid_hints(path=CENTROID_HINTS_PATH):
+    """Approximate headquarters ``{district name: (lat, lon)}`` for districts without a usable centroid."""
+    if not path or not os.path.exists(path):
+        return {}
+    import csv
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return {row["Dist Name"]: (float(row["Latitude"]), float(row["Longitude"])) for row in csv.DictReader(f)}
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def _point_in_ring(x, y, ring):
+    xs, ys = ring[:, 0], ring[:, 1]
+    xj, yj = np.roll(xs, 1), np.roll(ys, 1)
+    crosses = (ys > y) != (yj > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = (xj - xs) * (y - ys) / (yj - ys) + xs
+    return bool(np.count_nonzero(crosses & (x < x_cross)) % 2)
+
+
+class PolygonIndex:
+    """Bounding-box filtered point-in-polygon lookup over GeoJSON district shapes."""
+
+    def __init__(self, path, name_field=POLYGONS_NAME_FIELD, state_field=POLYGONS_STATE_FIELD):
+        with open(path, "r", encoding="utf-8") as f:
+            features = json.load(f)["features"]
+
+        self.names, self.states, self.polygons, boxes = [], [], [], []
+        for feature in features:
+            properties = feature.get("properties") or {}
+            name = properties.get(name_field)
+            geometry = feature.get("geometry") or {}
+            if not name or geometry.get("type") not in ("Polygon", "MultiPolygon"):
+                continue
+            parts = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+            for rings in parts:
+                rings = [np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings]
+                outer = rings[0]
+                self.names.append(name)
+                self.states.append(properties.get(state_field))
+                self.polygons.append(rings)
+                boxes.append((outer[:, 0].min(), outer[:, 1].min(), outer[:, 0].max(), outer[:, 1].max()))
+        self.boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+    def lookup(self, lat, lon):
+        """Return (name, state) of the polygon containing the point, or None."""
+        b = self.boxes
+        candidates = np.flatnonzero((b[:, 0] <= lon) & (lon <= b[:, 2]) & (b[:, 1] <= lat) & (lat <= b[:, 3]))
+        for i in candidates:
+            outer, *holes = self.polygons[i]
+            if _point_in_ring(lon, lat, outer) and not any(_point_in_ring(lon, lat, h) for h in holes):
+                return self.names[i], self.states[i]
+        return None
+
+
+class ReverseGeocoder:
+    def __init__(self, names, lat, lon, polygons=None, missing=None, states=None):
+        self.names = [str(n) for n in names]
+        self.states = [str(s) or None for s in states] if states is not None else [None] * len(self.names)
+        from scipy.spatial import cKDTree
+        self.tree = cKDTree(_unit_vectors(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)))
+        self.polygons = polygons
+        # {name: (lat, lon)} of districts that have no usable centroid.
+        missing = missing or {}
+        self.missing_names = list(missing)
+        self.missing_tree = None
+        if missing:
+            points = np.array(list(missing.values()), dtype=np.float64)
+            self.missing_tree = cKDTree(_unit_vectors(points[:, 0], points[:, 1]))
+
+    @classmethod
+    def from_district_store(cls, store=None, polygons_path=POLYGONS_PATH, hints_path=CENTROID_HINTS_PATH):
+        store = store or get_district_store()
+        valid = valid_centroids(store.soil_lat, store.soil_lon, store.soil_states)
+        usable = set(store.soil_names[valid])
+        hints = load_centroid_hints(hints_path)
+        missing = {}
+        for name in dict.fromkeys(store.soil_names[~valid]):
+            if name in usable:
+                continue
+            if name in hints:
+                missing[str(name)] = hints[name]
+            else:
+                print(f"[geocoder] No usable centroid or hint for {name}")
+        polygons = PolygonIndex(polygons_path) if polygons_path else None
+        return cls(store.soil_names[valid], store.soil_lat[valid], store.soil_lon[valid], polygons, missing,
+                   store.soil_states[valid])
+
+    def lookup(self, lat, lon):
+        """Return the DistrictMatch for a coordinate, or None if the index is empty."""
+        if self.polygons is not None:
+            hit = self.polygons.lookup(lat, lon)
+            if hit:
+                return DistrictMatch(hit[0], 0.0, 1.0, "polygon", state=hit[1])
+
+        k = min(8, len(self.names))
+        if k == 0:
+            return None
+        chords, idx = self.tree.query(_unit_vectors(lat, lon)[0], k=k)
+        chords, idx = np.atleast_1d(chords), np.atleast_1d(idx)
+        best = self.names[idx[0]]
+        nearest_km = float(_chord_to_km(chords[0]))
+
+        # Duplicate rows of the same district do not count as a competitor.
+        runner_up_km = next(
+            (float(_chord_to_km(c)) for c, i in zip(chords[1:], idx[1:]) if self.names[i] != best),
+            float("inf"),
+        )
+        margin = 1.0 - nearest_km / runner_up_km if runner_up_km > 0 else 0.0
+        missing_km = float("inf")
+        if self.missing_tree is not None:
+            chord, _ = self.missing_tree.query(_unit_vectors(lat, lon)[0])
+            missing_km = float(_chord_to_km(chord))
+        return DistrictMatch(best, nearest_km, margin, "centroid", missing_km, self.states[idx[0]])
+
+
+# --- Shared instances ---
+_geocoder = None
+_nominatim = None
+_lock = threading.Lock()
+
+
+def get_reverse_geocoder():
+    global _geocoder
+    if _geocoder is None:
+        with _lock:
+            if _geocoder is None:
+                _geocoder = ReverseGeocoder.from_district_store()
+    return _geocoder
+
+
+def get_nominatim():
+    """One Nominatim client per process instead of one per request."""
+    global _nominatim
+    if _nominatim is None:
+        with _lock:
+            if _nominatim is None:
+                from geopy.geocoders import Nominatim
+                _nominatim = Nominatim(user_agent=NOMINATIM_USER_AGENT)
+    return _nominatim
+
+
+def lookup_district(lat, lon):
+    """Local lookup only; returns a DistrictMatch or None."""
+    try:
+        return get_reverse_geocoder().lookup(lat, lon)
+    except Exception as e:
+        print(f"[geocoder] Local lookup failed: {e}")
+        return None
@@ -0,0 +1,117 @@
+"""Shared outbound HTTP layer.
+
+One ``requests.Session`` per process keeps a keep-alive connection pool per
+upstream host. Every call gets a connect/read timeout, and retries are drawn
+from a process-wide retry budget so a struggling upstream sees at most a small
+fraction of extra traffic instead of a retry storm. ``create_async_client``
+builds the matching httpx client for async routes.
+"""
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "16"))
+POOL_SIZE_PER_HOST = int(os.getenv("HTTP_POOL_SIZE", "20"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryBudget:
+    """Token bucket: each request deposits ``ratio`` tokens, each retry spends one."""
+
+    def __init__(self, ratio=0.1, min_tokens=3.0, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self):
+        return {"tokens": round(self.tokens, 2), "retries": self.retries, "denied": self.denied}
+
+
+retry_budget = RetryBudget(
+    ratio=float(os.getenv("HTTP_RETRY_RATIO", "0.1")),
+    max_tokens=float(os.getenv("HTTP_RETRY_MAX_TOKENS", "10")),
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE_PER_HOST, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def request(method, url, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES, **kwargs):
+    """Send a request on the shared session with a timeout and budgeted retries.
+
+    Connection errors, timeouts and 429/5xx responses are retried with jittered
+    backoff while the retry budget allows; otherwise the last response is
+    returned or the last exception raised.
+    """
+    session = get_session()
+    retry_budget.deposit()
+    attempt = 0
+    while True:
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            error = None
+        except (requests.ConnectionError, requests.Timeout) as e:
+            response, error = None, e
+
+        if attempt >= retries or not retry_budget.withdraw():
+            if error is not None:
+                raise error
+            return response
+        attempt += 1
+        time.sleep(min(2.0, 0.1 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def create_async_client():
+    """httpx client for async routes, with the same timeouts and pool bounds."""
+    import httpx
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=POOL_HOSTS * POOL_SIZE_PER_HOST, max_keepalive_connections=POOL_SIZE_PER_HOST),
+    )
+
+
+def stats():
+    return {"retry_budget": retry_budget.stats()}
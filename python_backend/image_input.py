@@ -0,0 +1,207 @@
+"""Decode-once image handle shared by the EXIF, ELA and classifier stages.
+
+Engine functions accept a file path, raw bytes, a PIL image or a ClaimImage.
+A ClaimImage keeps the original bytes (for EXIF) and lazily decodes the RGB
+image once, so a claim image that goes through several checks is read and
+decoded a single time and never needs to be written to disk.
+
+A handle can also own a staged download (a seekable file such as a
+SpooledTemporaryFile) instead of bytes: it is read in chunks for hashing and
+Exif and handed to PIL directly, and released by ``close``. Or it can hold
+only an Exif payload (read from the start of the file with a range request)
+for checks that never look at the pixels.
+"""
+import hashlib
+import io
+import os
+import threading
+
+import piexif
+from PIL import Image
+
+
+class ImageNotFoundError(FileNotFoundError):
+    pass
+
+
+HASH_CHUNK_BYTES = 1 << 20
+
+
+# --- JPEG header ---
+def find_exif_segment(head):
+    """Walk the JPEG markers in ``head`` looking for the APP1 Exif segment.
+
+    Returns ``("exif", start, end)`` with the payload offsets (``end`` may lie
+    past the bytes read so far), ``("none", 0, 0)`` when the image data starts
+    without an Exif block, ``("more", 0, n)`` when the first ``n`` bytes are
+    needed to keep walking, or ``("unsupported", 0, 0)`` for non-JPEG data.
+    """
+    if head[:2] != b"\xff\xd8":
+        return ("unsupported", 0, 0) if len(head) >= 2 else ("more", 0, 2)
+    pos = 2
+    while True:
+        if pos + 4 > len(head):
+            return ("more", 0, pos + 4)
+        if head[pos] != 0xFF:
+            return ("unsupported", 0, 0)
+        marker = head[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):
+            return ("none", 0, 0)
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        start, end = pos + 4, pos + 2 + int.from_bytes(head[pos + 2:pos + 4], "big")
+        if marker == 0xE1:
+            if start + 6 > len(head):
+                return ("more", 0, start + 6)
+            if head[start:start + 6] == b"Exif\x00\x00":
+                return ("exif", start, end)
+        pos = end
+
+
+class ClaimImage:
+    def __init__(self, data=None, image=None, name=None, exif_header=None, file=None):
+        if data is None and image is None and exif_header is None and file is None:
+            raise ValueError("ClaimImage needs raw bytes, a file, a decoded image or an Exif header")
+        self._data = data
+        self._file = file
+        self._image = image
+        self._exif_header = exif_header
+        self._rgb = None
+        self._exif = None
+        self._sha256 = None
+        self.name = name
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_source(cls, source, name=None):
+        if isinstance(source, ClaimImage):
+            return source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return cls(data=bytes(source), name=name)
+        if isinstance(source, Image.Image):
+            return cls(image=source, name=name)
+        if isinstance(source, (str, os.PathLike)):
+            if not os.path.exists(source):
+                raise ImageNotFoundError(source)
+            with open(source, "rb") as f:
+                return cls(data=f.read(), name=name or os.path.basename(source))
+        raise TypeError(f"Unsupported image source: {type(source).__name__}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release a staged file; the decoded image and parsed Exif stay usable."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+
+    def _read_file(self, size=-1, offset=None):
+        # Callers hold self._lock: stages share one file position.
+        if offset is not None:
+            self._file.seek(offset)
+        return self._file.read(size)
+
+    @property
+    def data(self):
+        """Original encoded bytes (read into memory from a staged file), or None when built from a decoded image."""
+        if self._file is not None:
+            with self._lock:
+                return self._read_file(offset=0)
+        return self._data
+
+    @property
+    def has_pixels(self):
+        return self._data is not None or self._file is not None or self._image is not None
+
+    @property
+    def size_bytes(self):
+        if self._file is not None:
+            with self._lock:
+                return self._file.seek(0, os.SEEK_END)
+        return len(self._data) if self._data is not None else None
+
+    @property
+    def sha256(self):
+        """Hex SHA-256 of the encoded bytes (of the RGB pixels when built from a decoded image)."""
+        if self._sha256 is None:
+            if self._data is not None:
+                self._sha256 = hashlib.sha256(self._data).hexdigest()
+            elif self._file is not None:
+                digest = hashlib.sha256()
+                with self._lock:
+                    self._file.seek(0)
+                    for chunk in iter(lambda: self._read_file(HASH_CHUNK_BYTES), b""):
+                        digest.update(chunk)
+                self._sha256 = digest.hexdigest()
+            elif self._image is None:
+                self._sha256 = hashlib.sha256(b"exif-header:" + self._exif_header).hexdigest()
+            else:
+                rgb = self.rgb()
+                digest = hashlib.sha256(f"{rgb.size}".encode())
+                digest.update(rgb.tobytes())
+                self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    def rgb(self):
+        """Decoded RGB image, decoded at most once per handle."""
+        if self._rgb is None:
+            with self._lock:
+                if self._rgb is None:
+                    if not self.has_pixels:
+                        raise ValueError("Only the Exif header of this image was downloaded")
+                    if self._image is not None:
+                        image = self._image
+                    elif self._file is not None:
+                        self._file.seek(0)
+                        image = Image.open(self._file)
+                    else:
+                        image = Image.open(io.BytesIO(self._data))
+                    self._rgb = image.convert("RGB")
+        return self._rgb
+
+    def phash(self):
+        """64-bit perceptual hash of the decoded image (see result_cache.perceptual_hash)."""
+        from result_cache import perceptual_hash
+        return perceptual_hash(self.rgb())
+
+    def exif(self):
+        """piexif dict for the image, parsed at most once per handle."""
+        if self._exif is None:
+            with self._lock:
+                if self._exif is None:
+                    if self._data is not None:
+                        raw = self._data
+                    elif self._file is not None:
+                        raw = self._exif_from_file()
+                    elif self._exif_header is not None:
+                        raw = self._exif_header
+                    else:
+                        raw = self._image.info.get("exif")
+                    if raw:
+                        self._exif = piexif.load(raw)
+                    else:
+                        self._exif = {"0th": {}, "Exif": {}, "GPS": {}, "Interop": {}, "1st": {}, "thumbnail": None}
+        return self._exif
+
+    def _exif_from_file(self, step=65536):
+        """Exif payload of a staged JPEG, reading only as far as its header."""
+        head = self._read_file(0, offset=0)
+        while True:
+            status, start, end = find_exif_segment(head)
+            if status == "exif" and end <= len(head):
+                return head[start:end]
+            if status == "none":
+                return b""
+            chunk = b"" if status == "unsupported" else self._read_file(max(end, len(head) + step) - len(head))
+            if not chunk:
+                # Not a JPEG or truncated: let piexif look at the whole file.
+                return self._read_file(offset=0)
+            head += chunk
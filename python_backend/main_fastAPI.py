@@ -1,18 +1,51 @@
+import time
+from model_registry import registry, record_startup, startup_timings, WARMUP_GROUPS
+_process_start = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import os
-import requests
-import time
+import httpx
 import cloudinary
-import cloudinary.utils
+import cloudinary_fetch
 import config
 import engine
 import futureWeather
+from image_input import ClaimImage
+import geocache
+import workpools
+import http_client as outbound
+import result_cache
+import district_store
+from workpools import vision_pool, yield_pool, weather_pool, yield_process_pool
 import warnings
 
 warnings.filterwarnings("ignore")
+record_startup("imports", _process_start)
+
+# Shared async HTTP client for outbound downloads, opened with the app
+http_client: httpx.AsyncClient | None = None
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    http_client = outbound.create_async_client()
+    # Load the models for this worker's endpoint groups before taking traffic.
+    warmup_start = time.perf_counter()
+    await asyncio.to_thread(registry.warm_up, WARMUP_GROUPS)
+    record_startup("warm_up", warmup_start)
+    record_startup("ready", _process_start)
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+        workpools.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure Cloudinary
 cloudinary.config(
@@ -21,49 +54,92 @@ cloudinary.config(
     api_secret=config.CLOUDINARY_API_SECRET
 )
 
-# Ensure upload directory exists
-UPLOAD_FOLDER = 'Uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
 # Pydantic models for request validation
 class ImageRequest(BaseModel):
     publicId: str
     fileType: str
     originalName: str | None = None
 
+class ClaimVerificationRequest(BaseModel):
+    damageImage: ImageRequest
+    cropImage: ImageRequest
+    fieldImage: ImageRequest
+    # When given, the images are checked against those of earlier claims.
+    claimId: str | None = None
+
 class CropYieldRequest(BaseModel):
     cropName: str
     locationLat: float
     locationLong: float
 
+class CropYieldBatchItem(BaseModel):
+    id: str | None = None
+    cropName: str
+    locationLat: float
+    locationLong: float
+
+class CropYieldBatchRequest(BaseModel):
+    items: list[CropYieldBatchItem]
+    includeWeather: bool = False
+
 class WeatherPredictionRequest(BaseModel):
     locationLat: float
     locationLong: float
     language: str
 
-# Generate signed URL for Cloudinary
-def get_signed_url(public_id: str, resource_type: str = 'image', expires_in: int = 300) -> str:
-    expires_at = int(time.time()) + expires_in
-    url, options = cloudinary.utils.cloudinary_url(
-        public_id,
-        resource_type=resource_type,
-        type="authenticated",
-        sign_url=True,
-        expires_at=expires_at
+class FarmLocation(BaseModel):
+    farmId: str | None = None
+    locationLat: float
+    locationLong: float
+
+class WeatherRiskBatchRequest(BaseModel):
+    farms: list[FarmLocation]
+
+# Download a claim image once and wrap it for every verifier that needs it.
+# "original" is the full file (ELA), "classifier" a resized Cloudinary
+# derivative, "exif" just the Exif header read with range requests. The body
+# is staged in a spooled temp file owned by the ClaimImage: close it when done.
+async def load_claim_image(image_request: ImageRequest, purpose: str = "original") -> ClaimImage:
+    public_id, file_type = image_request.publicId, image_request.fileType
+    name = image_request.originalName or f"{public_id.split('/')[-1]}.jpg"
+    try:
+        if purpose == "exif":
+            exif_header, staged = await cloudinary_fetch.fetch_exif_header(http_client, public_id, file_type)
+            if exif_header is not None:
+                return ClaimImage(exif_header=exif_header, name=name)
+        elif purpose == "classifier":
+            staged = await cloudinary_fetch.fetch_derivative(http_client, public_id, file_type)
+        else:
+            staged = await cloudinary_fetch.fetch_original(http_client, public_id, file_type)
+    except cloudinary_fetch.DownloadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if staged is None:
+        raise HTTPException(status_code=500, detail=f"Failed to download image from Cloudinary: {public_id}")
+    return ClaimImage(file=staged, name=name)
+
+# Download several images concurrently; if any fails, release the others.
+async def load_claim_images(requests: dict[str, ImageRequest], purposes: dict[str, str]):
+    downloads = await asyncio.gather(
+        *(timed(load_claim_image(req, purposes[key])) for key, req in requests.items()),
+        return_exceptions=True
     )
-    return url
-
-# Download from Cloudinary and save to local file
-def download_file(public_id: str, save_path: str, file_type: str = 'image/jpeg') -> bool:
-    resource_type = 'raw' if file_type == 'raw' else 'image'
-    url = get_signed_url(public_id, resource_type=resource_type)
-    response = requests.get(url, headers={'Content-Type': file_type})
-    if response.status_code == 200:
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
-        return True
-    return False
+    failures = [d for d in downloads if isinstance(d, BaseException)]
+    if failures:
+        for download in downloads:
+            if not isinstance(download, BaseException):
+                download[0].close()
+        raise failures[0]
+    images = {key: image for key, (image, _) in zip(requests, downloads)}
+    return images, {key: ms for key, (_, ms) in zip(requests, downloads)}
+
+WEATHER_BATCH_MAX_FARMS = int(os.getenv("WEATHER_BATCH_MAX_FARMS", "1000"))
+YIELD_BATCH_MAX_ITEMS = int(os.getenv("YIELD_BATCH_MAX_ITEMS", "1000"))
+
+# Await a coroutine and time it
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, round((time.perf_counter() - start) * 1000, 2)
 
 # --- FastAPI Routes ---
 @app.get("/")
@@ -75,48 +151,98 @@ async def root():
             "exif_metadata": "/api/exif_metadata",
             "damage_detection": "/api/damage_detection", 
             "crop_type": "/api/crop_type",
+            "verify_claim": "/api/verify_claim",
             "crop_yield_prediction": "/predictForCrop",
-            "weather_prediction": "/futureWeatherPrediction"
+            "crop_yield_batch": "/predictForCropBatch",
+            "weather_prediction": "/futureWeatherPrediction",
+            "weather_prediction_stream": "/futureWeatherPrediction/stream",
+            "weather_risk_batch": "/weatherRiskBatch",
+            "metrics": "/metrics"
         },
         "docs": "/docs",
         "redoc": "/redoc"
     }
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "geocode_cache": geocache.stats(),
+        "inference": engine.inference_metrics(),
+        "work_pools": workpools.metrics(),
+        "outbound_http": outbound.stats(),
+        "cloudinary_downloads": cloudinary_fetch.stats(),
+        "weather_cache": futureWeather.forecast_cache.stats(),
+        "weather_bulk": futureWeather.bulk_stats,
+        "gemini": futureWeather.interpretation_stats(),
+        "result_cache": result_cache.stats(),
+        "district_names": district_store.name_stats(),
+        "startup": {"warm_up_groups": WARMUP_GROUPS, "steps_ms": startup_timings, "components": registry.stats()}
+    }
+
 @app.post("/api/exif_metadata")
-async def exif_metadata(image_request: ImageRequest):
-    filename = image_request.originalName or f"{image_request.publicId.split('/')[-1]}.jpg"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    
-    if not download_file(image_request.publicId, filepath, image_request.fileType):
-        raise HTTPException(status_code=500, detail=f"Failed to download image from Cloudinary: {image_request.publicId}")
-    
-    result = engine.get_exif_data(filepath)
-    os.remove(filepath)
-    return result
+async def exif_metadata(image_request: ImageRequest, ela: bool = True):
+    # Without ELA only the Exif header is downloaded.
+    with await load_claim_image(image_request, "original" if ela else "exif") as claim_image:
+        return await vision_pool.run(engine.get_exif_data, claim_image, ela)
 
 @app.post("/api/damage_detection")
 async def damage_detection(image_request: ImageRequest):
     print(f"Received damage detection request: {image_request}")
-    filename = image_request.originalName or f"{image_request.publicId.split('/')[-1]}.jpg"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    
-    if not download_file(image_request.publicId, filepath, image_request.fileType):
-        raise HTTPException(status_code=500, detail=f"Failed to download image from Cloudinary: {image_request.publicId}")
-    
-    result = engine.predict_damage(filepath)
-    os.remove(filepath)
-    return result
+    with await load_claim_image(image_request, "classifier") as claim_image:
+        return await vision_pool.run(engine.predict_damage, claim_image)
 
 @app.post("/api/crop_type")
 async def crop_type(image_request: ImageRequest):
-    filename = image_request.originalName or f"{image_request.publicId.split('/')[-1]}.jpg"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    
-    if not download_file(image_request.publicId, filepath, image_request.fileType):
-        raise HTTPException(status_code=500, detail=f"Failed to download image from Cloudinary: {image_request.publicId}")
-    
-    result = engine.predict_crop(filepath)
-    os.remove(filepath)
+    with await load_claim_image(image_request, "classifier") as claim_image:
+        return await vision_pool.run(engine.predict_crop, claim_image)
+
+@app.post("/api/verify_claim")
+async def verify_claim(claim: ClaimVerificationRequest):
+    total_start = time.perf_counter()
+    stage_images = {
+        "metadata": claim.fieldImage,
+        "damageDetection": claim.damageImage,
+        "cropType": claim.cropImage
+    }
+
+    # Download every distinct image concurrently; stages sharing a publicId share one ClaimImage.
+    # Only the ELA stage needs the original; an image used only by the
+    # classifiers is fetched as a resized derivative. The reuse check hashes
+    # every image, so with a claimId all of them are originals: hashes of
+    # originals and derivatives are not comparable.
+    unique_requests = {req.publicId: req for req in stage_images.values()}
+    purposes = {public_id: "original" if claim.claimId else "classifier" for public_id in unique_requests}
+    purposes[claim.fieldImage.publicId] = "original"
+    images, download_ms = await load_claim_images(unique_requests, purposes)
+    try:
+        stage_fns = {
+            "metadata": engine.get_exif_data,
+            "damageDetection": engine.predict_damage,
+            "cropType": engine.predict_crop
+        }
+        stage_results = await asyncio.gather(*(
+            vision_pool.timed(stage_fns[stage], images[req.publicId]) for stage, req in stage_images.items()
+        ))
+
+        result = {stage: stage_result for stage, (stage_result, _) in zip(stage_images, stage_results)}
+        if claim.claimId:
+            reuse = await asyncio.gather(*(
+                vision_pool.run(engine.check_image_reuse, image, claim.claimId) for image in images.values()
+            ))
+            checks = dict(zip(images, reuse))
+            result["duplicateCheck"] = {
+                "claimId": claim.claimId,
+                "duplicate": any(check["duplicate"] for check in checks.values()),
+                "images": {stage: checks[req.publicId] for stage, req in stage_images.items()}
+            }
+    finally:
+        for image in images.values():
+            image.close()
+    result["timings_ms"] = {
+        "download": download_ms,
+        "stages": {stage: ms for stage, (_, ms) in zip(stage_images, stage_results)},
+        "total": round((time.perf_counter() - total_start) * 1000, 2)
+    }
     return result
 
 @app.post("/predictForCrop")
@@ -125,7 +251,8 @@ async def predict_crop_yield(data: CropYieldRequest):
         raise HTTPException(status_code=400, detail="Invalid latitude or longitude values")
 
     try:
-        result = engine.predict_crop_yield_from_location(
+        result = await yield_pool.run(
+            engine.predict_crop_yield_from_location,
             crop_input=data.cropName.upper(),
             lat=data.locationLat,
             lon=data.locationLong
@@ -136,35 +263,169 @@ async def predict_crop_yield(data: CropYieldRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Portfolio yield predictions: items are grouped by resolved district, each
+# district is analysed once (for all of its requested crops) in a worker
+# process, and results stream back as NDJSON lines as districts finish:
+# {"type": "result", "index", "id", "result" | "error"} per item, then "done".
+@app.post("/predictForCropBatch")
+async def predict_crop_yield_batch(data: CropYieldBatchRequest):
+    items = data.items
+    if not items:
+        raise HTTPException(status_code=400, detail="No items provided")
+    if len(items) > YIELD_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {YIELD_BATCH_MAX_ITEMS} items per batch")
+    for item in items:
+        if not (-90 <= item.locationLat <= 90) or not (-180 <= item.locationLong <= 180):
+            raise HTTPException(status_code=400, detail=f"Invalid latitude or longitude values for item {item.id}")
+
+    start = time.perf_counter()
+    locations = await yield_pool.run(engine.resolve_districts, [(item.locationLat, item.locationLong) for item in items])
+    groups = {}
+    for index, (_, _, district_input, error) in enumerate(locations):
+        if not error:
+            groups.setdefault(district_input, []).append(index)
+
+    async def analyse_district(district_input, indices):
+        crops = [items[i].cropName.upper() for i in indices]
+        try:
+            report = await yield_process_pool.run(engine.district_yield_report, district_input, crops)
+        except Exception as e:
+            report = {"error": str(e)}
+        weather = [None] * len(indices)
+        if data.includeWeather:
+            weather = await asyncio.gather(*(
+                weather_pool.run(engine.get_weather_data, items[i].locationLat, items[i].locationLong) for i in indices
+            ))
+        return indices, report, weather
+
+    def line(index, **body):
+        return json.dumps({"type": "result", "index": index, "id": items[index].id, **body}) + "\n"
+
+    async def events():
+        for index, (_, _, _, error) in enumerate(locations):
+            if error:
+                yield line(index, error=error)
+        for task in asyncio.as_completed([analyse_district(d, indices) for d, indices in groups.items()]):
+            indices, report, weather = await task
+            for index, weather_data in zip(indices, weather):
+                item, crop = items[index], items[index].cropName.upper()
+                error = engine.report_error(report, crop)
+                if error:
+                    yield line(index, error=error)
+                    continue
+                district, place_name, _, _ = locations[index]
+                yield line(index, result=engine.yield_response(
+                    item.locationLat, item.locationLong, place_name, district, report, crop, weather_data
+                ))
+        yield json.dumps({
+            "type": "done",
+            "items": len(items),
+            "districts": len(groups),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+        }) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+# Blocking weather fetch + deterministic risk score, run on the weather pool
+def weather_risk_assessment(lat: float, lon: float, language: str):
+    weather_data, source, freshness = futureWeather.fetch_weather(lat, lon)
+    summary, score, should_claim, flags = futureWeather.extract_and_calc(weather_data, source)
+    recommendation = {
+        "should_claim": should_claim,
+        "weather_trend_risk_score": round(score, 2),
+        "forecast_summary": summary,
+        "language": language,
+        "forecast_freshness": freshness
+    }
+    return recommendation, (summary, score, should_claim, flags, language)
+
+def weather_claim_recommendation(lat: float, lon: float, language: str) -> dict:
+    recommendation, gemini_args = weather_risk_assessment(lat, lon, language)
+    recommendation["gemini_response"] = futureWeather.invoke_gemini(*gemini_args)
+    return {"claim_recommendation": recommendation}
+
 @app.post("/futureWeatherPrediction")
 async def future_weather_prediction(data: WeatherPredictionRequest):
     if not (-90 <= data.locationLat <= 90) or not (-180 <= data.locationLong <= 180):
         raise HTTPException(status_code=400, detail="Invalid latitude or longitude values")
 
     try:
-        tom = futureWeather.fetch_tomorrow(data.locationLat, data.locationLong)
-        if not tom or len(tom.get("timelines", {}).get("daily", [])) < 7:
-            weather_data, source = futureWeather.fetch_open_meteo(data.locationLat, data.locationLong), "open-meteo"
-        else:
-            weather_data, source = tom, "tomorrow"
+        return await weather_pool.run(weather_claim_recommendation, data.locationLat, data.locationLong, data.language)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid numeric input: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        summary, score, should_claim, flags = futureWeather.extract_and_calc(weather_data, source)
-        ai_text = futureWeather.invoke_gemini(summary, score, should_claim, flags, data.language)
+# Portfolio scoring: farms are deduplicated by grid cell, fetched in chunked
+# multi-location Open-Meteo requests, then scored in one vectorized pass.
+@app.post("/weatherRiskBatch")
+async def weather_risk_batch(data: WeatherRiskBatchRequest):
+    if not data.farms:
+        raise HTTPException(status_code=400, detail="No farms provided")
+    if len(data.farms) > WEATHER_BATCH_MAX_FARMS:
+        raise HTTPException(status_code=413, detail=f"At most {WEATHER_BATCH_MAX_FARMS} farms per batch")
+    for farm in data.farms:
+        if not (-90 <= farm.locationLat <= 90) or not (-180 <= farm.locationLong <= 180):
+            raise HTTPException(status_code=400, detail=f"Invalid latitude or longitude values for farm {farm.farmId}")
+
+    fetched = await weather_pool.run(
+        futureWeather.fetch_weather_bulk, [(farm.locationLat, farm.locationLong) for farm in data.farms]
+    )
+    ok = [i for i, item in enumerate(fetched) if not isinstance(item, BaseException)]
+    scored = await weather_pool.run(futureWeather.score_forecasts, [fetched[i][:2] for i in ok])
+    scores = dict(zip(ok, scored))
 
-        return {
-            "claim_recommendation": {
+    results = []
+    for i, farm in enumerate(data.farms):
+        entry = {"farmId": farm.farmId, "locationLat": farm.locationLat, "locationLong": farm.locationLong}
+        if i in scores:
+            summary, score, should_claim, flags = scores[i]
+            entry.update({
                 "should_claim": should_claim,
                 "weather_trend_risk_score": round(score, 2),
+                "flags": flags,
                 "forecast_summary": summary,
-                "language": data.language,
-                "gemini_response": ai_text
-            }
-        }
+                "forecast_freshness": fetched[i][2]
+            })
+        else:
+            entry["error"] = str(fetched[i])
+        results.append(entry)
+    return {"results": results, "scored": len(ok), "failed": len(data.farms) - len(ok)}
+
+# NDJSON stream: one "score" line as soon as the risk is computed, then
+# "text" lines as Gemini produces them, then a final "done" (or "error") line.
+@app.post("/futureWeatherPrediction/stream")
+async def future_weather_prediction_stream(data: WeatherPredictionRequest):
+    if not (-90 <= data.locationLat <= 90) or not (-180 <= data.locationLong <= 180):
+        raise HTTPException(status_code=400, detail="Invalid latitude or longitude values")
+
+    try:
+        recommendation, gemini_args = await weather_pool.run(
+            weather_risk_assessment, data.locationLat, data.locationLong, data.language
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid numeric input: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def events():
+        yield json.dumps({"type": "score", "claim_recommendation": recommendation}) + "\n"
+        chunks = futureWeather.stream_gemini(*gemini_args)
+        cached = False
+        try:
+            while True:
+                item = await weather_pool.run(next, chunks, None)
+                if item is None:
+                    break
+                text, cached = item
+                yield json.dumps({"type": "text", "delta": text}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+        yield json.dumps({"type": "done", "cached": cached}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     print("Starting FastAPI server...")
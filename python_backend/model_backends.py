@@ -0,0 +1,201 @@
+"""Image classifier backends.
+
+Both verifiers can run as eager PyTorch, TorchScript or ONNX Runtime. Exported
+artifacts are written by ``export_models.py`` next to the checkpoints; the
+backend is picked with ``MODEL_BACKEND`` (eager | torchscript | onnx).
+``MODEL_PRECISION=int8`` (or ``<NAME>_MODEL_PRECISION``, e.g.
+``DAMAGE_MODEL_PRECISION``) loads the INT8 ONNX models written by
+``quantize_models.py`` instead. Every runner takes a float32 NCHW batch tensor and returns logits as a CPU tensor,
+so the callers in engine.py do not care which one they got.
+"""
+import os
+
+import torch
+import timm
+from torchvision import transforms
+
+MODEL_DIR = os.getenv("MODEL_DIR", "models")
+EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", os.path.join(MODEL_DIR, "exported"))
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "eager").lower()
+BACKENDS = ("eager", "torchscript", "onnx")
+PRECISIONS = ("fp32", "int8")
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").lower()
+ONNX_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+MODEL_SPECS = {
+    "damage": {
+        "arch": "efficientnetv2_rw_m",
+        "num_classes": 2,
+        "checkpoint": "efficientnetv2_rw_m_crop_damage.pt",
+        "input_size": 384,
+        "labels": ["damaged", "non_damaged"],
+    },
+    "crop_type": {
+        "arch": "convnext_tiny",
+        "num_classes": 30,
+        "checkpoint": "crop_type_detection_model.pth",
+        "input_size": 224,
+        "labels": [
+            "Coffee-plant", "Cucumber", "Fox_nut(Makhana)", "Lemon", "Olive-tree",
+            "Pearl_millet(bajra)", "Tobacco-plant", "almond", "banana", "cardamom",
+            "cherry", "chilli", "clove", "coconut", "cotton", "gram",
+            "jowar", "jute", "maize", "mustard-oil", "papaya", "pineapple",
+            "rice", "soyabean", "sugarcane", "sunflower", "tea", "tomato",
+            "vigna-radiati(Mung)", "wheat",
+        ],
+    },
+}
+
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
+def build_transform(name):
+    size = MODEL_SPECS[name]["input_size"]
+    return transforms.Compose([
+        transforms.Resize((size, size)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+    ])
+
+
+def checkpoint_path(name):
+    return os.path.join(MODEL_DIR, MODEL_SPECS[name]["checkpoint"])
+
+
+def export_path(name, backend, precision="fp32"):
+    suffix = {"torchscript": "torchscript.pt", "onnx": "onnx"}[backend]
+    if precision != "fp32":
+        suffix = f"{precision}.{suffix}"
+    return os.path.join(EXPORT_DIR, f"{name}.{suffix}")
+
+
+def model_precision(name):
+    return os.getenv(f"{name.upper()}_MODEL_PRECISION", MODEL_PRECISION).lower()
+
+
+def load_eager(name, device="cpu"):
+    spec = MODEL_SPECS[name]
+    model = timm.create_model(spec["arch"], pretrained=False, num_classes=spec["num_classes"])
+    model.load_state_dict(torch.load(checkpoint_path(name), map_location=device))
+    model.to(device)
+    model.eval()
+    return model
+
+
+class EagerRunner:
+    backend = "eager"
+    precision = "fp32"
+
+    def __init__(self, name, device="cpu"):
+        self.device = device
+        self.model = load_eager(name, device)
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(batch.to(self.device)).cpu()
+
+
+class TorchScriptRunner:
+    backend = "torchscript"
+    precision = "fp32"
+
+    def __init__(self, name, device="cpu", path=None):
+        self.device = device
+        self.model = torch.jit.load(path or export_path(name, "torchscript"), map_location=device)
+        self.model.eval()
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(batch.to(self.device)).cpu()
+
+
+class OnnxRunner:
+    backend = "onnx"
+
+    def __init__(self, name, device="cpu", path=None, precision="fp32"):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        providers = ["CPUExecutionProvider"]
+        if device == "cuda" and "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+        self.precision = precision
+        self.session = ort.InferenceSession(path or export_path(name, "onnx", precision), options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        logits = self.session.run(None, {self.input_name: batch.cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+RUNNERS = {"eager": EagerRunner, "torchscript": TorchScriptRunner, "onnx": OnnxRunner}
+
+
+def load_runner(name, backend=None, device="cpu", precision=None):
+    """Load a classifier on the requested backend and precision.
+
+    INT8 models only exist as ONNX, so ``precision="int8"`` implies the ONNX
+    backend. If an exported artifact is missing, fall back to eager FP32
+    PyTorch with a warning rather than refusing to serve.
+    """
+    backend = (backend or MODEL_BACKEND).lower()
+    precision = (precision or model_precision(name)).lower()
+    if backend not in RUNNERS:
+        raise ValueError(f"Unknown MODEL_BACKEND '{backend}', expected one of {', '.join(BACKENDS)}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown MODEL_PRECISION '{precision}', expected one of {', '.join(PRECISIONS)}")
+    if precision == "int8":
+        backend = "onnx"
+    if backend != "eager" and not os.path.exists(export_path(name, backend, precision)):
+        script = "quantize_models.py" if precision == "int8" else "export_models.py"
+        print(f"Warning: {export_path(name, backend, precision)} not found, run {script}. Using eager PyTorch for {name}.")
+        backend, precision = "eager", "fp32"
+    if backend == "onnx":
+        return OnnxRunner(name, device, precision=precision)
+    return RUNNERS[backend](name, device)
+
+
+class VisionModel:
+    """A loaded classifier with its preprocessing and labels."""
+
+    def __init__(self, name, device="cpu", backend=None, precision=None):
+        self.name = name
+        self.labels = MODEL_SPECS[name]["labels"]
+        self.transform = build_transform(name)
+        self.runner = load_runner(name, backend=backend, device=device, precision=precision)
+
+    @property
+    def backend(self):
+        return self.runner.backend
+
+    @property
+    def precision(self):
+        return self.runner.precision
+
+    @property
+    def fingerprint(self):
+        """Backend, precision and artifact size/mtime; changes whenever the served weights do."""
+        if self.backend == "eager":
+            path = checkpoint_path(self.name)
+        else:
+            path = export_path(self.name, self.backend, self.precision)
+        try:
+            st = os.stat(path)
+            artifact = f"{st.st_size}-{int(st.st_mtime)}"
+        except OSError:
+            artifact = "unknown"
+        return f"{self.backend}/{self.precision}/{artifact}"
+
+    def probabilities(self, tensors):
+        """Softmax over a list of preprocessed image tensors, one row per image."""
+        return list(torch.softmax(self.runner(torch.stack(tensors)), dim=1))
+
+
+def load_vision_model(name):
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return VisionModel(name, device=device)
@@ -0,0 +1,102 @@
+"""Lazy registry for models and heavy dependencies.
+
+Components (classifiers, forecaster, lookup tables) are registered with a
+loader and an endpoint group. Nothing is loaded at import time: a component is
+built on first ``get`` or by ``warm_up``, exactly once per process, and its
+load time is recorded. A worker that only serves weather never imports torch.
+
+``MODEL_WARMUP`` picks the groups loaded at startup: ``all`` (default), a
+comma-separated list such as ``vision,yield``, or ``none`` to load everything
+on first use.
+"""
+import os
+import threading
+import time
+
+WARMUP_GROUPS = os.getenv("MODEL_WARMUP", "all")
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._groups = {}
+        self._instances = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.timings = {}
+
+    def register(self, name, loader, group):
+        with self._lock:
+            self._loaders[name] = loader
+            self._groups[name] = group
+            self._locks[name] = threading.Lock()
+            self.timings[name] = {"group": group, "status": "registered"}
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._loaders:
+            raise KeyError(f"Unknown component '{name}'")
+        with self._locks[name]:
+            if name not in self._instances:
+                self._load(name)
+        return self._instances[name]
+
+    def _load(self, name):
+        timing = self.timings[name]
+        timing["status"] = "loading"
+        start = time.perf_counter()
+        try:
+            self._instances[name] = self._loaders[name]()
+        except Exception as e:
+            timing.update(status="failed", error=str(e), load_ms=round((time.perf_counter() - start) * 1000, 1))
+            raise
+        timing.update(status="loaded", load_ms=round((time.perf_counter() - start) * 1000, 1), loaded_at=time.time())
+        timing.pop("error", None)
+
+    def is_loaded(self, name):
+        return name in self._instances
+
+    def groups(self):
+        return sorted(set(self._groups.values()))
+
+    def components(self, group=None):
+        return [name for name, g in self._groups.items() if group is None or g == group]
+
+    def warm_up(self, groups=None):
+        """Load every component in ``groups`` (all groups if None); returns the timings.
+
+        A component that fails to load is recorded as failed and does not stop
+        the others; it is retried on its first ``get``.
+        """
+        if isinstance(groups, str):
+            groups = parse_groups(groups, self.groups())
+        for name in self.components():
+            if groups is None or self._groups[name] in groups:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Warm-up of {name} failed: {e}")
+        return self.stats()
+
+    def stats(self):
+        return {name: dict(timing) for name, timing in self.timings.items()}
+
+
+def parse_groups(spec, known):
+    spec = (spec or "").strip().lower()
+    if spec in ("", "none"):
+        return []
+    if spec == "all":
+        return list(known)
+    return [g.strip() for g in spec.split(",") if g.strip()]
+
+
+registry = ModelRegistry()
+startup_timings = {}
+
+
+def record_startup(step, started):
+    """Record the wall-clock milliseconds since ``started`` (a perf_counter value)."""
+    startup_timings[step] = round((time.perf_counter() - started) * 1000, 1)
@@ -0,0 +1,84 @@
+"""Local stand-in for the Open-Meteo forecast API.
+
+Serves deterministic synthetic daily forecasts for any coordinates, including
+comma-separated multi-location requests, so the weather paths can be exercised
+without network access. Point the backend at it with
+``OPEN_METEO_BASE_URL=http://127.0.0.1:5055``.
+
+Set ``OPEN_METEO_STUB_FAIL_RATE`` (0-1) to make a share of requests return 503,
+``OPEN_METEO_STUB_DELAY_MS`` to add latency, and ``OPEN_METEO_STUB_MAX_DAYS``
+to return shorter forecasts than requested. tests/test_weather_bulk.py runs the
+bulk weather path against it.
+"""
+import hashlib
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from fastapi import FastAPI, HTTPException, Query
+
+FAIL_RATE = float(os.getenv("OPEN_METEO_STUB_FAIL_RATE", "0"))
+DELAY_MS = float(os.getenv("OPEN_METEO_STUB_DELAY_MS", "0"))
+MAX_DAYS = int(os.getenv("OPEN_METEO_STUB_MAX_DAYS", "16"))
+
+app = FastAPI()
+stats = {"requests": 0, "locations": 0}
+
+
+def _parse_list(value):
+    try:
+        return [float(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid coordinate list: {value}")
+
+
+def synthetic_forecast(lat, lon, days):
+    seed = int(hashlib.sha1(f"{lat:.4f},{lon:.4f}".encode()).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    wet = rng.uniform(0, 25)
+    base_temp = 34 - abs(lat - 15) * 0.6 + rng.uniform(-3, 3)
+    start = date.today()
+    daily = {
+        "time": [(start + timedelta(days=i)).isoformat() for i in range(days)],
+        "temperature_2m_mean": [round(base_temp + rng.uniform(-2, 2), 1) for _ in range(days)],
+        "temperature_2m_max": [round(base_temp + 5 + rng.uniform(-2, 3), 1) for _ in range(days)],
+        "precipitation_sum": [round(max(0.0, rng.gauss(wet, wet)), 1) for _ in range(days)],
+        "relative_humidity_2m_mean": [round(min(100, max(10, rng.gauss(65, 15)))) for _ in range(days)],
+        "wind_speed_10m_mean": [round(abs(rng.gauss(10, 5)), 1) for _ in range(days)],
+    }
+    return {"latitude": lat, "longitude": lon, "timezone": "GMT", "daily": daily}
+
+
+@app.get("/v1/forecast")
+def forecast(
+    latitude: str = Query(...),
+    longitude: str = Query(...),
+    forecast_days: int = Query(7, ge=1, le=16),
+    daily: str | None = None,
+    timezone: str | None = None,
+):
+    lats, lons = _parse_list(latitude), _parse_list(longitude)
+    if len(lats) != len(lons):
+        raise HTTPException(status_code=400, detail="latitude and longitude must have the same number of values")
+    stats["requests"] += 1
+    stats["locations"] += len(lats)
+    if DELAY_MS:
+        time.sleep(DELAY_MS / 1000)
+    if FAIL_RATE and random.random() < FAIL_RATE:
+        raise HTTPException(status_code=503, detail="Stub upstream failure")
+    days = min(forecast_days, MAX_DAYS)
+    payloads = [synthetic_forecast(lat, lon, days) for lat, lon in zip(lats, lons)]
+    return payloads[0] if len(payloads) == 1 else payloads
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.getenv("OPEN_METEO_STUB_PORT", "5055"))
+    print(f"Open-Meteo stub listening on http://127.0.0.1:{port}")
+    uvicorn.run(app, host="127.0.0.1", port=port)
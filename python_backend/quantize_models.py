@@ -0,0 +1,223 @@
+"""Post-training INT8 quantization of the image classifiers, with a report.
+
+    python quantize_models.py --mode static --calibration-dir data/calibration
+    python quantize_models.py --mode dynamic
+    python quantize_models.py --report-only --eval-dir data/eval
+
+Quantization starts from the FP32 ONNX models written by export_models.py (they
+are exported first if missing) and writes ``<name>.int8.onnx`` next to them.
+Static mode calibrates activation ranges on images from ``--calibration-dir``;
+dynamic mode needs no images.
+
+The report compares eager FP32, ONNX FP32 and ONNX INT8 on:
+  * accuracy on ``--eval-dir`` (one sub-folder per class label), if given,
+    and top-1 agreement with eager FP32 on the sample images otherwise;
+  * median batch-1 latency;
+  * peak resident memory of a fresh process that loads the model and runs
+    one inference.
+Serve the quantized models with ``MODEL_PRECISION=int8``.
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from export_models import DEFAULT_IMAGE_DIR, export, sample_images
+from model_backends import EXPORT_DIR, MODEL_SPECS, build_transform, export_path, load_runner
+
+DEFAULT_REPORT = os.path.join(EXPORT_DIR, "quantization_report.json")
+VARIANTS = (("eager", "fp32"), ("onnx", "fp32"), ("onnx", "int8"))
+
+
+def load_folder(directory, limit=None):
+    paths = []
+    for ext in ("jpg", "jpeg", "png"):
+        paths.extend(glob.glob(os.path.join(directory, "**", f"*.{ext}"), recursive=True))
+    paths = sorted(paths)[:limit]
+    return [Image.open(p).convert("RGB") for p in paths], paths
+
+
+def load_labelled(directory, name):
+    """ImageFolder layout: one sub-folder per class label (matched case-insensitively)."""
+    label_index = {label.lower(): i for i, label in enumerate(MODEL_SPECS[name]["labels"])}
+    images, labels = [], []
+    for folder in sorted(os.listdir(directory)):
+        index = label_index.get(folder.lower())
+        if index is None or not os.path.isdir(os.path.join(directory, folder)):
+            continue
+        folder_images, _ = load_folder(os.path.join(directory, folder))
+        images.extend(folder_images)
+        labels.extend([index] * len(folder_images))
+    return images, np.array(labels)
+
+
+def calibration_reader(name, images):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    transform = build_transform(name)
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._batches = iter([{"input": transform(img).unsqueeze(0).numpy()} for img in images])
+
+        def get_next(self):
+            return next(self._batches, None)
+
+    return Reader()
+
+
+def quantize(name, mode, calibration_images, per_channel):
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    source = export_path(name, "onnx")
+    if not os.path.exists(source):
+        export([name], ["onnx"], opset=17)
+    target = export_path(name, "onnx", "int8")
+    prepared = source.replace(".onnx", ".prep.onnx")
+    start = time.perf_counter()
+    quant_pre_process(source, prepared, skip_symbolic_shape=True)
+    try:
+        if mode == "dynamic":
+            quantize_dynamic(prepared, target, weight_type=QuantType.QInt8, per_channel=per_channel)
+        else:
+            quantize_static(
+                prepared, target, calibration_reader(name, calibration_images),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=per_channel,
+                calibrate_method=CalibrationMethod.MinMax,
+            )
+    finally:
+        os.remove(prepared)
+    print(
+        f"{name}: wrote {target} ({os.path.getsize(target) / 1e6:.1f} MB, was "
+        f"{os.path.getsize(source) / 1e6:.1f} MB, {time.perf_counter() - start:.1f}s)"
+    )
+
+
+def measure_rss(name, backend, precision):
+    """Peak RSS (MB) of a fresh process that loads one model and runs it once."""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--measure-rss", name, backend, precision],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def _rss_probe(name, backend, precision):
+    torch.set_grad_enabled(False)
+    size = MODEL_SPECS[name]["input_size"]
+    runner = load_runner(name, backend=backend, precision=precision)
+    runner(torch.zeros(1, 3, size, size))
+    # VmHWM resets on exec; ru_maxrss would carry over the parent's peak.
+    try:
+        with open("/proc/self/status") as f:
+            peak_kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(peak_kb / 1024)
+
+
+def predict(runner, batch, batch_size=8):
+    return torch.cat([torch.softmax(runner(batch[i:i + batch_size]), dim=1) for i in range(0, len(batch), batch_size)])
+
+
+def median_latency_ms(runner, batch, repeats):
+    runner(batch[:1])
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        runner(batch[i % len(batch):i % len(batch) + 1])
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def report(names, sample, eval_dir, repeats, path):
+    results = {}
+    for name in names:
+        transform = build_transform(name)
+        eval_images, eval_labels = load_labelled(eval_dir, name) if eval_dir else ([], np.array([]))
+        batch = torch.stack([transform(img) for img in sample])
+        eval_batch = torch.stack([transform(img) for img in eval_images]) if eval_images else None
+
+        rows, reference = {}, None
+        for backend, precision in VARIANTS:
+            variant = f"{backend}/{precision}"
+            if backend == "onnx" and not os.path.exists(export_path(name, backend, precision)):
+                print(f"{name}: {variant} not found, skipped")
+                continue
+            runner = load_runner(name, backend=backend, precision=precision)
+            probs = predict(runner, batch)
+            if reference is None:
+                reference = probs
+            row = {
+                "agreement_with_fp32": round(float((probs.argmax(1) == reference.argmax(1)).float().mean()), 4),
+                "max_prob_diff_vs_fp32": round(float((probs - reference).abs().max()), 4),
+                "latency_ms_batch1": round(median_latency_ms(runner, batch, repeats), 2),
+                "peak_rss_mb": round(measure_rss(name, backend, precision), 1),
+            }
+            if backend == "onnx":
+                row["file_size_mb"] = round(os.path.getsize(export_path(name, backend, precision)) / 1e6, 1)
+            if eval_batch is not None and len(eval_labels):
+                row["accuracy"] = round(float((predict(runner, eval_batch).argmax(1).numpy() == eval_labels).mean()), 4)
+            rows[variant] = row
+            print(f"{name} {variant}: {row}")
+        results[name] = {
+            "sample_images": len(sample),
+            "eval_images": len(eval_labels),
+            "variants": rows,
+        }
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Report written to {path}")
+    return results
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--measure-rss":
+        _rss_probe(*sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_SPECS), default=list(MODEL_SPECS))
+    parser.add_argument("--mode", choices=("static", "dynamic"), default="static")
+    parser.add_argument("--calibration-dir", help="images used to calibrate activation ranges (static mode)")
+    parser.add_argument("--calibration-samples", type=int, default=64)
+    parser.add_argument("--per-channel", action="store_true", help="per-channel weight scales (usually better accuracy for convs)")
+    parser.add_argument("--eval-dir", help="labelled images for the accuracy column, one sub-folder per class")
+    parser.add_argument("--samples", type=int, default=32, help="minimum sample images for agreement and latency")
+    parser.add_argument("--repeats", type=int, default=20, help="timed batch-1 runs per variant")
+    parser.add_argument("--report", default=DEFAULT_REPORT)
+    parser.add_argument("--report-only", action="store_true", help="skip quantization, only write the report")
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    sample = sample_images(DEFAULT_IMAGE_DIR, None, args.samples)
+    if not args.report_only:
+        if args.mode == "static":
+            if args.calibration_dir:
+                calibration, _ = load_folder(args.calibration_dir, args.calibration_samples)
+            else:
+                print("No --calibration-dir given; calibrating on the sample images.")
+                calibration = sample_images(DEFAULT_IMAGE_DIR, None, args.calibration_samples)
+        else:
+            calibration = []
+        for name in args.models:
+            quantize(name, args.mode, calibration, args.per_channel)
+    report(args.models, sample, args.eval_dir, args.repeats, args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""Content-addressed cache for claim image verifier results.
+
+Results of the EXIF/ELA, damage and crop-type stages are keyed by the SHA-256
+of the image bytes plus a stage version (model backend, precision and
+checkpoint fingerprint for the classifiers), so a retried or resubmitted image
+skips download-side work and inference entirely, while a model change
+invalidates old entries. Entries live in an in-memory LRU in front of a SQLite
+store. The store expires entries after ``RESULT_CACHE_TTL`` seconds and keeps
+at most ``RESULT_CACHE_MAX_ENTRIES`` rows, evicting the least recently used.
+
+The same store keeps a perceptual-hash index of images seen with a claim id,
+so an image reused across different claims (re-encoded, resized or lightly
+edited) can be flagged. It is pruned with the same TTL and holds at most
+``PHASH_INDEX_MAX_ENTRIES`` images, oldest first out. The SQLite table is the
+source of truth shared by all worker processes: each check runs in a write
+transaction that first pulls rows added since the last check (by rowid) into an
+in-memory copy, a preallocated ring of hashes that doubles in capacity up to
+that limit.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from district_store import CACHE_DIR
+from ttl_cache import TTLCache
+
+CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(CACHE_DIR, "results.sqlite3"))
+TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL", str(30 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "100000"))
+MEMORY_ENTRIES = int(os.getenv("RESULT_CACHE_MEMORY_SIZE", "2048"))
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+PHASH_INDEX_MAX_ENTRIES = int(os.getenv("PHASH_INDEX_MAX_ENTRIES", "100000"))
+PHASH_INITIAL_CAPACITY = 1024
+PRUNE_EVERY = 500
+
+# --- Perceptual hash ---
+_DCT_SIZE = 32
+_HASH_SIZE = 8
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def perceptual_hash(image):
+    """64-bit DCT hash of a PIL image: robust to re-encoding, resizing and small edits."""
+    from PIL import Image
+
+    gray = np.asarray(image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ gray @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming_distances(hashes, value):
+    """Bit distances between a uint64 array and one hash."""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class ResultCache:
+    def __init__(self, path=CACHE_PATH, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES,
+                 memory_entries=MEMORY_ENTRIES, max_distance=PHASH_MAX_DISTANCE,
+                 max_hashes=PHASH_INDEX_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_hashes = max(1, max_hashes)
+        self.memory = TTLCache(maxsize=memory_entries, ttl=ttl)
+        self.disk_hits = 0
+        self.stores = 0
+        self.duplicates_flagged = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        # In-memory copy of the perceptual-hash index for vectorized lookups:
+        # slots [0, _hash_count) are used; once full, _hash_next is the oldest.
+        self._hash_values = np.zeros(min(PHASH_INITIAL_CAPACITY, self.max_hashes), dtype=np.uint64)
+        self._hash_rows = [None] * len(self._hash_values)
+        self._hash_count = 0
+        self._hash_next = 0
+        self._hash_rowid = 0
+        self._phash_by_sha = {}
+        self._sha_refs = {}
+        self._indexed = set()
+        self.hashes_evicted = 0
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                self._conn.executescript(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    " sha256 TEXT NOT NULL, stage TEXT NOT NULL, version TEXT NOT NULL,"
+                    " value TEXT NOT NULL, stored_at REAL NOT NULL, last_used REAL NOT NULL,"
+                    " PRIMARY KEY (sha256, stage, version));"
+                    "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);"
+                    "CREATE TABLE IF NOT EXISTS image_hashes ("
+                    " sha256 TEXT NOT NULL, claim_id TEXT NOT NULL, phash INTEGER NOT NULL,"
+                    " first_seen REAL NOT NULL, PRIMARY KEY (sha256, claim_id));"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS image_hashes_first_seen ON image_hashes (first_seen)")
+                self._prune()
+                self._refresh_hash_index()
+            except sqlite3.Error as e:
+                print(f"[result_cache] SQLite cache disabled: {e}")
+                self._conn = None
+
+    # --- Eviction ---
+    def _prune(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE stored_at < ?", (time.time() - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM results WHERE rowid NOT IN"
+                " (SELECT rowid FROM results ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.execute("DELETE FROM image_hashes WHERE first_seen < ?", (time.time() - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM image_hashes WHERE rowid NOT IN"
+                " (SELECT rowid FROM image_hashes ORDER BY first_seen DESC LIMIT ?)",
+                (self.max_hashes,),
+            )
+            self._conn.commit()
+
+    # --- Stage results ---
+    def get(self, stage, sha256, version):
+        key = (stage, sha256, version)
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM results WHERE sha256 = ? AND stage = ? AND version = ?",
+                (sha256, stage, version),
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                return None
+            self._conn.execute(
+                "UPDATE results SET last_used = ? WHERE sha256 = ? AND stage = ? AND version = ?",
+                (time.time(), sha256, stage, version),
+            )
+            self._conn.commit()
+        self.disk_hits += 1
+        value = json.loads(row[0])
+        self.memory.set(key, value, stored_at=row[1])
+        return value
+
+    def set(self, stage, sha256, version, value):
+        now = time.time()
+        self.memory.set((stage, sha256, version), value, stored_at=now)
+        self.stores += 1
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (sha256, stage, version, value, stored_at, last_used)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (sha256, stage, version, json.dumps(value), now, now),
+                )
+                self._conn.commit()
+                self._writes += 1
+                prune = self._writes % PRUNE_EVERY == 0
+            if prune:
+                self._prune()
+        except sqlite3.Error as e:
+            print(f"[result_cache] Could not persist {stage} result: {e}")
+
+    def cached(self, stage, sha256, version, compute, cacheable=lambda result: True):
+        """Return (result, hit). ``compute`` runs only on a miss; its result is stored if cacheable."""
+        result = self.get(stage, sha256, version)
+        if result is not None:
+            return result, True
+        result = compute()
+        if cacheable(result):
+            self.set(stage, sha256, version, result)
+        return result, False
+
+    # --- Duplicate detection ---
+    def _refresh_hash_index(self):
+        # Pull in rows written since the last refresh, by this or another process.
+        last_rowid = self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM image_hashes").fetchone()[0]
+        if last_rowid < self._hash_rowid:
+            # The table was emptied and rowids restarted.
+            self._hash_rowid = 0
+        if last_rowid == self._hash_rowid:
+            return
+        rows = self._conn.execute(
+            "SELECT sha256, claim_id, phash, first_seen FROM image_hashes"
+            " WHERE rowid > ? AND first_seen >= ? ORDER BY rowid DESC LIMIT ?",
+            (self._hash_rowid, time.time() - self.ttl, self.max_hashes),
+        ).fetchall()
+        for sha, claim, phash, first_seen in reversed(rows):
+            if (sha, claim) not in self._indexed:
+                self._index_hash(sha, claim, _to_unsigned(phash), first_seen)
+        self._hash_rowid = last_rowid
+
+    def _index_hash(self, sha256, claim_id, phash, first_seen):
+        # Callers hold self._lock (or run during construction).
+        if self._hash_count == len(self._hash_values) and self._hash_count < self.max_hashes:
+            capacity = min(2 * len(self._hash_values), self.max_hashes)
+            values = np.zeros(capacity, dtype=np.uint64)
+            values[:self._hash_count] = self._hash_values
+            self._hash_values = values
+            self._hash_rows.extend([None] * (capacity - len(self._hash_rows)))
+            self._hash_next = self._hash_count
+
+        slot = self._hash_next
+        evicted = self._hash_rows[slot]
+        if evicted is not None:
+            old_sha, old_claim, _ = evicted
+            self._indexed.discard((old_sha, old_claim))
+            self._sha_refs[old_sha] -= 1
+            if not self._sha_refs[old_sha]:
+                del self._sha_refs[old_sha]
+                self._phash_by_sha.pop(old_sha, None)
+            self.hashes_evicted += 1
+        else:
+            self._hash_count += 1
+        self._hash_values[slot] = phash
+        self._hash_rows[slot] = (sha256, claim_id, first_seen)
+        self._hash_next = (slot + 1) % len(self._hash_values)
+        self._indexed.add((sha256, claim_id))
+        self._sha_refs[sha256] = self._sha_refs.get(sha256, 0) + 1
+        self._phash_by_sha[sha256] = phash
+
+    def known_phash(self, sha256):
+        """Perceptual hash recorded for these bytes, if any (saves a decode)."""
+        return self._phash_by_sha.get(sha256)
+
+    def check_duplicates(self, sha256, phash, claim_id):
+        """Record an image for ``claim_id`` and return matches from other claims.
+
+        Each match is ``{"claimId", "sha256", "distance", "exact", "firstSeen"}``,
+        closest first. An identical file has distance 0 and ``exact`` True.
+        Images first seen more than ``ttl`` seconds ago are ignored.
+        """
+        prune = False
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    # Hold the write lock from refresh to insert so concurrent
+                    # checks in other workers see each other's images.
+                    self._conn.execute("BEGIN IMMEDIATE")
+                    self._refresh_hash_index()
+                except sqlite3.Error as e:
+                    print(f"[result_cache] Could not read image hashes: {e}")
+            now = time.time()
+            matches = []
+            if self._hash_count:
+                distances = hamming_distances(self._hash_values[:self._hash_count], phash)
+                for i in np.flatnonzero(distances <= self.max_distance):
+                    sha, other_claim, first_seen = self._hash_rows[i]
+                    if other_claim == claim_id or now - first_seen > self.ttl:
+                        continue
+                    matches.append({
+                        "claimId": other_claim,
+                        "sha256": sha,
+                        "distance": int(distances[i]),
+                        "exact": sha == sha256,
+                        "firstSeen": first_seen,
+                    })
+            new = (sha256, claim_id) not in self._indexed
+            if new:
+                self._index_hash(sha256, claim_id, phash, now)
+            if self._conn is not None:
+                try:
+                    if new:
+                        self._conn.execute(
+                            "INSERT OR IGNORE INTO image_hashes (sha256, claim_id, phash, first_seen) VALUES (?, ?, ?, ?)",
+                            (sha256, claim_id, _to_signed(phash), now),
+                        )
+                        self._writes += 1
+                        prune = self._writes % PRUNE_EVERY == 0
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    self._conn.rollback()
+                    print(f"[result_cache] Could not record image hash: {e}")
+        if prune:
+            self._prune()
+        if matches:
+            self.duplicates_flagged += 1
+        return sorted(matches, key=lambda m: (m["distance"], m["firstSeen"]))
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats.update({
+            "disk_hits": self.disk_hits,
+            "stores": self.stores,
+            "indexed_images": self._hash_count,
+            "index_capacity": len(self._hash_values),
+            "index_evictions": self.hashes_evicted,
+            "duplicates_flagged": self.duplicates_flagged,
+            "persistent": self._conn is not None,
+        })
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    global _cache, _cache_lock
+    _cache = None
+    _cache_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_result_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+
+def stats():
+    return get_result_cache().stats()
@@ -0,0 +1,144 @@
+"""Preload-then-fork server for main_fastAPI.
+
+    python serve.py --workers 4 --port 5001
+
+The parent imports the app, loads the model registry groups named in
+MODEL_WARMUP (weights, district data, forecaster runtime) and freezes the
+garbage collector, then forks the workers. They share one listening socket and
+inherit the loaded objects as copy-on-write pages, so adding a worker costs its
+own request-time memory rather than another copy of every model.
+``gc.freeze()`` moves the preloaded objects out of the collector's reach so
+garbage collection in a worker does not touch, and copy, their pages.
+
+ONNX Runtime sessions own thread pools that do not survive fork, so with
+MODEL_BACKEND=onnx or INT8 models the vision group is loaded in each worker
+instead of the parent.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+RESTART_BACKOFF_SECONDS = 1.0
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def fork_safe_groups(groups):
+    """Drop groups whose components cannot be shared across fork."""
+    import model_backends
+    uses_onnx = model_backends.MODEL_BACKEND == "onnx" or any(
+        model_backends.model_precision(name) != "fp32" for name in model_backends.MODEL_SPECS
+    )
+    if uses_onnx and "vision" in groups:
+        print("[serve] ONNX Runtime in use: vision models load in each worker, not the parent.")
+        return [g for g in groups if g != "vision"]
+    return groups
+
+
+def preload(groups_spec):
+    from model_registry import parse_groups, record_startup, registry
+
+    start = time.perf_counter()
+    import main_fastAPI
+    groups = fork_safe_groups(parse_groups(groups_spec, registry.groups()))
+    registry.warm_up(groups)
+    record_startup("parent_preload", start)
+    gc.collect()
+    gc.freeze()
+    print(f"[serve] Preloaded {groups or 'nothing'} in {time.perf_counter() - start:.1f}s")
+    return main_fastAPI.app
+
+
+def run_worker(app, sock, torch_threads, log_level):
+    import uvicorn
+
+    if torch_threads and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(torch_threads)
+    config = uvicorn.Config(app, lifespan="on", log_level=log_level, timeout_graceful_shutdown=10)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, app, sock, workers, torch_threads, log_level):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self.log_level = log_level
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(self.app, self.sock, self.torch_threads, self.log_level)
+            finally:
+                os._exit(0)
+        self.children[pid] = slot
+        print(f"[serve] Worker {slot} started (pid {pid})")
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for slot in range(self.workers):
+            self.spawn(slot)
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self.children.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            print(f"[serve] Worker {slot} (pid {pid}) exited with status {status}, restarting")
+            time.sleep(RESTART_BACKOFF_SECONDS)
+            self.spawn(slot)
+        print("[serve] All workers stopped")
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5001")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--preload", default=os.getenv("MODEL_WARMUP", "all"),
+                        help="registry groups loaded in the parent: all, none or a comma list")
+    parser.add_argument("--torch-threads", type=int, default=int(os.getenv("WORKER_TORCH_THREADS", "0")),
+                        help="intra-op threads per worker (default: CPUs / workers)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    torch_threads = args.torch_threads or max(1, cpus // max(1, args.workers))
+    sock = bind_socket(args.host, args.port)
+    app = preload(args.preload)
+    print(f"[serve] Listening on http://{args.host}:{args.port} with {args.workers} workers")
+    Supervisor(app, sock, args.workers, torch_threads, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+import cloudinary
+import httpx
+import piexif
+import pytest
+from PIL import Image
+
+import cloudinary_fetch
+import cloudinary_stub
+
+
+def _write_jpeg(path, size, comment_bytes=0):
+    exif = {"0th": {piexif.ImageIFD.Make: b"StubCam"}, "Exif": {}}
+    if comment_bytes:
+        exif["Exif"][piexif.ExifIFD.UserComment] = b"ASCII\0\0\0" + b"x" * comment_bytes
+    Image.new("RGB", size, (90, 140, 60)).save(path, "JPEG", exif=piexif.dump(exif))
+
+
+@pytest.fixture(scope="module")
+def stub_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("cloudinary")
+    os.makedirs(directory / "claims")
+    _write_jpeg(directory / "claims" / "small.jpg", (300, 200))
+    _write_jpeg(directory / "claims" / "large.jpg", (1600, 1200))
+    # Exif block larger than one EXIF_RANGE_BYTES read.
+    _write_jpeg(directory / "claims" / "long_exif.jpg", (300, 200), comment_bytes=40000)
+    Image.new("RGB", (300, 200)).save(directory / "claims" / "plain.png")
+    (directory / "claims" / "report.pdf").write_bytes(b"%PDF-1.4 stub")
+    return directory
+
+
+@pytest.fixture(scope="module")
+def stub_host(serve_app):
+    with serve_app(cloudinary_stub.app) as url:
+        yield url.removeprefix("http://")
+
+
+@pytest.fixture
+def stub(stub_host, stub_dir, monkeypatch):
+    """Point delivery URLs at the stub; returns the stub's counters, reset."""
+    cloudinary.config(cloud_name="demo", api_key="key", api_secret="secret")
+    monkeypatch.setattr(cloudinary_fetch, "DELIVERY_HOST", stub_host)
+    monkeypatch.setattr(cloudinary_stub, "STUB_DIR", str(stub_dir))
+    for kind in ("original", "range", "derivative"):
+        cloudinary_stub.stats[kind].update(requests=0, bytes=0)
+    cloudinary_stub.stats["resource_types"].clear()
+    return cloudinary_stub.stats
+
+
+def run(fetch, *args, **kwargs):
+    async def main():
+        async with httpx.AsyncClient() as client:
+            return await fetch(client, *args, **kwargs)
+    return asyncio.run(main())
+
+
+def test_exif_header_from_one_range_read(stub):
+    exif, original = run(cloudinary_fetch.fetch_exif_header, "claims/small")
+    assert original is None
+    assert exif.startswith(b"Exif\0\0")
+    assert piexif.load(exif)["0th"][piexif.ImageIFD.Make] == b"StubCam"
+    assert (stub["range"]["requests"], stub["original"]["requests"]) == (1, 0)
+
+
+def test_exif_header_spanning_reads(stub):
+    exif, original = run(cloudinary_fetch.fetch_exif_header, "claims/long_exif")
+    assert original is None and len(exif) > cloudinary_fetch.EXIF_RANGE_BYTES
+    assert (stub["range"]["requests"], stub["original"]["requests"]) == (2, 0)
+
+
+def test_exif_header_past_limit_falls_back_to_original(stub, stub_dir, monkeypatch):
+    monkeypatch.setattr(cloudinary_fetch, "EXIF_MAX_HEADER_BYTES", cloudinary_fetch.EXIF_RANGE_BYTES)
+    exif, original = run(cloudinary_fetch.fetch_exif_header, "claims/long_exif")
+    with original:
+        assert exif is None
+        assert original.read() == (stub_dir / "claims" / "long_exif.jpg").read_bytes()
+    assert (stub["range"]["requests"], stub["original"]["requests"]) == (1, 1)
+
+
+def test_exif_header_of_non_jpeg_falls_back_to_original(stub):
+    exif, original = run(cloudinary_fetch.fetch_exif_header, "claims/plain", "image/png")
+    with original:
+        assert exif is None and original.read().startswith(b"\x89PNG")
+    assert stub["original"]["requests"] == 1
+
+
+def test_derivative_is_limited_not_enlarged(stub):
+    url = cloudinary_fetch.signed_url("claims/large", transformation={"width": 512, "height": 512, "crop": "limit"})
+    assert "c_limit,h_512,w_512" in url
+    for public_id, expected in (("claims/large", (512, 384)), ("claims/small", (300, 200))):
+        with run(cloudinary_fetch.fetch_derivative, public_id) as staged:
+            assert Image.open(staged).size == expected
+    assert (stub["derivative"]["requests"], stub["original"]["requests"]) == (2, 0)
+
+
+def test_raw_assets_use_the_raw_path(stub):
+    with run(cloudinary_fetch.fetch_derivative, "claims/report.pdf", "raw") as staged:
+        assert staged.read() == b"%PDF-1.4 stub"
+    exif, original = run(cloudinary_fetch.fetch_exif_header, "claims/report.pdf", "raw")
+    original.close()
+    assert exif is None
+    assert stub["resource_types"] == {"raw": 3}
+    assert stub["derivative"]["requests"] == 0
+
+
+def test_staging_spools_to_disk_and_caps_size(stub, monkeypatch, tmp_path):
+    monkeypatch.setattr(cloudinary_fetch, "STAGING_DIR", str(tmp_path))
+    monkeypatch.setattr(cloudinary_fetch, "SPOOL_BYTES", 1024)
+    with run(cloudinary_fetch.fetch_original, "claims/large") as staged:
+        assert staged._rolled
+        # The rolled-over file is anonymous: nothing is left in the staging dir.
+        assert os.listdir(tmp_path) == []
+
+    monkeypatch.setattr(cloudinary_fetch, "MAX_BYTES", 1024)
+    too_large = cloudinary_fetch.download_stats["original"]["too_large"]
+    with pytest.raises(cloudinary_fetch.DownloadTooLarge):
+        run(cloudinary_fetch.fetch_original, "claims/large")
+    assert cloudinary_fetch.download_stats["original"]["too_large"] == too_large + 1
+    assert cloudinary_fetch.staging_stats["in_flight"] == 0
@@ -0,0 +1,108 @@
+import pytest
+
+from district_names import ALIASES, DistrictNameIndex, normalize_name, soil_aliases
+from district_store import DistrictStore
+
+NAMES = ["Rajgarh", "Garhwal", "Burdwan", "Ranchi", "Cuttack"]
+STATES = ["Madhya Pradesh", "Uttarakhand", "West Bengal", "Jharkhand", "Orissa"]
+
+
+@pytest.fixture
+def index():
+    return DistrictNameIndex(NAMES, states=STATES)
+
+
+@pytest.fixture(scope="module")
+def store():
+    return DistrictStore.load(cache_file=None)
+
+
+# Near-miss pairs from different states that must not be merged.
+NEAR_MISSES = [("Ramgarh", "Jharkhand"), ("Garhwa", "Jharkhand")]
+
+
+@pytest.mark.parametrize("name, state", NEAR_MISSES)
+def test_fuzzy_match_stays_in_state(index, name, state):
+    assert index.resolve(name, state) is None
+
+
+@pytest.mark.parametrize("name, _", NEAR_MISSES)
+def test_no_fuzzy_match_without_state(index, name, _):
+    assert index.resolve(name) is None
+
+
+def test_fuzzy_match_within_state(index):
+    match = index.resolve("Garhwall", "Uttarakhand")
+    assert (match.name, match.method) == ("Garhwal", "fuzzy")
+    assert index.resolve("Ranchii", "Jharkhand").name == "Ranchi"
+
+
+def test_fuzzy_alias_checks_state(index):
+    assert index.resolve("Barddhaman", "West Bengal").name == "Burdwan"
+    assert index.resolve("Barddhaman", "Bihar") is None
+    assert index.resolve("Barddhaman") is None
+
+
+def test_exact_and_alias_need_no_state(index):
+    assert index.resolve("rajgarh district").method == "exact"
+    assert index.resolve("Purba Bardhaman").name == "Burdwan"
+
+
+def test_geocoder_state_spelling(index):
+    assert index.resolve("Cutack", "Odisha").name == "Cuttack"
+
+
+@pytest.mark.parametrize("name, state", NEAR_MISSES)
+def test_store_rejects_near_misses(store, name, state):
+    assert store.match_district(name, state) is None
+    assert store.match_district(name) is None
+
+
+def test_store_matches(store):
+    assert store.match_district("Rajgarh", "Madhya Pradesh").method == "exact"
+    assert store.match_district("Barddhaman", "West Bengal").name == "Burdwan"
+    assert store.soil("Ananthapur") is not None
+
+
+def _one_way(table):
+    table = {normalize_name(a): normalize_name(t) for a, t in table.items() if normalize_name(a) != normalize_name(t)}
+    return not set(table) & set(table.values())
+
+
+def test_alias_tables_point_one_way_at_dataset_names(store):
+    yield_keys = {normalize_name(str(n)) for n in store.dist_names}
+    soil_keys = {normalize_name(str(n)) for n in store.soil_names}
+    assert {t for t in ALIASES.values() if normalize_name(t) not in yield_keys} == set()
+    soil_targets = set(soil_aliases(ALIASES).values())
+    assert {t for t in soil_targets if normalize_name(t) not in soil_keys} == set()
+    assert _one_way(ALIASES)
+    assert _one_way(soil_aliases(ALIASES))
+
+
+# (geocoded name, state, yield spelling, soil spelling)
+BUILT_IN_ALIASES = [
+    ("Purba Medinipur", "West Bengal", "Midnapur", "East Midnapore Purba Midnapore"),
+    ("Paschim Medinipur", "West Bengal", "Midnapur", "West Midnapore"),
+    ("Uttar Dinajpur", "West Bengal", "West Dinajpur", "Uttar Dinajpur"),
+    ("Dakshin Dinajpur", "West Bengal", "West Dinajpur", "Dakshin Dinajpur"),
+    ("Raiganj", "West Bengal", "West Dinajpur", "Uttar Dinajpur"),
+    ("Kolkata", "West Bengal", "24 Parganas", "24 - Paraganas North"),
+    ("South 24 Parganas", "West Bengal", "24 Parganas", "24 - Paraganas South"),
+    ("Purba Bardhaman", "West Bengal", "Burdwan", "Burdwan"),
+    ("Bengaluru", "Karnataka", "Bangalore", "Bangalore(Urban)"),
+    ("Bengaluru Rural", "Karnataka", "Bangalore", "Bangalore(Rural)"),
+    ("Mumbai", "Maharashtra", "Bombay", "Mumbai sub"),
+    ("Kalaburagi", "Karnataka", "Gulbarga / Kalaburagi", "Gulbarga"),
+    ("Bhojpur", "Bihar", "Shahabad (now part of Bhojpur district)", "Bhojpur"),
+    ("Kanpur Nagar", "Uttar Pradesh", "Kanpur", "Kanpur Nagar"),
+    ("East Singhbhum", "Jharkhand", "Singhbhum", "Singhbhum East"),
+]
+
+
+@pytest.mark.parametrize("name, state, yield_name, soil_name", BUILT_IN_ALIASES)
+def test_store_built_in_aliases(store, name, state, yield_name, soil_name):
+    for query_state in (state, None):
+        assert store.match_district(name, query_state).name == yield_name
+        assert store.name_indexes()[1].resolve(name, query_state).name == soil_name
+    # The soil row is also found from the yield spelling the engine passes on.
+    assert store.soil(yield_name) is not None
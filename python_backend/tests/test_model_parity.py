@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("timm")
+
+from export_models import DEFAULT_IMAGE_DIR, check_parity, sample_images
+from model_backends import MODEL_SPECS, checkpoint_path, export_path
+
+SAMPLES = 16
+BATCH_SIZE = 8
+# Exported FP32 models must give eager's labels, probabilities within 1e-3
+# (the export_models.py --check default). INT8 may flip a borderline label.
+TOLERANCES = {"fp32": (1e-3, 1.0), "int8": (0.1, 0.95)}
+VARIANTS = [("torchscript", "fp32"), ("onnx", "fp32"), ("onnx", "int8")]
+
+
+@pytest.fixture(scope="module")
+def images():
+    return sample_images(DEFAULT_IMAGE_DIR, None, SAMPLES)
+
+
+@pytest.mark.parametrize("name", list(MODEL_SPECS))
+@pytest.mark.parametrize("backend, precision", VARIANTS)
+def test_exported_model_matches_eager(images, name, backend, precision):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+    if not os.path.exists(checkpoint_path(name)):
+        pytest.skip(f"{checkpoint_path(name)} not found")
+    if not os.path.exists(export_path(name, backend, precision)):
+        pytest.skip(f"{export_path(name, backend, precision)} not found, run export_models.py / quantize_models.py")
+
+    tolerance, min_agreement = TOLERANCES[precision]
+    assert check_parity([name], [backend], images, tolerance, BATCH_SIZE, precision, min_agreement) == 0
@@ -0,0 +1,22 @@
+from result_cache import ResultCache
+
+
+def test_hashes_shared_between_workers(tmp_path):
+    # Two caches on one file stand in for two forked server workers.
+    path = str(tmp_path / "results.sqlite3")
+    first, second = ResultCache(path=path), ResultCache(path=path)
+    assert first.check_duplicates("a" * 64, 0x0F0F0F0F0F0F0F0F, "claim-1") == []
+
+    matches = second.check_duplicates("b" * 64, 0x0F0F0F0F0F0F0F0E, "claim-2")
+    assert [(m["claimId"], m["distance"], m["exact"]) for m in matches] == [("claim-1", 1, False)]
+    assert second.known_phash("a" * 64) == 0x0F0F0F0F0F0F0F0F
+
+    matches = first.check_duplicates("b" * 64, 0x0F0F0F0F0F0F0F0E, "claim-3")
+    assert sorted(m["claimId"] for m in matches) == ["claim-1", "claim-2"]
+
+
+def test_same_claim_not_flagged(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite3"))
+    cache.check_duplicates("a" * 64, 1, "claim-1")
+    assert cache.check_duplicates("c" * 64, 1, "claim-1") == []
+    assert cache.check_duplicates("a" * 64, 1, "claim-2")[0]["exact"]
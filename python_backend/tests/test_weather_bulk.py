@@ -0,0 +1,109 @@
+import statistics
+
+import pytest
+
+import futureWeather
+import open_meteo_stub
+from weather_cache import ForecastCache
+
+# Farms 0 and 1 share a 0.1-degree grid cell; farm 2 is elsewhere.
+FARMS = [(18.52, 73.85), (18.53, 73.86), (28.61, 77.21)]
+SAME_CELL_AS_FIRST = (18.54, 73.84)
+
+
+@pytest.fixture(scope="module")
+def stub_url(serve_app):
+    with serve_app(open_meteo_stub.app) as url:
+        yield url
+
+
+@pytest.fixture
+def upstream(stub_url, monkeypatch):
+    """Point the bulk path at the stub with an empty forecast cache; returns the stub's counters."""
+    monkeypatch.setattr(futureWeather, "OPEN_METEO_BASE_URL", stub_url)
+    monkeypatch.setattr(futureWeather, "forecast_cache", ForecastCache())
+    open_meteo_stub.stats.update(requests=0, locations=0)
+    return open_meteo_stub.stats
+
+
+def reference_score(data):
+    """Scalar risk score of one Open-Meteo payload, computed the unvectorized way."""
+    daily = data["daily"]
+    aggregates = {
+        "total_rain": sum(daily["precipitation_sum"]),
+        "avg_temp": statistics.fmean(daily["temperature_2m_mean"]),
+        "avg_humidity": statistics.fmean(daily["relative_humidity_2m_mean"]),
+        "avg_wind": statistics.fmean(daily["wind_speed_10m_mean"]),
+    }
+    return sum(
+        futureWeather.normalized_risk(aggregates[field], **futureWeather.ideal_ranges[range_name])
+        * futureWeather.weather_factors[factor]["weight"]
+        for factor, (field, range_name, _) in futureWeather.RISK_INPUTS.items()
+    )
+
+
+def test_farms_share_one_request_per_grid_cell(upstream):
+    fetched = futureWeather.fetch_weather_bulk(FARMS)
+    assert upstream == {"requests": 1, "locations": 2}
+    assert fetched[0][0] is fetched[1][0]
+    assert [freshness["from_cache"] for _, _, freshness in fetched] == [False, False, False]
+
+    # Another farm in a cached cell is served without an upstream call.
+    (data, source, freshness), = futureWeather.fetch_weather_bulk([SAME_CELL_AS_FIRST])
+    assert upstream["requests"] == 1
+    assert data is fetched[0][0]
+    assert (source, freshness["status"], freshness["from_cache"]) == ("open-meteo", "fresh", True)
+
+
+def test_weather_risk_batch_endpoint(upstream):
+    from fastapi.testclient import TestClient
+
+    import main_fastAPI
+
+    # No context manager: the lifespan would load every model.
+    client = TestClient(main_fastAPI.app)
+    farms = [{"farmId": str(i), "locationLat": lat, "locationLong": lon} for i, (lat, lon) in enumerate(FARMS)]
+    body = client.post("/weatherRiskBatch", json={"farms": farms}).json()
+    assert (body["scored"], body["failed"]) == (3, 0)
+    assert upstream["requests"] == 1
+    payloads = futureWeather.fetch_weather_bulk(FARMS)
+    for entry, (data, _, _) in zip(body["results"], payloads):
+        assert entry["weather_trend_risk_score"] == round(reference_score(data), 2)
+
+    lat, lon = SAME_CELL_AS_FIRST
+    body = client.post("/weatherRiskBatch", json={"farms": [{"locationLat": lat, "locationLong": lon}]}).json()
+    assert upstream["requests"] == 1
+    assert body["results"][0]["forecast_freshness"]["from_cache"] is True
+
+
+def test_cells_are_fetched_in_chunks(upstream, monkeypatch):
+    monkeypatch.setattr(futureWeather, "OPEN_METEO_CHUNK_SIZE", 2)
+    farms = [(10.0 + i, 76.0) for i in range(5)]
+    fetched = futureWeather.fetch_weather_bulk(farms)
+    assert upstream == {"requests": 3, "locations": 5}
+    assert all(not isinstance(item, Exception) for item in fetched)
+
+
+def test_batched_scores_match_single_scores(upstream):
+    fetched = futureWeather.fetch_weather_bulk(FARMS)
+    # A shorter forecast in the same batch must not change the others' scores.
+    forecasts = [item[:2] for item in fetched]
+    short = {"daily": {key: values[:futureWeather.MIN_FORECAST_DAYS] for key, values in fetched[2][0]["daily"].items()}}
+    forecasts.append((short, "open-meteo"))
+
+    batched = futureWeather.score_forecasts(forecasts)
+    for (data, source), (summary, score, should_claim, flags) in zip(forecasts, batched):
+        assert futureWeather.extract_and_calc(data, source) == (summary, score, should_claim, flags)
+        assert score == pytest.approx(reference_score(data))
+        assert should_claim == (score >= futureWeather.CLAIM_THRESHOLD)
+        assert summary["forecast_days_used"] == len(data["daily"]["time"])
+
+
+def test_too_short_forecasts_are_rejected(upstream, monkeypatch):
+    monkeypatch.setattr(open_meteo_stub, "MAX_DAYS", futureWeather.MIN_FORECAST_DAYS - 1)
+    fetched = futureWeather.fetch_weather_bulk(FARMS)
+    assert upstream["requests"] == 1
+    assert all(isinstance(item, ValueError) for item in fetched)
+    assert f"fewer than {futureWeather.MIN_FORECAST_DAYS} forecast days" in str(fetched[0])
+    # Nothing was cached, so the next call goes upstream again.
+    assert futureWeather.forecast_cache.get_fresh("open-meteo", *FARMS[0]) is None
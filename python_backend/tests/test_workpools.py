@@ -0,0 +1,29 @@
+import asyncio
+import os
+
+# Loaded in the worker before the initializer runs, as the main module's imports are.
+import numpy  # noqa: F401
+import pytest
+
+import workpools
+
+pytest.importorskip("threadpoolctl")
+
+
+def _worker_threads():
+    from threadpoolctl import threadpool_info
+    blas = [info["num_threads"] for info in threadpool_info() if info["user_api"] == "blas"]
+    return os.environ.get("OMP_NUM_THREADS"), blas
+
+
+def test_forecast_worker_caps_threads_in_the_child_only():
+    env = {var: "1" for var in workpools.FORECAST_WORKER_ENV}
+    pool = workpools.ProcessWorkPool("test", 1, initializer=workpools._init_forecast_worker, initargs=(env, 1))
+    before = dict(os.environ)
+    try:
+        omp, blas = asyncio.run(pool.run(_worker_threads))
+    finally:
+        pool.shutdown()
+    assert omp == "1"
+    assert blas == [1]
+    assert dict(os.environ) == before
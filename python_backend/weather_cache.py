@@ -0,0 +1,127 @@
+"""Grid-snapped cache for provider weather forecasts.
+
+Forecasts are keyed on (provider, grid cell) and fetched for the cell centre,
+so every farm in a cell shares one upstream call. Entries stay fresh for the
+provider's refresh interval. Concurrent misses for the same cell are coalesced
+into a single request. If a refresh fails, a stale entry is served for up to
+``WEATHER_CACHE_MAX_STALE`` seconds, with a freshness block saying so.
+"""
+import os
+import time
+
+from ttl_cache import SingleFlight, TTLCache, snap_to_grid
+
+GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", "0.1"))
+# Both providers refresh their daily forecasts roughly hourly.
+PROVIDER_TTL = {
+    "tomorrow": float(os.getenv("TOMORROW_CACHE_TTL", "3600")),
+    "open-meteo": float(os.getenv("OPEN_METEO_CACHE_TTL", "3600")),
+}
+MAX_STALE = float(os.getenv("WEATHER_CACHE_MAX_STALE", str(24 * 3600)))
+MAX_CELLS = int(os.getenv("WEATHER_CACHE_SIZE", "5000"))
+
+
+class UpstreamUnavailable(RuntimeError):
+    pass
+
+
+class ForecastCache:
+    def __init__(self, grid_deg=GRID_DEG, ttls=None, max_stale=MAX_STALE, maxsize=MAX_CELLS):
+        self.grid_deg = grid_deg
+        self.ttls = dict(PROVIDER_TTL if ttls is None else ttls)
+        self.max_stale = max_stale
+        self.maxsize = maxsize
+        self._caches = {}
+        self.flight = SingleFlight()
+        self.stale_served = 0
+        self.upstream_errors = 0
+
+    def cell(self, lat, lon):
+        return snap_to_grid(lat, lon, self.grid_deg)
+
+    def _cache(self, provider):
+        cache = self._caches.get(provider)
+        if cache is None:
+            cache = self._caches.setdefault(provider, TTLCache(maxsize=self.maxsize, ttl=self.ttls.get(provider, 3600)))
+        return cache
+
+    def _freshness(self, provider, cell, status, stored_at, **extra):
+        ttl = self._cache(provider).ttl
+        age = max(0.0, time.time() - stored_at)
+        freshness = {
+            "status": status,
+            "provider": provider,
+            "grid_cell": list(cell),
+            "age_seconds": round(age, 1),
+            "ttl_seconds": ttl,
+        }
+        freshness.update(extra)
+        return freshness
+
+    def get_fresh(self, provider, lat, lon):
+        """Return (data, freshness) if the cell has a fresh entry, else None. Never calls upstream."""
+        cell = self.cell(lat, lon)
+        cache = self._cache(provider)
+        entry = cache.peek(cell)
+        if entry is None or time.time() - entry[1] > cache.ttl:
+            return None
+        cache.get_entry(cell)
+        return entry[0], self._freshness(provider, cell, "fresh", entry[1], from_cache=True, coalesced=False)
+
+    def fetch(self, provider, lat, lon, fetch_fn, validate=None):
+        """Return (data, freshness) for the cell containing (lat, lon).
+
+        ``fetch_fn(cell_lat, cell_lon)`` performs the upstream call. A None
+        result, an exception, or data rejected by ``validate`` counts as an
+        upstream failure.
+        """
+        cell = self.cell(lat, lon)
+        key = cell
+        cache = self._cache(provider)
+        entry = cache.get_entry(key, allow_expired=True)
+        if entry is not None and time.time() - entry[1] <= cache.ttl:
+            return entry[0], self._freshness(provider, cell, "fresh", entry[1], from_cache=True, coalesced=False)
+
+        def refresh():
+            data = fetch_fn(*cell)
+            if data is None or (validate is not None and not validate(data)):
+                raise UpstreamUnavailable(f"{provider} returned no usable forecast")
+            stored_at = time.time()
+            cache.set(key, data, stored_at=stored_at)
+            return data, stored_at
+
+        try:
+            (data, stored_at), shared = self.flight.do((provider, key), refresh)
+            return data, self._freshness(provider, cell, "fresh", stored_at, from_cache=False, coalesced=shared)
+        except Exception as e:
+            stale = self.get_stale(provider, lat, lon, e)
+            if stale is None:
+                raise
+            return stale
+
+    def put(self, provider, lat, lon, data):
+        """Store a forecast fetched outside ``fetch`` (e.g. a bulk request); returns its freshness."""
+        cell = self.cell(lat, lon)
+        stored_at = time.time()
+        self._cache(provider).set(cell, data, stored_at=stored_at)
+        return self._freshness(provider, cell, "fresh", stored_at, from_cache=False, coalesced=False)
+
+    def get_stale(self, provider, lat, lon, error):
+        """Record an upstream failure and return (data, freshness) if a stale entry may be served."""
+        self.upstream_errors += 1
+        cell = self.cell(lat, lon)
+        cache = self._cache(provider)
+        entry = cache.peek(cell)
+        if entry is None or time.time() - entry[1] > cache.ttl + self.max_stale:
+            return None
+        self.stale_served += 1
+        return entry[0], self._freshness(provider, cell, "stale", entry[1], from_cache=True, coalesced=False, error=str(error))
+
+    def stats(self):
+        return {
+            "grid_deg": self.grid_deg,
+            "providers": {provider: cache.stats() for provider, cache in self._caches.items()},
+            "single_flight": self.flight.stats(),
+            "stale_served": self.stale_served,
+            "upstream_errors": self.upstream_errors,
+        }
@@ -0,0 +1,181 @@
+"""Bounded executors for blocking work called from async routes.
+
+Each endpoint group gets its own thread pool and an asyncio semaphore, so a
+burst of slow yield forecasts cannot take the threads that image checks or
+weather calls need, and the event loop itself never blocks.
+
+CPU-bound batch work that has to use more than one core (yield batches) goes
+to ``ProcessWorkPool``, whose worker processes are spawned on first use.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class WorkPool:
+    def __init__(self, name, max_workers, max_concurrency=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency or max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"pool-{name}")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn`` on this pool's threads once a concurrency slot is free."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.busy_seconds += time.perf_counter() - start
+            self.active -= 1
+            self._semaphore.release()
+
+    async def timed(self, fn, *args, **kwargs):
+        """Like run, but also returns the elapsed wall-clock milliseconds."""
+        start = time.perf_counter()
+        result = await self.run(fn, *args, **kwargs)
+        return result, round((time.perf_counter() - start) * 1000, 2)
+
+    def metrics(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessWorkPool(WorkPool):
+    """WorkPool backed by worker processes.
+
+    Processes are started with ``spawn``, not ``fork``: the serving process
+    has live threads (and possibly torch), which are not safe to fork. The pool
+    is created on first use, so workers that never run batch jobs pay nothing.
+    ``initializer(*initargs)`` runs in each worker before its first task.
+    """
+
+    def __init__(self, name, max_workers, max_concurrency=None, initializer=None, initargs=()):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency or max_workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=self.initializer,
+                        initargs=self.initargs,
+                    )
+        return self._executor
+
+    def metrics(self):
+        metrics = super().metrics()
+        metrics["started"] = self._executor is not None
+        return metrics
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+# Image verifiers: inference is micro-batched behind these threads.
+vision_pool = WorkPool("vision", _env_int("VISION_WORKERS", 8), _env_int("VISION_CONCURRENCY", 16))
+# Yield prediction: forecasting is CPU heavy, keep it narrow.
+yield_pool = WorkPool("yield", _env_int("YIELD_WORKERS", 2), _env_int("YIELD_CONCURRENCY", 4))
+# Weather and Gemini: mostly waiting on upstream APIs.
+weather_pool = WorkPool("weather", _env_int("WEATHER_WORKERS", 8), _env_int("WEATHER_CONCURRENCY", 16))
+
+# Each process fits one series at a time; N processes with N BLAS/Stan
+# threads each would oversubscribe the cores.
+FORECAST_WORKER_THREADS = _env_int("FORECAST_WORKER_THREADS", 1)
+FORECAST_WORKER_ENV = {
+    var: str(FORECAST_WORKER_THREADS)
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS", "STAN_NUM_THREADS")
+}
+
+
+def _init_forecast_worker(env, threads):
+    """Cap a forecast worker's native thread pools; the serving process is left alone.
+
+    ``env`` covers what the worker loads from here on (torch, numexpr, Stan
+    through cmdstanpy). A spawned worker has already re-imported the main
+    module, and with it numpy, so pools that are loaded by now are capped
+    directly.
+    """
+    import logging
+
+    os.environ.update(env)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+    for module in ("torch", "numexpr"):
+        if module in sys.modules:
+            sys.modules[module].set_num_threads(threads)
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    logging.getLogger("prophet").setLevel(logging.WARNING)
+
+
+# Yield batches (one task per district) and per-request crop fits, spread over every core.
+yield_process_pool = ProcessWorkPool(
+    "yield_processes", _env_int("YIELD_BATCH_PROCESSES", os.cpu_count() or 1),
+    initializer=_init_forecast_worker, initargs=(FORECAST_WORKER_ENV, FORECAST_WORKER_THREADS),
+)
+
+POOLS = {pool.name: pool for pool in (vision_pool, yield_pool, weather_pool, yield_process_pool)}
+
+
+def metrics():
+    return {name: pool.metrics() for name, pool in POOLS.items()}
+
+
+def shutdown():
+    for pool in POOLS.values():
+        pool.shutdown()